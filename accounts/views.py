@@ -15,6 +15,9 @@ from .serializers import RegisterSerializer
 from .models import InvitationCode
 
 from game.models import Character, PlayerState  # <- PlayerState para mandar a 0-0 si quieres asegurar
+from game.active_character import get_active_character
+from game.positions import positions
+from game.occupancy import occupancy
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 
@@ -46,7 +49,7 @@ def logout_view(request):
     return redirect("start_menu")
 
 
-def _get_character_and_lives_context(user):
+def _get_character_and_lives_context(request):
     """
     Devuelve:
       character | None,
@@ -54,7 +57,7 @@ def _get_character_and_lives_context(user):
       seconds_to_next_life (int|None),
       no_lives (bool)
     """
-    character = Character.objects.filter(owner=user).first()
+    character = get_active_character(request)
     if not character:
         return None, None, None, False
 
@@ -83,7 +86,7 @@ def start_menu(request):
     # AUTENTICADO
     # =========================
     if request.user.is_authenticated:
-        character, lives, seconds_to_next, no_lives = _get_character_and_lives_context(request.user)
+        character, lives, seconds_to_next, no_lives = _get_character_and_lives_context(request)
 
         has_character = character is not None
 
@@ -94,11 +97,14 @@ def start_menu(request):
                 character=character,
                 defaults={"x": 9, "y": 9, "zone": "0-0"},
             )
+            positions.load(state)
             if state.zone != "0-0":
+                old_zone = state.zone
                 state.zone = "0-0"
                 state.x = 9
                 state.y = 9
-                state.save(update_fields=["zone", "x", "y"])
+                positions.persist(state)
+                occupancy.transfer(character, old_zone, state)
 
         return render(
             request,
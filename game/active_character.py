@@ -0,0 +1,101 @@
+# game/active_character.py
+"""
+Personaje activo de la sesión.
+
+El id del personaje elegido vive en la sesión (SESSION_KEY); el personaje
+(con su PlayerState en el mismo JOIN) se carga una sola vez por request y
+queda en request.character. Si la sesión no tiene uno válido se toma el de
+menor id del usuario, así una cuenta con varios personajes siempre resuelve
+al mismo.
+
+Con WORLD_ACTIVE_CHARACTER_CACHE_SECONDS > 0 la instancia además se guarda en
+el cache ese tiempo y el request no hace ni esa query. Se invalida en cada
+save() y en los UPDATE directos del modelo (recompensas, vidas, bonos de
+equipo). Viene apagado: la invalidación solo llega a otros procesos si el
+cache es compartido, y con LocMemCache y varios workers un proceso podría
+servir (y volver a guardar con save()) una copia vieja del personaje.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import Character
+
+SESSION_KEY = "active_character_id"
+
+
+def _cache_seconds():
+    return getattr(settings, "WORLD_ACTIVE_CHARACTER_CACHE_SECONDS", 0)
+
+
+def _cache_key(character_id):
+    return f"active_character:{character_id}"
+
+
+def forget_cached_character(character_id):
+    if _cache_seconds():
+        cache.delete(_cache_key(character_id))
+
+
+def load_active_character(user_id, session=None):
+    """
+    Personaje activo de `user_id` según la sesión (dict-like o None).
+    Guarda en la sesión el id resuelto.
+    """
+    qs = Character.objects.filter(owner_id=user_id).select_related("state")
+    character_id = session.get(SESSION_KEY) if session is not None else None
+
+    if character_id and _cache_seconds():
+        character = cache.get(_cache_key(character_id))
+        if character is not None and character.owner_id == user_id:
+            return character
+
+    character = qs.filter(pk=character_id).first() if character_id else None
+    if character is None:
+        character = qs.order_by("pk").first()
+    if character is None:
+        return None
+
+    if session is not None and character_id != character.pk:
+        session[SESSION_KEY] = character.pk
+    if _cache_seconds():
+        # solo lo leído de la BD: el TTL no se renueva con copias del cache
+        cache.set(_cache_key(character.pk), character, _cache_seconds())
+    return character
+
+
+def _django_request(request):
+    # las vistas DRF reciben un Request que envuelve al HttpRequest
+    return getattr(request, "_request", request)
+
+
+def get_active_character(request):
+    """Personaje activo del request (None si no hay), cargado una vez."""
+    base = _django_request(request)
+    if not hasattr(base, "_active_character"):
+        user = request.user
+        if not user.is_authenticated:
+            base._active_character = None
+        else:
+            base._active_character = load_active_character(user.pk, getattr(base, "session", None))
+    return base._active_character
+
+
+def select_character(request, character):
+    """Deja `character` como activo en la sesión y en el request."""
+    base = _django_request(request)
+    session = getattr(base, "session", None)
+    if session is not None:
+        session[SESSION_KEY] = character.pk
+    base._active_character = character
+
+
+class ActiveCharacterMiddleware:
+    """request.character: el personaje activo, resuelto al primer uso."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.character = SimpleLazyObject(lambda: get_active_character(request))
+        return self.get_response(request)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Character, EnemyType, EnemyInstance,
-    EquipmentItem, PlayerState, EnemySpawn
+    EquipmentItem, PlayerState, EnemySpawn, Task
 )
 
 
@@ -16,3 +16,9 @@ admin.site.register(EnemyInstance)
 admin.site.register(EquipmentItem)
 admin.site.register(PlayerState)
 admin.site.register(EnemySpawn)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "name")
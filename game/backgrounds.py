@@ -0,0 +1,123 @@
+# game/backgrounds.py
+"""
+Fondos pre-renderizados de cada zona con Pillow.
+
+Las casillas estáticas (ground/wall/tree/house/shop/portal) se componen en
+una sola imagen de la zona; enemy y enemy_zone van como ground porque el
+cliente dibuja encima solo los enemigos vivos. El archivo se guarda en disco
+con un nombre que incluye el hash del mapa y del tileset, así que nunca hay
+que invalidarlo: si cambia un tile o el mapa, cambia el nombre (y la URL).
+"""
+from functools import lru_cache
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+
+from django.conf import settings
+from PIL import Image
+
+from .maps import E, G, MAPS, Z
+
+TILE_SIZE = 32
+
+# lo que no cambia en partida; los enemigos se dibujan aparte
+DYNAMIC_TILES = {E: G, Z: G}
+
+# mismos colores que el fallback del cliente si falta un png
+TILE_COLORS = {
+    "ground": "#333333",
+    "wall": "#8B5A2B",
+    "tree": "#0A7A0A",
+    "shop": "#4444AA",
+    "portal": "#00BFA5",
+}
+
+
+def tile_dirs():
+    """Igual que el cliente: primero media/tiles, después los tiles de la app."""
+    return [
+        Path(settings.MEDIA_ROOT) / "tiles",
+        Path(__file__).resolve().parent / "static" / "tiles",
+    ]
+
+
+def background_root() -> Path:
+    return Path(getattr(settings, "WORLD_BACKGROUND_ROOT", Path(settings.BASE_DIR) / "var" / "zone_backgrounds"))
+
+
+def tile_path(tile: str):
+    for base in tile_dirs():
+        path = base / f"{tile}.png"
+        if path.exists():
+            return path
+    return None
+
+
+def _static_tiles():
+    tiles = set()
+    for data in MAPS.values():
+        for row in data["map"]:
+            tiles.update(DYNAMIC_TILES.get(t, t) for t in row)
+    return sorted(tiles)
+
+
+@lru_cache(maxsize=None)
+def tileset_hash() -> str:
+    """Hash de los png que se usan (y del tamaño de casilla)."""
+    h = hashlib.sha256(str(TILE_SIZE).encode())
+    for tile in _static_tiles():
+        path = tile_path(tile)
+        h.update(tile.encode())
+        h.update(path.read_bytes() if path else b"-")
+    return h.hexdigest()[:16]
+
+
+def background_digest(zone: str) -> str:
+    data = MAPS.get(zone) or MAPS["center"]
+    return hashlib.sha256(f"{data['asset_hash']}:{tileset_hash()}".encode()).hexdigest()[:16]
+
+
+def background_path(zone: str) -> Path:
+    data = MAPS.get(zone) or MAPS["center"]
+    return background_root() / f"{data['name']}-{background_digest(zone)}.png"
+
+
+@lru_cache(maxsize=None)
+def _tile_image(tile: str) -> Image.Image:
+    path = tile_path(tile)
+    if path is None:
+        return Image.new("RGBA", (TILE_SIZE, TILE_SIZE), TILE_COLORS.get(tile, "#222222"))
+    with Image.open(path) as img:
+        # el cliente estira cada png a la casilla: mismo resultado
+        return img.convert("RGBA").resize((TILE_SIZE, TILE_SIZE), Image.LANCZOS)
+
+
+def render_background(zone: str) -> Image.Image:
+    grid = (MAPS.get(zone) or MAPS["center"])["map"]
+    rows, cols = len(grid), len(grid[0])
+    canvas = Image.new("RGBA", (cols * TILE_SIZE, rows * TILE_SIZE))
+    for y, row in enumerate(grid):
+        for x, tile in enumerate(row):
+            sprite = _tile_image(DYNAMIC_TILES.get(tile, tile))
+            canvas.alpha_composite(sprite, (x * TILE_SIZE, y * TILE_SIZE))
+    return canvas
+
+
+def ensure_background(zone: str, force: bool = False) -> Path:
+    """Ruta del fondo de la zona en disco; lo renderiza si no existe."""
+    path = background_path(zone)
+    if path.exists() and not force:
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # escritura atómica: otro worker nunca ve un png a medias
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".png")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            render_background(zone).save(f, "PNG")
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
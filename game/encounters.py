@@ -0,0 +1,150 @@
+# game/encounters.py
+"""
+Packs de enemigos para los encuentros del mundo.
+
+roll_pack() es la única tirada (tamaño 1..4, tipo, rareza y stats con
+calculate_enemy_stats).
+
+EncounterPool guarda lo que se puede dejar listo antes del encuentro: los
+tipos de enemigo y, por nivel de zona, la tabla de stats (tipo, rareza) ya
+calculada. El pack en sí se tira con la semilla del encuentro
+(create_pack(level, rng)), así es reproducible en cualquier proceso; como
+la semilla incluye la casilla y la hora, no hay packs que tirar por
+adelantado. Un trigger no consulta tipos ni calcula stats: solo el INSERT.
+
+Los tipos cargados viven a lo más WORLD_ENCOUNTER_TYPES_SECONDS: los signals
+de EnemyType vacían el pool del proceso donde se editó, y los demás procesos
+se enteran al vencer el plazo. Si al recargar los tipos cambiaron, se
+descarta la tabla de stats.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import EnemyInstance, EnemyType
+from .utils import calculate_enemy_stats
+
+ENEMY_RARITY_ROLL = [
+    ("normal", 0.80),
+    ("strong", 0.15),
+    ("boss", 0.04),
+    ("legend", 0.01),
+]
+
+
+def roll_rarity(rng: random.Random) -> str:
+    r = rng.random()
+    acc = 0.0
+    for key, p in ENEMY_RARITY_ROLL:
+        acc += p
+        if r <= acc:
+            return key
+    return "normal"
+
+
+def roll_pack(enemy_types, level: int, rng: random.Random, count_min=1, count_max=4, stats_for=None):
+    """
+    Un pack como lista de kwargs de EnemyInstance (sin tocar la BD).
+    `stats_for(et, rarity)` permite sacar los stats de una tabla ya
+    calculada; por defecto se calculan.
+    """
+    pack = []
+    for _ in range(rng.randint(count_min, count_max)):
+        et = rng.choice(enemy_types)
+        rarity = roll_rarity(rng)
+        if stats_for is None:
+            stats = calculate_enemy_stats(et, level=level, rarity=rarity)
+        else:
+            stats = stats_for(et, rarity)
+        pack.append({
+            "enemy_type_id": et.id,
+            "level": level,
+            "rarity": rarity,
+            "hp": stats["hp"],
+            "atk": stats["atk"],
+            "defense": stats["def"],
+            "speed": stats["speed"],
+        })
+    return pack
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _snapshot(types):
+    return [(t.pk, t.base_hp, t.base_atk, t.base_def, t.base_speed) for t in types]
+
+
+class EncounterPool:
+    def __init__(self):
+        self._lock = threading.Lock()        # tipos y tabla de stats
+        self._enemy_types = None
+        self._types_loaded_at = 0.0
+        self._stats = {}                     # (nivel, tipo, rareza) -> stats
+
+    # ---------- tipos ----------
+
+    def enemy_types(self):
+        with self._lock:
+            ttl = _setting("WORLD_ENCOUNTER_TYPES_SECONDS", 60)
+            if self._enemy_types is None or time.monotonic() - self._types_loaded_at >= ttl:
+                types = list(EnemyType.objects.all())
+                if self._enemy_types is not None and _snapshot(types) != _snapshot(self._enemy_types):
+                    # otro proceso editó o borró un tipo
+                    self._stats.clear()
+                self._enemy_types = types
+                self._types_loaded_at = time.monotonic()
+            return self._enemy_types
+
+    def reset(self):
+        """Descarta tipos y stats (p. ej. cambió un EnemyType)."""
+        with self._lock:
+            self._enemy_types = None
+            self._stats.clear()
+
+    def _stats_for(self, level):
+        def stats_for(et, rarity):
+            key = (level, et.id, rarity)
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = calculate_enemy_stats(et, level=level, rarity=rarity)
+            return stats
+        return stats_for
+
+    # ---------- tiradas ----------
+
+    def _roll(self, level, rng, count_min=1, count_max=4):
+        """Un pack (kwargs de EnemyInstance) tirado con `rng`; sin tocar la BD si ya hay tipos."""
+        types = self.enemy_types()
+        if not types:
+            return []
+        with self._lock:
+            return roll_pack(types, level, rng, count_min, count_max, self._stats_for(level))
+
+    def create_pack(self, level, rng, count_min=1, count_max=4):
+        """
+        Inserta el pack de `rng` (sembrado con la clave del encuentro) como
+        EnemyInstance en un solo INSERT: misma semilla, mismo pack.
+        """
+        state = rng.getstate()
+        pack = self._roll(level, rng, count_min, count_max)
+        if not pack:
+            return []
+        try:
+            # las FK se revisan al hacer commit: el pack se inserta en su
+            # propia transacción para poder atrapar el error aquí
+            with transaction.atomic(savepoint=False):
+                return EnemyInstance.objects.bulk_create([EnemyInstance(**spec) for spec in pack])
+        except IntegrityError:
+            # un tipo del pack se borró en otro proceso antes de vencer el plazo
+            self.reset()
+            rng.setstate(state)
+            pack = self._roll(level, rng, count_min, count_max)
+            return EnemyInstance.objects.bulk_create([EnemyInstance(**spec) for spec in pack]) if pack else []
+
+
+encounter_pool = EncounterPool()
@@ -0,0 +1,239 @@
+# game/images.py
+"""
+Variantes y atlas de las imágenes del juego.
+
+- Variantes: cada imagen subida (Character.image, EnemyType.image) se
+  reduce a tamaños fijos (VARIANT_SIZES) en PNG y WebP. El nombre lleva el
+  hash del contenido original, así que la URL de una variante nunca cambia
+  de contenido y se puede cachear para siempre.
+- Atlas: los sprites de enemigos y los tiles del mundo se empaquetan en una
+  sola imagen con un mapa JSON de coordenadas {nombre: {x, y, w, h}}; el
+  nombre del atlas lleva el hash de todo lo que contiene.
+
+Todo se guarda en el storage de media (default_storage).
+"""
+from functools import lru_cache
+import hashlib
+import io
+import json
+import math
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .backgrounds import tile_path
+from .maps import CHAR
+
+# nombre -> lado en px (2x del tamaño en pantalla: 32px en el mundo, 120px en batalla)
+VARIANT_SIZES = {"sprite": 64, "portrait": 240}
+FORMATS = ("webp", "png")
+
+# cuánto se recuerda en el cache un hash/URL ya calculado
+LOOKUP_SECONDS = 60 * 60 * 24
+
+
+def content_hash(field_file) -> str:
+    """Hash del contenido de un archivo subido (memorizado por nombre)."""
+    key = f"img:hash:{field_file.name}"
+    digest = cache.get(key)
+    if digest is None:
+        field_file.open("rb")
+        try:
+            digest = hashlib.sha256(field_file.read()).hexdigest()[:16]
+        finally:
+            field_file.close()
+        cache.set(key, digest, LOOKUP_SECONDS)
+    return digest
+
+
+def fit_square(img: Image.Image, side: int) -> Image.Image:
+    """Escala sin deformar y centra en un cuadrado transparente."""
+    img = ImageOps.contain(img.convert("RGBA"), (side, side), Image.LANCZOS)
+    out = Image.new("RGBA", (side, side))
+    out.paste(img, ((side - img.width) // 2, (side - img.height) // 2))
+    return out
+
+
+def _encode(img: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "webp":
+        img.save(buf, "WEBP", quality=85, method=4)
+    else:
+        img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _save_once(name: str, data_fn) -> str:
+    # mismo nombre => mismo contenido: si ya existe no se reescribe
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data_fn()))
+    return default_storage.url(name)
+
+
+# ==========================
+# Variantes
+# ==========================
+
+def variant_name(field_file, size: str, fmt: str) -> str:
+    return f"variants/{content_hash(field_file)}-{size}.{fmt}"
+
+
+def make_variants(field_file) -> dict:
+    """
+    Genera todas las variantes de una imagen subida.
+    Retorna {tamaño: {formato: url}}.
+    """
+    field_file.open("rb")
+    try:
+        original = Image.open(field_file)
+        original.load()
+    finally:
+        field_file.close()
+
+    urls = {}
+    for size, side in VARIANT_SIZES.items():
+        thumb = fit_square(original, side)
+        urls[size] = {}
+        for fmt in FORMATS:
+            url = _save_once(variant_name(field_file, size, fmt), lambda: _encode(thumb, fmt))
+            cache.set(f"img:url:{field_file.name}:{size}:{fmt}", url, LOOKUP_SECONDS)
+            urls[size][fmt] = url
+    return urls
+
+
+def variant_url(field_file, size: str = "portrait", fmt: str = "webp"):
+    """
+    URL de una variante, generándolas si la imagen es anterior a este
+    pipeline. None si no hay imagen o el archivo no se puede leer.
+    """
+    if not field_file:
+        return None
+    url = cache.get(f"img:url:{field_file.name}:{size}:{fmt}")
+    if url:
+        return url
+    try:
+        return make_variants(field_file)[size][fmt]
+    except (OSError, ValueError):
+        # archivo perdido o que no es imagen: se sirve el original si existe
+        try:
+            return field_file.url
+        except ValueError:
+            return None
+
+
+# ==========================
+# Atlas
+# ==========================
+
+def build_atlas(frames: dict, cell: int):
+    """
+    Empaqueta imágenes en una grilla de celdas cell x cell.
+    Retorna (imagen, {nombre: {x, y, w, h}}).
+    """
+    names = sorted(frames)
+    cols = max(1, math.ceil(math.sqrt(len(names))))
+    rows = max(1, math.ceil(len(names) / cols))
+    sheet = Image.new("RGBA", (cols * cell, rows * cell))
+
+    coords = {}
+    for i, name in enumerate(names):
+        x, y = (i % cols) * cell, (i // cols) * cell
+        sheet.paste(fit_square(frames[name], cell), (x, y))
+        coords[name] = {"x": x, "y": y, "w": cell, "h": cell}
+    return sheet, coords
+
+
+def _atlas(kind: str, signature: str, cell: int, load_frames) -> dict:
+    """
+    Atlas `kind` identificado por el hash de `signature`: se arma una sola
+    vez y queda como atlases/<kind>-<hash>.{webp,png,json}.
+    """
+    digest = hashlib.sha256(f"{cell}:{signature}".encode()).hexdigest()[:16]
+    key = f"img:atlas:{kind}:{digest}"
+    atlas = cache.get(key)
+    if atlas:
+        return atlas
+
+    base = f"atlases/{kind}-{digest}"
+    if default_storage.exists(base + ".json"):
+        with default_storage.open(base + ".json") as f:
+            meta = json.load(f)
+        urls = {fmt: default_storage.url(f"{base}.{fmt}") for fmt in FORMATS}
+    else:
+        sheet, frames = build_atlas(load_frames(), cell)
+        meta = {"size": list(sheet.size), "frames": frames}
+        urls = {fmt: _save_once(f"{base}.{fmt}", lambda: _encode(sheet, fmt)) for fmt in FORMATS}
+        # el json va al final: si existe, las imágenes también
+        _save_once(base + ".json", lambda: json.dumps(meta).encode())
+
+    atlas = {"hash": digest, "image": urls["webp"], "image_png": urls["png"], **meta}
+    cache.set(key, atlas, LOOKUP_SECONDS)
+    return atlas
+
+
+@lru_cache(maxsize=None)
+def _tiles_signature():
+    # los tiles solo cambian con un deploy: se leen una vez por proceso
+    tiles = tuple(sorted(t for t in set(CHAR.values()) if tile_path(t)))
+    return tiles, ",".join(f"{t}:{hashlib.sha256(tile_path(t).read_bytes()).hexdigest()}" for t in tiles)
+
+
+def tile_atlas(cell: int = VARIANT_SIZES["sprite"]) -> dict:
+    """Todos los tiles del mundo en un atlas; frames por nombre de tile."""
+    tiles, signature = _tiles_signature()
+
+    def load_frames():
+        frames = {}
+        for t in tiles:
+            with Image.open(tile_path(t)) as img:
+                # el mundo estira cada tile a la casilla: aquí igual
+                frames[t] = img.convert("RGBA").resize((cell, cell), Image.LANCZOS)
+        return frames
+
+    return _atlas("tiles", signature, cell, load_frames)
+
+
+def _enemy_atlas_key(cell: int) -> str:
+    return f"img:atlas:enemies:current:{cell}"
+
+
+def forget_enemy_atlas():
+    """Se llama al cambiar un EnemyType: el próximo enemy_atlas() relee."""
+    cache.delete_many([_enemy_atlas_key(side) for side in VARIANT_SIZES.values()])
+
+
+def enemy_atlas(cell: int = VARIANT_SIZES["portrait"]) -> dict:
+    """
+    Imágenes de todos los EnemyType en un atlas; frames por id (str).
+    Queda en el cache hasta que cambia un EnemyType (sin query por batalla).
+    """
+    atlas = cache.get(_enemy_atlas_key(cell))
+    if atlas:
+        return atlas
+
+    from .models import EnemyType
+
+    enemy_types = [et for et in EnemyType.objects.only("id", "image") if et.image]
+    readable = []
+    for et in enemy_types:
+        try:
+            readable.append((et, content_hash(et.image)))
+        except OSError:
+            continue
+    signature = ",".join(f"{et.id}:{h}" for et, h in readable)
+
+    def load_frames():
+        frames = {}
+        for et, _ in readable:
+            et.image.open("rb")
+            try:
+                frames[str(et.id)] = Image.open(et.image).convert("RGBA")
+            finally:
+                et.image.close()
+        return frames
+
+    atlas = _atlas("enemies", signature, cell, load_frames)
+    cache.set(_enemy_atlas_key(cell), atlas, LOOKUP_SECONDS)
+    return atlas
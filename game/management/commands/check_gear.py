@@ -0,0 +1,29 @@
+# game/management/commands/check_gear.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from game.models import GEAR_FIELDS, Character, gear_drift
+
+
+class Command(BaseCommand):
+    help = "Recalcula los bonos de equipo (Character.gear_*) y reporta los que no cuadran."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Corrige los personajes con diferencias")
+
+    def handle(self, *args, fix, **options):
+        with transaction.atomic():
+            drift = gear_drift()
+            for character_id, (stored, wanted) in sorted(drift.items()):
+                self.stdout.write(f"personaje {character_id}: guardado {stored}, esperado {wanted}")
+                if fix:
+                    Character.objects.filter(pk=character_id).update(
+                        **{GEAR_FIELDS[stat]: value for stat, value in wanted.items()}
+                    )
+
+        if not drift:
+            self.stdout.write("Bonos de equipo OK")
+        elif fix:
+            self.stdout.write(f"{len(drift)} personajes corregidos")
+        else:
+            raise CommandError(f"{len(drift)} personajes con diferencias (usa --fix)")
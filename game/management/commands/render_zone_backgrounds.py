@@ -0,0 +1,41 @@
+# game/management/commands/render_zone_backgrounds.py
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from game import backgrounds
+from game.maps import MAPS
+
+
+def _render(zone, force):
+    path = backgrounds.ensure_background(zone, force=force)
+    return zone, path.name
+
+
+class Command(BaseCommand):
+    help = "Pre-renderiza los fondos de las zonas (por defecto todas) en WORLD_BACKGROUND_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument("zones", nargs="*", help="Zonas a renderizar, p. ej. 0-0 1--2")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--force", action="store_true", help="Re-renderiza aunque ya exista")
+
+    def handle(self, *args, zones, workers, force, **options):
+        zones = zones or sorted(z for z in MAPS if z != "center")
+        unknown = [z for z in zones if z not in MAPS]
+        if unknown:
+            raise CommandError(f"Zonas inexistentes: {', '.join(unknown)}")
+
+        if workers <= 1:
+            done = [_render(z, force) for z in zones]
+        else:
+            # cada proceso arma su propio Django (con spawn no se hereda)
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+                done = list(pool.map(_render, zones, [force] * len(zones)))
+
+        if options["verbosity"] > 1:
+            for zone, name in done:
+                self.stdout.write(f"{zone}: {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(done)} fondos listos en {backgrounds.background_root()}"))
@@ -0,0 +1,41 @@
+# game/management/commands/run_worker.py
+import json
+
+from django.core.management.base import BaseCommand
+
+from game.tasks import Worker, queue_stats, worker_enabled
+
+
+class Command(BaseCommand):
+    help = "Ejecuta las tareas encoladas en la BD (game/tasks.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=None,
+                            help="Hilos en paralelo (default: WORLD_TASK_CONCURRENCY)")
+        parser.add_argument("--once", action="store_true", help="Un solo lote (útil en cron)")
+        parser.add_argument("--stats", action="store_true", help="Solo muestra el estado de la cola")
+        parser.add_argument("--report-every", type=int, default=60,
+                            help="Segundos entre reportes de métricas")
+
+    def report(self, worker):
+        self.stdout.write(json.dumps({"worker": worker.metrics, "tasks": worker.by_name, "queue": queue_stats()}))
+
+    def handle(self, *args, concurrency, once, stats, report_every, **options):
+        if stats:
+            self.stdout.write(json.dumps(queue_stats()))
+            return
+
+        if not worker_enabled():
+            self.stderr.write("Aviso: WORLD_TASK_WORKER no está activo; las vistas corren sus tareas inline.")
+        worker = Worker(concurrency=concurrency)
+        if once:
+            ran = worker.step()
+            self.stdout.write(f"{ran} tareas ejecutadas")
+            self.report(worker)
+            return
+
+        self.stdout.write(f"Worker con {worker.concurrency} hilos (Ctrl+C para salir)")
+        try:
+            worker.run_forever(report=self.report, report_every=report_every)
+        except KeyboardInterrupt:
+            self.report(worker)
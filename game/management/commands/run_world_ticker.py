@@ -0,0 +1,34 @@
+# game/management/commands/run_world_ticker.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from game.respawns import RespawnTicker
+
+
+class Command(BaseCommand):
+    help = "Revive EnemySpawn vencidos fuera de las requests (WORLD_RESPAWN_TICKER = \"process\")."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Un solo tick (útil en cron)")
+
+    def handle(self, *args, once, **options):
+        # versión de spawns y broker se publican en este proceso: si son
+        # locales, los clientes de las vistas no se enteran de los respawns
+        local_cache = "locmem" in settings.CACHES["default"]["BACKEND"].lower()
+        local_broker = getattr(settings, "WORLD_BROKER", "game.pubsub.InProcessBroker").endswith("InProcessBroker")
+        if local_cache or local_broker:
+            self.stderr.write(
+                "Aviso: CACHES/WORLD_BROKER son locales a este proceso; los respawns no llegan "
+                "a los clientes. Configura un cache y un broker compartidos."
+            )
+        ticker = RespawnTicker()
+        if once:
+            revived = ticker.step()
+            self.stdout.write(f"{revived} spawns revividos")
+            return
+
+        self.stdout.write(f"Ticker de respawns cada {ticker.resolution}s (Ctrl+C para salir)")
+        try:
+            ticker.run_forever()
+        except KeyboardInterrupt:
+            pass
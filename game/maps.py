@@ -1,5 +1,7 @@
 # game/maps.py
 
+import hashlib
+import json
 import random
 
 G = "ground"
@@ -13,6 +15,12 @@ H = "house"
 
 CHAR = {"G": G, "W": W, "T": T, "S": S, "E": E, "Z": Z, "P": P,"H":H}
 
+# Igual que el frontend: wall, tree y house bloquean
+BLOCKING_TILES = frozenset((W, T, H))
+
+def is_walkable(tile):
+    return tile not in BLOCKING_TILES
+
 def parse(rows):
     # rows: lista de strings, cada string largo 18
     return [[CHAR[c] for c in r] for r in rows]
@@ -196,7 +204,9 @@ def build_map_for_zone(x: int, y: int) -> list[list[str]]:
     rows = make_base_canvas()
     carve_portals(rows)
 
-    # RNG determinista por zona => “aleatorio” pero fijo por coordenada
+    # RNG determinista por zona => “aleatorio” pero fijo por coordenada.
+    # Semilla entera (no hash() de str): ya es igual en todos los procesos y
+    # cambiarla movería los EnemySpawn ya sembrados.
     seed = (x * 73856093) ^ (y * 19349663) ^ 0xA5A5A5
     rng = random.Random(seed)
 
@@ -240,17 +250,64 @@ def build_map_for_zone(x: int, y: int) -> list[list[str]]:
     ensure_border_walls(rows)
     return parse(["".join(r) for r in rows])
 
+def build_enemy_index(grid: list[list[str]]) -> dict:
+    """
+    Índice espacial de encuentros de una zona:
+    (x, y) -> tupla de casillas 'enemy' (donde vive un EnemySpawn) que dispara.
+    - enemy: solo su propia casilla
+    - enemy_zone: los 'enemy' a radio 1 (Chebyshev), en orden de fila
+    Se arma una vez por mapa, así resolver un trigger es un lookup O(1).
+    """
+    rows = len(grid)
+    cols = len(grid[0]) if rows else 0
+
+    index = {}
+    for ey, row in enumerate(grid):
+        for ex, tile in enumerate(row):
+            if tile != E:
+                continue
+            index[(ex, ey)] = [(ex, ey)]
+            for ny in range(max(0, ey - 1), min(rows, ey + 2)):
+                for nx in range(max(0, ex - 1), min(cols, ex + 2)):
+                    if grid[ny][nx] == Z:
+                        index.setdefault((nx, ny), []).append((ex, ey))
+
+    # mismo orden en que se crean los spawns (fila, columna)
+    return {k: tuple(sorted(v, key=lambda c: (c[1], c[0]))) for k, v in index.items()}
+
+def build_map_asset(grid: list[list[str]]) -> tuple[bytes, str]:
+    """
+    JSON compacto del grid de una zona y su hash de contenido: el cliente lo
+    baja de una URL con el hash, cacheable para siempre (si el mapa cambia en
+    un deploy, cambia la URL).
+    """
+    body = json.dumps(grid, separators=(",", ":")).encode()
+    return body, hashlib.sha256(body).hexdigest()[:16]
+
 MAPS = {}
 
 for yy in range(MIN_C, MAX_C + 1):
     for xx in range(MIN_C, MAX_C + 1):
         key = zone_key(xx, yy)
+        grid = build_map_for_zone(xx, yy)
+        asset, asset_hash = build_map_asset(grid)
         MAPS[key] = {
             "name": key,
             "level": zone_level(xx, yy),   # <-- MUY ÚTIL para el backend
             "exits": exits_for_zone(xx, yy),
-            "map": build_map_for_zone(xx, yy),
+            "map": grid,
+            "enemy_index": build_enemy_index(grid),
+            "asset": asset,
+            "asset_hash": asset_hash,
         }
 
 # alias opcional (compatibilidad)
 MAPS["center"] = MAPS["0-0"]
+
+def enemy_spawn_candidates(zone: str, x: int, y: int) -> tuple:
+    """
+    Casillas de EnemySpawn que puede disparar pisar (x, y) en la zona.
+    Compartido por world_move y cualquier lógica de encuentros del servidor.
+    """
+    data = MAPS.get(zone) or MAPS["center"]
+    return data["enemy_index"].get((x, y), ())
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:11
+
+from django.db import migrations, models
+
+# copia congelada de models.RARITY_STAT_MULTIPLIER al escribir esta migración:
+# el historial no debe cambiar si después se ajustan los multiplicadores
+RARITY_STAT_MULTIPLIER = {
+    "basic": 1.0,
+    "uncommon": 1.8,
+    "rare": 3.0,
+    "epic": 5.0,
+    "legendary": 8.0,
+    "mythic": 10.0,
+    "ascended": 10.0,
+}
+
+
+def backfill_gear(apps, schema_editor):
+    # mismo cálculo que EquipmentItem.total_stats() sobre lo ya equipado
+    Character = apps.get_model("game", "Character")
+    EquipmentItem = apps.get_model("game", "EquipmentItem")
+
+    totals = {}
+    for item in EquipmentItem.objects.filter(is_equipped=True).iterator():
+        mult = RARITY_STAT_MULTIPLIER[item.rarity]
+        per = totals.setdefault(item.owner_id, {"gear_hp": 0, "gear_atk": 0, "gear_def": 0, "gear_speed": 0})
+        per["gear_hp"] += int(item.base_hp * mult)
+        per["gear_atk"] += int(item.base_atk * mult)
+        per["gear_def"] += int(item.base_def * mult)
+        per["gear_speed"] += int(item.base_speed * mult)
+
+    for character_id, values in totals.items():
+        Character.objects.filter(pk=character_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='gear_atk',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='gear_def',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='gear_hp',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='gear_speed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_gear, migrations.RunPython.noop),
+    ]
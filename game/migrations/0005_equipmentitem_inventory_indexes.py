@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_character_gear_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='game_item_owner_created'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['owner', 'is_equipped', 'slot'], name='game_item_owner_equipped'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentitem',
+            index=models.Index(fields=['owner', 'rarity'], name='game_item_owner_rarity'),
+        ),
+    ]
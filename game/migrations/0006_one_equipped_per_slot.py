@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:17
+
+from django.db import migrations, models
+
+# copia congelada de models.RARITY_STAT_MULTIPLIER al escribir esta migración:
+# el historial no debe cambiar si después se ajustan los multiplicadores
+RARITY_STAT_MULTIPLIER = {
+    "basic": 1.0,
+    "uncommon": 1.8,
+    "rare": 3.0,
+    "epic": 5.0,
+    "legendary": 8.0,
+    "mythic": 10.0,
+    "ascended": 10.0,
+}
+
+
+def unequip_duplicates(apps, schema_editor):
+    # antes del índice: si un slot tiene varios equipados queda el más nuevo
+    # y los demás se restan de los bonos del personaje
+    Character = apps.get_model("game", "Character")
+    EquipmentItem = apps.get_model("game", "EquipmentItem")
+
+    kept = set()
+    for item in EquipmentItem.objects.filter(is_equipped=True).order_by("-id").iterator():
+        if (item.owner_id, item.slot) not in kept:
+            kept.add((item.owner_id, item.slot))
+            continue
+        mult = RARITY_STAT_MULTIPLIER[item.rarity]
+        EquipmentItem.objects.filter(pk=item.pk).update(is_equipped=False)
+        Character.objects.filter(pk=item.owner_id).update(
+            gear_hp=models.F("gear_hp") - int(item.base_hp * mult),
+            gear_atk=models.F("gear_atk") - int(item.base_atk * mult),
+            gear_def=models.F("gear_def") - int(item.base_def * mult),
+            gear_speed=models.F("gear_speed") - int(item.base_speed * mult),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_equipmentitem_inventory_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(unequip_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='equipmentitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_equipped', True)), fields=('owner', 'slot'), name='game_item_one_equipped_per_slot'),
+        ),
+    ]
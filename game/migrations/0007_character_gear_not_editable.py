@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_one_equipped_per_slot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='character',
+            name='gear_atk',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='character',
+            name='gear_def',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='character',
+            name='gear_hp',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='character',
+            name='gear_speed',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from datetime import timedelta
+from functools import lru_cache
 
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, ExpressionWrapper, F, Value, When
 from django.utils import timezone
 
 
@@ -28,6 +30,17 @@ CLASS_STATS = {
 }
 
 
+def _forget_active(character_id):
+    # los UPDATE directos no pasan por post_save: el personaje activo
+    # cacheado (game/active_character.py) se descarta a mano
+    from .active_character import forget_cached_character
+    forget_cached_character(character_id)
+
+
+# stat -> columna de Character con el bono del equipo
+GEAR_FIELDS = {"hp": "gear_hp", "atk": "gear_atk", "def": "gear_def", "speed": "gear_speed"}
+
+
 class Character(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="characters")
     name = models.CharField(max_length=32)
@@ -56,6 +69,17 @@ class Character(models.Model):
     lives = models.IntegerField(default=3)
     lives_last_tick = models.DateTimeField(default=timezone.now)
 
+    # Bonos del equipo puesto: suma de total_stats() de los ítems equipados.
+    # Solo cambian con add_gear (UPDATE con F()) desde EquipmentItem; los
+    # save() del personaje en el juego van con update_fields y no los tocan.
+    # Un save() completo con una instancia vieja, o un QuerySet.update() de
+    # is_equipped/rareza/stats de ítems, los desalinea: `manage.py
+    # check_gear` (gear_drift) los recalcula desde cero.
+    gear_hp = models.IntegerField(default=0, editable=False)
+    gear_atk = models.IntegerField(default=0, editable=False)
+    gear_def = models.IntegerField(default=0, editable=False)
+    gear_speed = models.IntegerField(default=0, editable=False)
+
     MAX_LIVES = 3
     LIFE_REGEN_MINUTES = 10
 
@@ -69,88 +93,194 @@ class Character(models.Model):
         self.base_speed = stats["speed"]
         self.max_mana = stats["mana"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        character = super().from_db(db, field_names, values)
+        character._files_saved = character._file_names()
+        return character
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._files_saved = self._file_names()
+
+    def _file_names(self):
+        """{campo de archivo: nombre guardado} de los campos cargados."""
+        deferred = self.get_deferred_fields()
+        return {
+            f.attname: getattr(self, f.attname).name
+            for f in self._meta.concrete_fields
+            if isinstance(f, models.FileField) and f.attname not in deferred
+        }
+
+    def _unchanged_files(self):
+        # campos de archivo iguales a lo guardado: build_image_variants no
+        # rehace las variantes de una imagen que no cambió
+        saved = getattr(self, "_files_saved", {})
+        return {
+            name for name, value in self._file_names().items()
+            if name in saved and saved[name] == value and getattr(self, name)._committed
+        }
+
     def save(self, *args, **kwargs):
         # Si es nuevo, se asignan stats por clase
         if not self.pk:
             self.set_stats_from_class()
         super().save(*args, **kwargs)
+        self._files_saved = self._file_names()
+
+    def gear_stats(self):
+        return {stat: getattr(self, field) for stat, field in GEAR_FIELDS.items()}
+
+    @staticmethod
+    def add_gear(character_id, delta):
+        """Suma `delta` ({hp, atk, def, speed}) a los bonos de equipo en un UPDATE."""
+        changes = {field: F(field) + delta[stat] for stat, field in GEAR_FIELDS.items() if delta.get(stat)}
+        if changes:
+            Character.objects.filter(pk=character_id).update(**changes)
+            _forget_active(character_id)
 
     def __str__(self):
         return f"{self.name} ({self.get_char_class_display()})"
 
     # ---- XP / nivel (ejemplo simple, ajusta a lo que ya tenías) ----
-    def xp_to_next_level(self):
+    @staticmethod
+    def xp_needed(level):
         # nivel 1 → 100 xp, luego +10% cada nivel
-        if self.level == 1:
-            return 100
-        # podrías guardar esto en otro lado, aquí lo recalculo
         base = 100
-        for _ in range(1, self.level):
+        for _ in range(1, level):
             base = int(base * 1.10)
         return base
 
+    def xp_to_next_level(self):
+        return self.xp_needed(self.level)
+
+    @classmethod
+    def _level_after(cls, level, xp, amount):
+        """(nivel, xp, niveles subidos) después de sumar `amount` de XP."""
+        xp += amount
+        levels_up = 0
+        while xp >= cls.xp_needed(level):
+            xp -= cls.xp_needed(level)
+            level += 1
+            levels_up += 1
+        return level, xp, levels_up
+
     def gain_xp(self, amount):
         """Retorna cuántos niveles subió."""
-        self.xp += amount
-        levels_up = 0
-        while True:
-            needed = self.xp_to_next_level()
-            if self.xp >= needed:
-                self.xp -= needed
-                self.level += 1
-                levels_up += 1
-            else:
-                break
-        self.save()
+        self.level, self.xp, levels_up = self._level_after(self.level, self.xp, amount)
+        self.save(update_fields=["level", "xp"])
         return levels_up
 
-    def regen_lives(self, now=None):
-        now = now or timezone.now()
+    def grant_rewards(self, xp=0, orbs_bronze=0, orbs_silver=0, orbs_gold=0, attempts=3):
+        """
+        Suma XP y orbes en un solo UPDATE. Los orbes van con F() (nunca se
+        pisan); nivel y xp se calculan desde lo leído y el UPDATE es
+        condicional a que sigan igual: si otra request subió XP entre medio
+        se relee y se reintenta. Retorna cuántos niveles subió.
+        """
+        qs = Character.objects.filter(pk=self.pk)
+        orbs = {
+            "orbs_bronze": F("orbs_bronze") + orbs_bronze,
+            "orbs_silver": F("orbs_silver") + orbs_silver,
+            "orbs_gold": F("orbs_gold") + orbs_gold,
+        }
+        stored_level, stored_xp = self.level, self.xp
+        for attempt in range(attempts + 1):
+            if attempt == attempts:
+                # mucha contención: el último intento va con la fila bloqueada
+                with transaction.atomic():
+                    stored_level, stored_xp = qs.select_for_update().values_list("level", "xp").get()
+                    level, new_xp, levels_up = self._level_after(stored_level, stored_xp, xp)
+                    qs.update(level=level, xp=new_xp, **orbs)
+                break
+            level, new_xp, levels_up = self._level_after(stored_level, stored_xp, xp)
+            if qs.filter(level=stored_level, xp=stored_xp).update(level=level, xp=new_xp, **orbs):
+                break
+            stored_level, stored_xp = qs.values_list("level", "xp").get()
 
+        _forget_active(self.pk)
+        self.level, self.xp = level, new_xp
+        self.orbs_bronze += orbs_bronze
+        self.orbs_silver += orbs_silver
+        self.orbs_gold += orbs_gold
+        return levels_up
+
+    def _lives_at(self, lives, tick, now):
+        """
+        Vidas efectivas a `now` a partir de lo guardado (lives, lives_last_tick),
+        sin escribir nada. Retorna (vidas, tick, ganadas). Da lo mismo que
+        aplicar la regeneración en cada request y guardarla.
+        """
         # Si por alguna razón está null o futuro
-        if not self.lives_last_tick or self.lives_last_tick > now:
-            self.lives_last_tick = now
+        if not tick or tick > now:
+            tick = now
 
-        if self.lives >= self.MAX_LIVES:
-            # full: dejamos tick alineado para no acumular
-            self.lives = self.MAX_LIVES
-            self.lives_last_tick = now
-            self.save(update_fields=["lives", "lives_last_tick"])
-            return {"lives": self.lives, "gained": 0, "seconds_to_next": 0}
+        if lives >= self.MAX_LIVES:
+            # full: el tick queda alineado a now para no acumular
+            return self.MAX_LIVES, now, 0
 
         interval = timedelta(minutes=self.LIFE_REGEN_MINUTES)
-        elapsed = now - self.lives_last_tick
-        ticks = int(elapsed.total_seconds() // interval.total_seconds())
-
+        ticks = int((now - tick).total_seconds() // interval.total_seconds())
         if ticks <= 0:
-            # falta para la siguiente
-            next_at = self.lives_last_tick + interval
-            return {
-                "lives": self.lives,
-                "gained": 0,
-                "seconds_to_next": max(0, int((next_at - now).total_seconds())),
-            }
-
-        gained = min(ticks, self.MAX_LIVES - self.lives)
-        self.lives += gained
+            return lives, tick, 0
 
+        gained = min(ticks, self.MAX_LIVES - lives)
         # avanzamos el tick SOLO por los que “consumimos”
-        self.lives_last_tick = self.lives_last_tick + (interval * gained)
+        tick = tick + interval * gained
+        lives += gained
 
         # si quedamos full, reseteamos tick a now para no acumular
-        if self.lives >= self.MAX_LIVES:
-            self.lives = self.MAX_LIVES
-            self.lives_last_tick = now
+        if lives >= self.MAX_LIVES:
+            return self.MAX_LIVES, now, gained
+        return lives, tick, gained
 
-        self.save(update_fields=["lives", "lives_last_tick"])
+    def regen_lives(self, now=None):
+        """
+        Aplica la regeneración en memoria (lives / lives_last_tick) y retorna
+        {"lives", "gained", "seconds_to_next"}. No escribe: lo guardado solo
+        cambia cuando se gasta una vida (consume_life).
+        """
+        now = now or timezone.now()
+        self.lives, self.lives_last_tick, gained = self._lives_at(self.lives, self.lives_last_tick, now)
 
         seconds_to_next = 0
         if self.lives < self.MAX_LIVES:
-            next_at = self.lives_last_tick + interval
+            next_at = self.lives_last_tick + timedelta(minutes=self.LIFE_REGEN_MINUTES)
             seconds_to_next = max(0, int((next_at - now).total_seconds()))
 
         return {"lives": self.lives, "gained": gained, "seconds_to_next": seconds_to_next}
 
+    def consume_life(self, now=None, attempts=3) -> bool:
+        """
+        Gasta una vida (regeneración incluida) con un UPDATE condicional sobre
+        lo guardado: si otra request cambió las vidas entre medio se reintenta
+        con los valores nuevos. Retorna False solo si no quedaban vidas.
+        """
+        now = now or timezone.now()
+        qs = Character.objects.filter(pk=self.pk)
+        for attempt in range(attempts + 1):
+            if attempt == attempts:
+                # mucha contención: el último intento va con la fila bloqueada
+                with transaction.atomic():
+                    stored_lives, stored_tick = qs.select_for_update().values_list("lives", "lives_last_tick").get()
+                    lives, tick, _ = self._lives_at(stored_lives, stored_tick, now)
+                    if lives > 0:
+                        qs.update(lives=lives - 1, lives_last_tick=tick)
+                break
+            stored_lives, stored_tick = qs.values_list("lives", "lives_last_tick").get()
+            lives, tick, _ = self._lives_at(stored_lives, stored_tick, now)
+            if lives <= 0 or qs.filter(lives=stored_lives, lives_last_tick=stored_tick).update(
+                lives=lives - 1, lives_last_tick=tick
+            ):
+                break
+
+        if lives <= 0:
+            self.lives, self.lives_last_tick = lives, tick
+            return False
+        _forget_active(self.pk)
+        self.lives, self.lives_last_tick = lives - 1, tick
+        return True
+
 
 class EnemyType(models.Model):
     name = models.CharField(max_length=50)
@@ -241,6 +371,31 @@ RARITY_STAT_MULTIPLIER = {
 }
 
 
+# mismo multiplicador en décimas (enteros): la BD calcula base * m // 10, que
+# da lo mismo que int(base * multiplicador) de total_stats()
+RARITY_STAT_MULTIPLIER_X10 = {rarity: round(mult * 10) for rarity, mult in RARITY_STAT_MULTIPLIER.items()}
+
+# stat -> columna base del ítem
+ITEM_BASE_FIELDS = {"hp": "base_hp", "atk": "base_atk", "def": "base_def", "speed": "base_speed"}
+
+
+class EquipmentItemQuerySet(models.QuerySet):
+    def with_stats(self):
+        """
+        Anota bonus_hp/atk/def/speed: los stats finales (rareza aplicada)
+        calculados en la BD, lo mismo que total_stats() por ítem.
+        """
+        mult = Case(
+            *[When(rarity=rarity, then=Value(m)) for rarity, m in RARITY_STAT_MULTIPLIER_X10.items()],
+            default=Value(10),
+            output_field=models.IntegerField(),
+        )
+        return self.annotate(**{
+            f"bonus_{stat}": ExpressionWrapper(F(field) * mult / 10, output_field=models.IntegerField())
+            for stat, field in ITEM_BASE_FIELDS.items()
+        })
+
+
 class EquipmentItem(models.Model):
     owner = models.ForeignKey(Character, on_delete=models.CASCADE, related_name="equipment_items")
     name = models.CharField(max_length=64)
@@ -257,6 +412,26 @@ class EquipmentItem(models.Model):
     image = models.ImageField(upload_to="items/", null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = EquipmentItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # inventario: página por defecto (más nuevos primero, id desempata)
+            models.Index(fields=["owner", "created_at", "id"], name="game_item_owner_created"),
+            # equipados del personaje / ítem equipado en un slot
+            models.Index(fields=["owner", "is_equipped", "slot"], name="game_item_owner_equipped"),
+            # filtro por rareza
+            models.Index(fields=["owner", "rarity"], name="game_item_owner_rarity"),
+        ]
+        constraints = [
+            # a lo más un ítem equipado por slot
+            models.UniqueConstraint(
+                fields=["owner", "slot"],
+                condition=models.Q(is_equipped=True),
+                name="game_item_one_equipped_per_slot",
+            ),
+        ]
+
     def total_stats(self):
         mult = RARITY_STAT_MULTIPLIER[self.rarity]
         return {
@@ -266,10 +441,197 @@ class EquipmentItem(models.Model):
             "speed": int(self.base_speed * mult),
         }
 
+    # ---- bonos en Character.gear_* ----
+
+    GEAR_SOURCE_FIELDS = {"owner_id", "is_equipped", "rarity", "base_hp", "base_atk", "base_def", "base_speed"}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        item = super().from_db(db, field_names, values)
+        item._gear_saved = item._gear_contribution()
+        return item
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._gear_saved = self._gear_contribution()
+
+    def _gear_contribution(self):
+        """(personaje, bonos) que aporta tal como está; None si falta un campo cargado."""
+        if self.GEAR_SOURCE_FIELDS & self.get_deferred_fields():
+            return None
+        return self.owner_id, (self.total_stats() if self.is_equipped else {})
+
+    def save(self, *args, **kwargs):
+        """
+        Guarda y ajusta los bonos del personaje en la misma transacción:
+        resta lo que aportaba al leerse y suma lo que aporta ahora (equipar,
+        desequipar, subir de nivel/rareza...).
+        """
+        with transaction.atomic():
+            before = None if self._state.adding else getattr(self, "_gear_saved", None)
+            if before is None and not self._state.adding:
+                before = EquipmentItem.objects.get(pk=self.pk)._gear_saved
+            super().save(*args, **kwargs)
+
+            after = self._gear_contribution()
+            if after is None:
+                after = EquipmentItem.objects.get(pk=self.pk)._gear_saved
+            for owner_id, delta in gear_changes([before], [after]):
+                Character.add_gear(owner_id, delta)
+            self._gear_saved = after
+
+    def set_equipped(self, equip=True, attempts=2):
+        """
+        Equipa (sacando lo que ocupaba el slot) o desequipa; los ítems, el
+        que sale y los bonos del personaje cambian juntos. Retorna el
+        loadout resultante (ítems equipados del personaje).
+
+        El índice único parcial (owner, slot) WHERE is_equipped impide dos
+        equipados en un slot: si un click concurrente ganó, el INSERT en el
+        índice falla y se reintenta sobre lo que dejó el otro.
+        """
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic():
+                    if equip and connection.vendor == "postgresql":
+                        loadout = self._equip_statement()
+                    else:
+                        loadout = self._set_equipped_orm(equip)
+                self.is_equipped = equip
+                self._gear_saved = self._gear_contribution()
+                return loadout
+            except IntegrityError:
+                if attempt == attempts - 1:
+                    raise
+
+    def _set_equipped_orm(self, equip):
+        # lo guardado manda: otra request pudo cambiar el ítem entre medio
+        self._gear_saved = EquipmentItem.objects.select_for_update().get(pk=self.pk)._gear_saved
+        if equip:
+            previous = list(
+                EquipmentItem.objects.select_for_update()
+                .filter(owner_id=self.owner_id, slot=self.slot, is_equipped=True)
+                .exclude(pk=self.pk)
+            )
+            if previous:
+                # primero se saca el anterior: el índice único nunca ve dos
+                EquipmentItem.objects.filter(pk__in=[p.pk for p in previous]).update(is_equipped=False)
+                for owner_id, delta in gear_changes([p._gear_saved for p in previous], []):
+                    Character.add_gear(owner_id, delta)
+        self.is_equipped = equip
+        self.save()
+        return list(EquipmentItem.objects.filter(owner_id=self.owner_id, is_equipped=True).with_stats().order_by("slot"))
+
+    def _equip_statement(self):
+        """PostgreSQL: equipar, sacar el anterior, bonos y loadout en un solo statement."""
+        field_names = [f.attname for f in self._meta.concrete_fields]
+        with connection.cursor() as cursor:
+            cursor.execute(_equip_sql(), {"item_id": self.pk, "owner_id": self.owner_id})
+            rows = cursor.fetchall()
+        return [EquipmentItem.from_db(connection.alias, field_names, row) for row in rows]
+
     def __str__(self):
         return f"{self.name} ({self.get_rarity_display()})"
 
 
+@lru_cache(maxsize=None)
+def _equip_sql():
+    """
+    Un statement con CTEs (PostgreSQL) que saca el ítem equipado del slot,
+    equipa el nuevo, ajusta Character.gear_* y retorna el loadout nuevo.
+
+    Los sub-statements de un WITH corren sobre el mismo snapshot y en orden
+    no garantizado; `equipped` lee el conteo de `unequipped`, así que el
+    anterior ya salió cuando el índice único recibe el nuevo. El SELECT
+    final ve el snapshot previo: por eso arma el loadout a mano.
+    """
+    item = EquipmentItem._meta.db_table
+    char = Character._meta.db_table
+    mult = "CASE i.rarity {} ELSE 10 END".format(
+        " ".join(f"WHEN '{rarity}' THEN {m}" for rarity, m in RARITY_STAT_MULTIPLIER_X10.items())
+    )
+    stats = ", ".join(
+        f"i.{column} * {mult} / 10 AS {alias}"
+        for alias, column in (("hp", "base_hp"), ("atk", "base_atk"), ("df", "base_def"), ("spd", "base_speed"))
+    )
+    columns = ", ".join(
+        "true AS is_equipped" if f.attname == "is_equipped" else f.column
+        for f in EquipmentItem._meta.concrete_fields
+    )
+    return f"""
+        WITH target AS (
+            SELECT id, owner_id, slot FROM {item}
+            WHERE id = %(item_id)s AND owner_id = %(owner_id)s
+            FOR UPDATE
+        ), unequipped AS (
+            UPDATE {item} AS i SET is_equipped = false
+            FROM target AS t
+            WHERE i.owner_id = t.owner_id AND i.slot = t.slot AND i.is_equipped AND i.id <> t.id
+            RETURNING i.id, {stats}
+        ), equipped AS (
+            UPDATE {item} AS i SET is_equipped = true
+            FROM target AS t, (SELECT count(*) AS n FROM unequipped) AS done
+            WHERE i.id = t.id AND NOT i.is_equipped AND done.n >= 0
+            RETURNING i.id, {stats}
+        ), gear AS (
+            UPDATE {char} AS c SET
+                gear_hp = c.gear_hp + d.hp, gear_atk = c.gear_atk + d.atk,
+                gear_def = c.gear_def + d.df, gear_speed = c.gear_speed + d.spd
+            FROM (
+                SELECT COALESCE(SUM(hp), 0) AS hp, COALESCE(SUM(atk), 0) AS atk,
+                       COALESCE(SUM(df), 0) AS df, COALESCE(SUM(spd), 0) AS spd
+                FROM (
+                    SELECT hp, atk, df, spd FROM equipped
+                    UNION ALL
+                    SELECT -hp, -atk, -df, -spd FROM unequipped
+                ) AS changes
+            ) AS d
+            WHERE c.id = %(owner_id)s
+        )
+        SELECT {columns} FROM {item}
+        WHERE owner_id = %(owner_id)s
+          AND ((is_equipped AND id NOT IN (SELECT id FROM unequipped)) OR id IN (SELECT id FROM equipped))
+        ORDER BY slot
+    """
+
+
+def gear_changes(before, after):
+    """
+    [(personaje, delta)] para pasar de las contribuciones `before` a las
+    `after` (listas de (owner_id, {stat: valor}) o None).
+    """
+    totals = {}
+    for contributions, sign in ((before, -1), (after, 1)):
+        for contribution in contributions:
+            if not contribution:
+                continue
+            owner_id, stats = contribution
+            per = totals.setdefault(owner_id, {})
+            for stat, value in stats.items():
+                per[stat] = per.get(stat, 0) + sign * value
+    return [(owner_id, delta) for owner_id, delta in totals.items() if any(delta.values())]
+
+
+def gear_drift():
+    """
+    Recalcula los bonos de equipo desde los ítems equipados y retorna
+    {character_id: (guardado, esperado)} de los personajes que no cuadran.
+    """
+    expected = {}
+    for item in EquipmentItem.objects.filter(is_equipped=True).iterator():
+        per = expected.setdefault(item.owner_id, dict.fromkeys(GEAR_FIELDS, 0))
+        for stat, value in item.total_stats().items():
+            per[stat] += value
+
+    drift = {}
+    for character in Character.objects.only("id", *GEAR_FIELDS.values()).iterator():
+        stored = character.gear_stats()
+        wanted = expected.get(character.pk, dict.fromkeys(GEAR_FIELDS, 0))
+        if stored != wanted:
+            drift[character.pk] = (stored, wanted)
+    return drift
+
+
 # ==========================
 # Mundo compartido
 # ==========================
@@ -299,3 +661,40 @@ class EnemySpawn(models.Model):
 
     def __str__(self):
         return f"{self.enemy_type.name} spawn @({self.x},{self.y}) [{self.zone}]"
+
+
+# ==========================
+# Tareas en segundo plano (game/tasks.py)
+# ==========================
+
+class TaskStatus(models.TextChoices):
+    PENDING = "pending", "Pendiente"
+    RUNNING = "running", "En curso"
+    DONE = "done", "Hecha"
+    FAILED = "failed", "Fallida"
+
+
+class Task(models.Model):
+    """
+    Trabajo diferido: las vistas lo encolan con un INSERT y lo ejecuta
+    `manage.py run_worker`.
+    """
+    name = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=TaskStatus.choices, default=TaskStatus.PENDING)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_at = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # lo que busca el worker: pendientes vencidas por orden de run_at
+            models.Index(fields=["status", "run_at"], name="game_task_status_run_at"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.status}] #{self.pk}"
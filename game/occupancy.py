@@ -0,0 +1,327 @@
+# game/occupancy.py
+"""
+Ocupación de zonas: zona -> {character_id: (x, y, datos públicos)}.
+
+Es la fuente de "quién está en la zona" para el mundo (ya no se consulta
+PlayerState). Se mantiene en los movimientos, cambios de zona y teleports a
+la zona segura, publica cada cambio en zone_feed y saca a los jugadores que
+no se mueven hace WORLD_OCCUPANCY_IDLE_SECONDS.
+
+Backends (WORLD_OCCUPANCY_BACKEND):
+- LocalOccupancyBackend: memoria del proceso, con grilla de buckets para el
+  área de interés. Sirve con un solo worker.
+- SharedOccupancyBackend: hashes en un servidor compartido (Redis) para que
+  todos los workers vean lo mismo; LocalHashClient lo reemplaza en tests.
+"""
+from collections import defaultdict
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .zone_feed import ENTER, LEAVE, MOVE, zone_feed, player_public_data
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _by_distance(x, y, radius, limit, players, exclude=None):
+    """Jugadores a distancia Chebyshev <= radius, más cercanos primero, con tope."""
+    found = []
+    for p in players:
+        if p["id"] == exclude:
+            continue
+        dx, dy = abs(p["x"] - x), abs(p["y"] - y)
+        if max(dx, dy) <= radius:
+            found.append((max(dx, dy), dx * dx + dy * dy, p["id"], p))
+    found.sort(key=lambda f: f[:3])
+    return [f[3] for f in found[:limit]]
+
+
+# ==========================
+# Backends
+# ==========================
+
+class OccupancyBackend:
+    """Interfaz mínima de un backend de ocupación."""
+
+    def put(self, zone, data, seen):
+        raise NotImplementedError
+
+    def remove(self, zone, player_id):
+        raise NotImplementedError
+
+    def get(self, zone, player_id):
+        """(datos, visto_por_última_vez) o None."""
+        raise NotImplementedError
+
+    def members(self, zone) -> dict:
+        """{player_id: (datos, visto_por_última_vez)}"""
+        raise NotImplementedError
+
+    def clear(self, zone=None):
+        raise NotImplementedError
+
+    def nearby(self, zone, x, y, radius, limit, exclude=None):
+        return _by_distance(
+            x, y, radius, limit,
+            (data for data, _ in self.members(zone).values()),
+            exclude,
+        )
+
+
+class ZoneGrid:
+    """Jugadores de una zona indexados por bucket de bucket_size x bucket_size."""
+
+    def __init__(self, bucket_size=6):
+        self.bucket_size = bucket_size
+        self.players = {}                  # id -> (datos, visto)
+        self.buckets = defaultdict(set)    # (bx, by) -> ids
+
+    def _bucket(self, x, y):
+        return x // self.bucket_size, y // self.bucket_size
+
+    def upsert(self, data, seen):
+        self.remove(data["id"])
+        self.players[data["id"]] = (data, seen)
+        self.buckets[self._bucket(data["x"], data["y"])].add(data["id"])
+
+    def remove(self, player_id):
+        old = self.players.pop(player_id, None)
+        if old:
+            self.buckets[self._bucket(old[0]["x"], old[0]["y"])].discard(player_id)
+
+    def nearby(self, x, y, radius, limit, exclude=None):
+        bs = self.bucket_size
+        candidates = []
+        for by in range((y - radius) // bs, (y + radius) // bs + 1):
+            for bx in range((x - radius) // bs, (x + radius) // bs + 1):
+                for pid in self.buckets.get((bx, by), ()):
+                    candidates.append(self.players[pid][0])
+        return _by_distance(x, y, radius, limit, candidates, exclude)
+
+
+class LocalOccupancyBackend(OccupancyBackend):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zones = defaultdict(lambda: ZoneGrid(_setting("WORLD_OCCUPANCY_BUCKET", 6)))
+
+    def put(self, zone, data, seen):
+        with self._lock:
+            self._zones[zone].upsert(data, seen)
+
+    def remove(self, zone, player_id):
+        with self._lock:
+            if zone in self._zones:
+                self._zones[zone].remove(player_id)
+
+    def get(self, zone, player_id):
+        with self._lock:
+            grid = self._zones.get(zone)
+            return grid.players.get(player_id) if grid else None
+
+    def members(self, zone):
+        with self._lock:
+            grid = self._zones.get(zone)
+            return dict(grid.players) if grid else {}
+
+    def clear(self, zone=None):
+        with self._lock:
+            if zone is None:
+                self._zones.clear()
+            else:
+                self._zones.pop(zone, None)
+
+    def nearby(self, zone, x, y, radius, limit, exclude=None):
+        with self._lock:
+            grid = self._zones.get(zone)
+            return grid.nearby(x, y, radius, limit, exclude) if grid else []
+
+
+class LocalHashClient:
+    """
+    Reemplazo en memoria de un cliente Redis (solo hset/hget/hdel/hgetall/
+    delete/scan_iter), para tests o para correr el backend compartido sin
+    servidor.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes = defaultdict(dict)
+
+    def hset(self, name, key, value):
+        with self._lock:
+            self._hashes[name][str(key)] = value
+
+    def hget(self, name, key):
+        with self._lock:
+            return self._hashes.get(name, {}).get(str(key))
+
+    def hdel(self, name, key):
+        with self._lock:
+            self._hashes.get(name, {}).pop(str(key), None)
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def delete(self, *names):
+        with self._lock:
+            for name in names:
+                self._hashes.pop(name, None)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        with self._lock:
+            return [n for n in self._hashes if n.startswith(prefix)]
+
+
+class SharedOccupancyBackend(OccupancyBackend):
+    """
+    Un hash por zona en un servidor compartido: todos los workers ven la
+    misma ocupación. Sin WORLD_OCCUPANCY_REDIS_URL usa LocalHashClient.
+    """
+    PREFIX = "world:occupancy:"
+
+    def __init__(self, client=None):
+        if client is None:
+            url = _setting("WORLD_OCCUPANCY_REDIS_URL", None)
+            if url:
+                try:
+                    import redis
+                except ImportError as e:
+                    raise ImproperlyConfigured(
+                        "WORLD_OCCUPANCY_REDIS_URL requiere el paquete 'redis'."
+                    ) from e
+                client = redis.Redis.from_url(url)
+            else:
+                client = LocalHashClient()
+        self.client = client
+
+    def _key(self, zone):
+        return self.PREFIX + zone
+
+    def put(self, zone, data, seen):
+        self.client.hset(self._key(zone), data["id"], json.dumps([data, seen]))
+
+    def remove(self, zone, player_id):
+        self.client.hdel(self._key(zone), player_id)
+
+    def get(self, zone, player_id):
+        raw = self.client.hget(self._key(zone), player_id)
+        return tuple(json.loads(raw)) if raw else None
+
+    def members(self, zone):
+        out = {}
+        for raw in self.client.hgetall(self._key(zone)).values():
+            data, seen = json.loads(raw)
+            out[data["id"]] = (data, seen)
+        return out
+
+    def clear(self, zone=None):
+        if zone is not None:
+            self.client.delete(self._key(zone))
+            return
+        names = list(self.client.scan_iter(self.PREFIX + "*"))
+        if names:
+            self.client.delete(*names)
+
+
+# ==========================
+# Servicio
+# ==========================
+
+class ZoneOccupancy:
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._last_sweep = {}
+
+    @property
+    def backend(self) -> OccupancyBackend:
+        if self._backend is None:
+            path = _setting("WORLD_OCCUPANCY_BACKEND", "game.occupancy.LocalOccupancyBackend")
+            self._backend = import_string(path)()
+        return self._backend
+
+    # ---------- cambios (cada uno queda también en zone_feed) ----------
+
+    def enter(self, character, state):
+        data = player_public_data(character, state)
+        self.backend.put(state.zone, data, time.time())
+        return zone_feed.publish(state.zone, ENTER, character.id, data)
+
+    def move(self, character, state):
+        data = player_public_data(character, state)
+        self.backend.put(state.zone, data, time.time())
+        return zone_feed.publish(state.zone, MOVE, character.id, data)
+
+    def leave(self, character_id, zone: str):
+        self.backend.remove(zone, character_id)
+        return zone_feed.publish(zone, LEAVE, character_id)
+
+    def touch(self, character, state):
+        """
+        El jugador sigue ahí aunque no se mueva (p. ej. su pestaña hace
+        polling): renueva su "visto" sin publicar nada. Si ya había sido
+        sacado por inactivo, vuelve a entrar.
+        """
+        entry = self.backend.get(state.zone, character.id)
+        if entry is None:
+            return self.enter(character, state)
+        self.backend.put(state.zone, entry[0], time.time())
+
+    def transfer(self, character, old_zone: str, state):
+        """Cambio de zona (borde, teleport a 0-0...)."""
+        if old_zone != state.zone:
+            self.leave(character.id, old_zone)
+        return self.enter(character, state)
+
+    # ---------- lectura ----------
+
+    def evict_idle(self, zone: str, now=None):
+        """Saca a los que no se movieron hace WORLD_OCCUPANCY_IDLE_SECONDS."""
+        now = now or time.time()
+        cutoff = now - _setting("WORLD_OCCUPANCY_IDLE_SECONDS", 300)
+        evicted = [pid for pid, (_, seen) in self.backend.members(zone).items() if seen < cutoff]
+        for pid in evicted:
+            self.leave(pid, zone)
+        self._last_sweep[zone] = now
+        return evicted
+
+    def visible_to(self, state):
+        """
+        Área de interés del jugador: (versión del log, jugadores dentro del
+        radio de visión, del más cercano al más lejano y con tope).
+        """
+        now = time.time()
+        if now - self._last_sweep.get(state.zone, 0) >= _setting("WORLD_OCCUPANCY_SWEEP_SECONDS", 30):
+            self.evict_idle(state.zone, now)
+
+        version = zone_feed.version(state.zone)
+        return version, self.backend.nearby(
+            state.zone,
+            state.x,
+            state.y,
+            _setting("WORLD_VIEW_RADIUS", 12),
+            _setting("WORLD_VIEW_MAX_PLAYERS", 50),
+            exclude=state.character_id,
+        )
+
+    def count(self, zone: str) -> int:
+        """Cuántos jugadores hay en la zona (resumen para prefetch)."""
+        return len(self.backend.members(zone))
+
+    def forget(self, zone=None):
+        """Vacía la ocupación de una zona (o de todas)."""
+        self.backend.clear(zone)
+        if zone is None:
+            self._last_sweep.clear()
+        else:
+            self._last_sweep.pop(zone, None)
+
+
+occupancy = ZoneOccupancy()
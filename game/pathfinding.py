@@ -0,0 +1,236 @@
+# game/pathfinding.py
+"""
+Pathfinding del mundo:
+- dentro de una zona: A* 4-direccional sobre la caminabilidad de maps.is_walkable
+- entre zonas: rutas sobre el grafo de exits_for_zone
+
+Todo se precalcula perezosamente y queda cacheado por proceso (los mapas son
+fijos): un bitset de caminabilidad por zona y una tabla de distancias /
+siguiente salto por zona de origen.
+"""
+from collections import deque
+from functools import lru_cache
+import heapq
+
+from .maps import MAPS, is_walkable
+
+
+# paso -> (dx, dy); mismas letras que acepta world_move
+STEPS = {"w": (0, -1), "s": (0, 1), "a": (-1, 0), "d": (1, 0)}
+_STEP_FOR_DELTA = {d: k for k, d in STEPS.items()}
+
+
+def _zone_data(zone: str):
+    return MAPS.get(zone) or MAPS["center"]
+
+
+# ==========================
+# Dentro de una zona
+# ==========================
+
+@lru_cache(maxsize=None)
+def walk_grid(zone: str):
+    """
+    (bitset, rows, cols): el bit y*cols+x está prendido si la casilla se
+    puede pisar. Sirve para cualquier tamaño de zona.
+    """
+    grid = _zone_data(zone)["map"]
+    rows = len(grid)
+    cols = len(grid[0]) if rows else 0
+
+    bits = 0
+    for y, row in enumerate(grid):
+        for x, tile in enumerate(row):
+            if is_walkable(tile):
+                bits |= 1 << (y * cols + x)
+    return bits, rows, cols
+
+
+def can_walk(zone: str, x: int, y: int) -> bool:
+    bits, rows, cols = walk_grid(zone)
+    return 0 <= x < cols and 0 <= y < rows and bool(bits >> (y * cols + x) & 1)
+
+
+def find_path(zone: str, start, goal):
+    """
+    A* de start a goal (tuplas (x, y)) dentro de la zona.
+    Retorna la lista de casillas sin incluir start, [] si ya está ahí,
+    o None si no hay camino.
+    """
+    if start == goal:
+        return []
+    if not can_walk(zone, *goal):
+        return None
+
+    bits, rows, cols = walk_grid(zone)
+    gx, gy = goal
+    sx, sy = start
+    start_i = sy * cols + sx
+    goal_i = gy * cols + gx
+
+    came_from = {start_i: None}
+    cost = {start_i: 0}
+    # (f, -g, índice): a igual f se expande primero el nodo más avanzado
+    open_heap = [(abs(sx - gx) + abs(sy - gy), 0, start_i)]
+
+    while open_heap:
+        _, neg_g, i = heapq.heappop(open_heap)
+        g = -neg_g
+        if i == goal_i:
+            break
+        if g > cost[i]:
+            continue
+
+        x, y = i % cols, i // cols
+        for dx, dy in STEPS.values():
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < cols and 0 <= ny < rows):
+                continue
+            ni = ny * cols + nx
+            if not bits >> ni & 1:
+                continue
+            ng = g + 1
+            if ng < cost.get(ni, ng + 1):
+                cost[ni] = ng
+                came_from[ni] = i
+                heapq.heappush(open_heap, (ng + abs(nx - gx) + abs(ny - gy), -ng, ni))
+    else:
+        return None
+
+    path = []
+    i = goal_i
+    while i != start_i:
+        path.append((i % cols, i // cols))
+        i = came_from[i]
+    path.reverse()
+    return path
+
+
+def nearest_tile(zone: str, start, tile: str):
+    """
+    Camino (BFS) a la casilla más cercana de cierto tipo ("shop", "portal"...).
+    None si no hay ninguna alcanzable.
+    """
+    grid = _zone_data(zone)["map"]
+    bits, rows, cols = walk_grid(zone)
+    sx, sy = start
+
+    came_from = {(sx, sy): None}
+    queue = deque([(sx, sy)])
+    while queue:
+        x, y = queue.popleft()
+        if grid[y][x] == tile and (x, y) != (sx, sy):
+            path = []
+            c = (x, y)
+            while c != (sx, sy):
+                path.append(c)
+                c = came_from[c]
+            path.reverse()
+            return path
+
+        for dx, dy in STEPS.values():
+            nx, ny = x + dx, y + dy
+            if (nx, ny) in came_from:
+                continue
+            if 0 <= nx < cols and 0 <= ny < rows and bits >> (ny * cols + nx) & 1:
+                came_from[(nx, ny)] = (x, y)
+                queue.append((nx, ny))
+    return None
+
+
+def path_to_steps(start, path):
+    """Casillas -> letras de paso (w/a/s/d) para world_move."""
+    steps = []
+    x, y = start
+    for nx, ny in path:
+        steps.append(_STEP_FOR_DELTA[(nx - x, ny - y)])
+        x, y = nx, ny
+    return steps
+
+
+# ==========================
+# Entre zonas
+# ==========================
+
+@lru_cache(maxsize=None)
+def zone_distances(source: str):
+    """
+    Tabla BFS desde una zona: {zona: (distancia, zona anterior)}.
+    Se calcula una vez por zona de origen y queda cacheada.
+    """
+    table = {source: (0, None)}
+    queue = deque([source])
+    while queue:
+        z = queue.popleft()
+        dist = table[z][0]
+        for nz in _zone_data(z)["exits"].values():
+            if nz in MAPS and nz not in table:
+                table[nz] = (dist + 1, z)
+                queue.append(nz)
+    return table
+
+
+def zone_route(source: str, target: str):
+    """Lista de zonas de source a target (ambas incluidas), o None."""
+    # "center" es un alias de "0-0", no un nodo aparte
+    if source == "center":
+        source = "0-0"
+    if target == "center":
+        target = "0-0"
+
+    table = zone_distances(source)
+    if target not in table:
+        return None
+
+    route = []
+    z = target
+    while z is not None:
+        route.append(z)
+        z = table[z][1]
+    route.reverse()
+    return route
+
+
+def exit_direction(zone: str, next_zone: str):
+    """Dirección ("north", ...) que lleva de zone a next_zone."""
+    for direction, z in _zone_data(zone)["exits"].items():
+        if z == next_zone:
+            return direction
+    return None
+
+
+def exit_tiles(zone: str, direction: str):
+    """Casillas caminables del borde que disparan la salida en esa dirección."""
+    bits, rows, cols = walk_grid(zone)
+    if direction == "north":
+        edge = [(x, 0) for x in range(cols)]
+    elif direction == "south":
+        edge = [(x, rows - 1) for x in range(cols)]
+    elif direction == "west":
+        edge = [(0, y) for y in range(rows)]
+    else:
+        edge = [(cols - 1, y) for y in range(rows)]
+    return [c for c in edge if can_walk(zone, *c)]
+
+
+def path_to_zone(zone: str, start, target_zone: str):
+    """
+    Primer tramo del viaje a otra zona: camino dentro de la zona actual hasta
+    el portal de la siguiente zona de la ruta.
+    Retorna (ruta de zonas, casillas) o (None, None).
+    """
+    route = zone_route(zone, target_zone)
+    if not route:
+        return None, None
+    if len(route) == 1:
+        return route, []
+
+    direction = exit_direction(route[0], route[1])
+    best = None
+    for tile in exit_tiles(zone, direction):
+        path = find_path(zone, start, tile)
+        if path is not None and (best is None or len(path) < len(best)):
+            best = path
+    if best is None:
+        return None, None
+    return route, best
@@ -0,0 +1,192 @@
+# game/positions.py
+"""
+Posiciones write-behind de PlayerState.
+
+La posición autoritativa de cada personaje vive en el cache, lo que solo
+vale si todos los workers ven el mismo: con un CACHES compartido
+(Redis/Memcached). Los pasos dentro de una misma zona se acumulan en memoria
+y se escriben en lote a la BD:
+- cada WORLD_POSITION_FLUSH_SECONDS, desde un hilo del proceso (también si
+  el jugador ya no se mueve),
+- antes, si hay WORLD_POSITION_MAX_PENDING personajes pendientes,
+- y al instante en cambios de zona, inicio de batalla y teleports.
+Si el proceso muere sin apagarse (SIGKILL, OOM) se pierden a lo más los
+pasos de los últimos WORLD_POSITION_FLUSH_SECONDS.
+
+Con un cache por proceso (LocMemCache) o sin cache (DummyCache) no hay
+write-behind: cada paso se escribe directo a la BD y la BD es la posición
+autoritativa. WORLD_POSITION_WRITE_BEHIND = True/False fuerza un modo.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import PlayerState
+
+logger = logging.getLogger(__name__)
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def cache_key(character_id) -> str:
+    return f"world:pos:{character_id}"
+
+
+def write_behind() -> bool:
+    """¿El cache es compartido entre workers (y puede ser la posición autoritativa)?"""
+    forced = _setting("WORLD_POSITION_WRITE_BEHIND", None)
+    if forced is not None:
+        return forced
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+class PositionStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # state_pk -> (character_id, zone, x, y), coalescido por jugador
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._flusher = None
+
+    # ---------- lectura ----------
+
+    def load(self, state):
+        """Pisa x/y/zone de un PlayerState con la posición autoritativa."""
+        if not write_behind():
+            return state
+        cached = cache.get(cache_key(state.character_id))
+        if cached:
+            state.zone, state.x, state.y = cached
+        return state
+
+    def overlay(self, states):
+        """Igual que load() pero para muchos estados con un solo get_many."""
+        states = list(states)
+        if not write_behind():
+            return states
+        keys = {cache_key(s.character_id): s for s in states}
+        for key, (zone, x, y) in cache.get_many(list(keys)).items():
+            s = keys[key]
+            if s.zone == zone:
+                s.x, s.y = x, y
+        return states
+
+    # ---------- escritura ----------
+
+    def record(self, state):
+        """Paso dentro de la zona: cache ahora, BD más tarde."""
+        if not write_behind():
+            return self.persist(state)
+        cache.set(cache_key(state.character_id), (state.zone, state.x, state.y), self.timeout)
+
+        with self._lock:
+            self._pending[state.pk] = (state.character_id, state.zone, state.x, state.y)
+            due = len(self._pending) >= _setting("WORLD_POSITION_MAX_PENDING", 50) or self._flush_due()
+            self._start_flusher()
+        if due:
+            self.flush()
+
+    def persist(self, state):
+        """
+        Escribe YA la posición completa (zona incluida) de un jugador.
+        Para cambios de zona, inicio de batalla y teleports.
+        """
+        with self._lock:
+            self._pending.pop(state.pk, None)
+        PlayerState.objects.filter(pk=state.pk).update(
+            zone=state.zone, x=state.x, y=state.y, updated_at=timezone.now()
+        )
+        if write_behind():
+            cache.set(cache_key(state.character_id), (state.zone, state.x, state.y), self.timeout)
+
+    def flush(self):
+        """Un solo UPDATE con todas las posiciones pendientes."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        # solo se aplica si el jugador sigue en la zona del paso
+        # (un teleport en otro worker no se pisa con un paso viejo)
+        xs, ys = [], []
+        for pk, (_, zone, x, y) in pending.items():
+            xs.append(When(pk=pk, zone=zone, then=Value(x)))
+            ys.append(When(pk=pk, zone=zone, then=Value(y)))
+
+        try:
+            return PlayerState.objects.filter(pk__in=list(pending)).update(
+                x=Case(*xs, default=F("x")),
+                y=Case(*ys, default=F("y")),
+                updated_at=timezone.now(),
+            )
+        except DatabaseError:
+            # vuelven a quedar pendientes, salvo que ya haya un paso más nuevo
+            with self._lock:
+                for pk, entry in pending.items():
+                    self._pending.setdefault(pk, entry)
+            raise
+
+    def _flush_due(self):
+        return time.monotonic() - self._last_flush >= _setting("WORLD_POSITION_FLUSH_SECONDS", 5)
+
+    def flush_if_due(self):
+        """Lo que corre el hilo: escribe lo pendiente si ya pasó el intervalo."""
+        with self._lock:
+            due = bool(self._pending) and self._flush_due()
+        return self.flush() if due else 0
+
+    # ---------- hilo de flush ----------
+
+    def _start_flusher(self):
+        # con self._lock tomado
+        if not _setting("WORLD_POSITION_FLUSH_BACKGROUND", True):
+            return
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run, name="position-flush", daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            # duerme hasta que vence el intervalo desde el último flush (que
+            # pudo hacer record()), así nada espera más que el intervalo
+            with self._lock:
+                wait = _setting("WORLD_POSITION_FLUSH_SECONDS", 5) - (time.monotonic() - self._last_flush)
+            time.sleep(max(wait, 0.1))
+            if not _setting("WORLD_POSITION_FLUSH_BACKGROUND", True):
+                continue
+            try:
+                self.flush_if_due()
+            except DatabaseError:
+                # siguen pendientes: se reintenta en el próximo intervalo
+                logger.exception("no se pudieron escribir las posiciones pendientes")
+            finally:
+                close_old_connections()
+
+    @property
+    def timeout(self):
+        return _setting("WORLD_POSITION_CACHE_SECONDS", 60 * 60)
+
+
+positions = PositionStore()
+
+
+@atexit.register
+def _flush_at_exit():
+    # lo pendiente se escribe al apagar el worker de forma ordenada; si la BD
+    # ya no responde se pierden los pasos de los últimos
+    # WORLD_POSITION_FLUSH_SECONDS, igual que con un SIGKILL
+    try:
+        positions.flush()
+    except DatabaseError:
+        pass
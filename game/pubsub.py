@@ -0,0 +1,103 @@
+# game/pubsub.py
+"""
+Pub/sub del mundo para notificar a los clientes conectados por WebSocket.
+
+El código síncrono (vistas, comandos) publica con broker().publish(topic, msg)
+y los sockets (asyncio) se suscriben a un topic por zona. El broker por
+defecto vive en el proceso; WORLD_BROKER permite cambiarlo por uno
+compartido (Redis, etc.) que implemente la misma interfaz.
+"""
+import asyncio
+from collections import defaultdict
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def zone_topic(zone: str) -> str:
+    return f"zone:{zone}"
+
+
+class Subscription:
+    """Cola asyncio de un suscriptor; se itera con `await sub.get()`."""
+
+    def __init__(self, broker, topic, loop, maxsize=256):
+        self.broker = broker
+        self.topic = topic
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message):
+        # se llama dentro del loop del suscriptor; un cliente lento pierde
+        # mensajes en vez de frenar a los demás
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Interfaz de un broker."""
+
+    def publish(self, topic: str, message: dict):
+        raise NotImplementedError
+
+    def subscribe(self, topic: str) -> Subscription:
+        """Debe llamarse desde el loop asyncio que va a consumir."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = defaultdict(set)
+
+    def publish(self, topic, message):
+        with self._lock:
+            subs = list(self._subs.get(topic, ()))
+        for sub in subs:
+            # publish puede venir de un hilo síncrono: se entrega en el loop
+            # de cada suscriptor
+            try:
+                sub.loop.call_soon_threadsafe(sub.deliver, message)
+            except RuntimeError:
+                # loop cerrado: el socket ya se fue
+                self.unsubscribe(sub)
+
+    def subscribe(self, topic):
+        sub = Subscription(self, topic, asyncio.get_running_loop())
+        with self._lock:
+            self._subs[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subs = self._subs.get(subscription.topic)
+            if subs:
+                subs.discard(subscription)
+                if not subs:
+                    del self._subs[subscription.topic]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker() -> Broker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "WORLD_BROKER", "game.pubsub.InProcessBroker")
+                _broker = import_string(path)()
+    return _broker
@@ -0,0 +1,249 @@
+# game/respawns.py
+"""
+Scheduler de respawns fuera de las requests.
+
+Al arrancar, los EnemySpawn muertos se cargan una vez en una rueda de
+tiempo (TimingWheel) ordenados por next_respawn_at. Después cada muerte
+llega desde kill_spawn (notify_death), sin volver a recorrer la tabla.
+Cada tick revive en un UPDATE por lote los que vencieron y publica el
+cambio (versión de spawns + broker), igual que una muerte.
+
+WORLD_RESPAWN_TICKER elige quién hace el trabajo:
+- None: como antes, las requests revisan respawns vencidos de su zona.
+- "asgi": una tarea asyncio dentro del servidor ASGI (lifespan); las
+  muertes le llegan por una cola en memoria del mismo proceso.
+- "process": un proceso aparte, `manage.py run_world_ticker`; las muertes
+  le llegan como tareas de la cola "respawns" (game/tasks.py). La versión
+  de spawns y el broker son los del proceso del ticker: para que los
+  clientes vean el respawn, CACHES y WORLD_BROKER tienen que ser
+  compartidos.
+Con ticker las requests ya no hacen trabajo de respawn.
+"""
+import asyncio
+from datetime import datetime, timezone as dt_timezone
+import heapq
+import math
+import queue
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from .models import EnemySpawn
+from .tasks import claim, enqueue, run_task, task
+
+RESPAWN_QUEUE = "respawns"
+
+# muertes avisadas al ticker de este proceso: (key, due, payload)
+_deaths = queue.SimpleQueue()
+_local_ticker = False
+
+
+def ticker_mode():
+    return getattr(settings, "WORLD_RESPAWN_TICKER", None)
+
+
+def notify_death(spawn):
+    """Programa el respawn de `spawn` (recién muerto) en el ticker."""
+    death = {
+        "id": spawn.pk, "zone": spawn.zone, "x": spawn.x, "y": spawn.y,
+        "due": spawn.next_respawn_at.timestamp(),
+    }
+    mode = ticker_mode()
+    if mode == "process":
+        enqueue("track_respawn", death)
+    elif mode == "asgi" and _local_ticker:
+        track_respawn(**death)
+
+
+@task("track_respawn", queue=RESPAWN_QUEUE)
+def track_respawn(id, zone, x, y, due):
+    # corre en el proceso del ticker: solo lo deja para el próximo step()
+    _deaths.put((id, due, (zone, x, y)))
+
+
+class TimingWheel:
+    """
+    Rueda de tiempo de dos niveles: `slots` casillas de `resolution`
+    segundos cubren el futuro cercano y lo más lejano espera en un heap
+    hasta que entra en el rango de la rueda. Programar y avanzar son O(1)
+    amortizado por entrada.
+    """
+
+    def __init__(self, resolution=1.0, slots=512, start=None):
+        self.resolution = resolution
+        self.slots = [{} for _ in range(slots)]   # key -> (due, payload)
+        self.cursor = self._tick(time.time() if start is None else start)
+        self.overflow = []                        # heap (due, key, payload)
+        self.where = {}                           # key -> tick en la rueda | ("heap", due)
+        self.in_wheel = 0
+        self.in_heap = 0                          # entradas vigentes del heap
+
+    def __len__(self):
+        return len(self.where)
+
+    def _tick(self, ts):
+        return math.floor(ts / self.resolution)
+
+    def _place(self, key, due, payload):
+        tick = max(self._tick(due), self.cursor)
+        if tick < self.cursor + len(self.slots):
+            self.slots[tick % len(self.slots)][key] = (due, payload)
+            self.where[key] = tick
+            self.in_wheel += 1
+        else:
+            heapq.heappush(self.overflow, (due, key, payload))
+            self.where[key] = ("heap", due)
+            self.in_heap += 1
+
+    def schedule(self, key, due, payload=None):
+        """Programa (o re-programa) `key` para el timestamp `due`."""
+        self.remove(key)
+        self._place(key, due, payload)
+
+    def remove(self, key):
+        where = self.where.pop(key, None)
+        if isinstance(where, int):
+            self.slots[where % len(self.slots)].pop(key, None)
+            self.in_wheel -= 1
+        elif where is not None:
+            # la entrada del heap queda muerta; se compacta si son muchas
+            self.in_heap -= 1
+            if len(self.overflow) > max(8, 2 * self.in_heap):
+                self._compact()
+
+    def _live(self, entry):
+        due, key, _ = entry
+        return self.where.get(key) == ("heap", due)
+
+    def _compact(self):
+        self.overflow = [entry for entry in self.overflow if self._live(entry)]
+        heapq.heapify(self.overflow)
+
+    def _cascade(self):
+        horizon = self.cursor + len(self.slots)
+        while self.overflow and self._tick(self.overflow[0][0]) < horizon:
+            entry = heapq.heappop(self.overflow)
+            if self._live(entry):
+                due, key, payload = entry
+                del self.where[key]
+                self.in_heap -= 1
+                self._place(key, due, payload)
+
+    def advance(self, now):
+        """Saca y retorna [(key, payload)] de todo lo vencido a `now`."""
+        target = self._tick(now)
+        fired = []
+        while True:
+            if self.in_wheel == 0 and self.cursor < target:
+                # rueda vacía: se salta directo a lo próximo del heap
+                next_tick = self._tick(self.overflow[0][0]) if self.overflow else target
+                self.cursor = max(self.cursor, min(target, next_tick))
+            self._cascade()
+
+            bucket = self.slots[self.cursor % len(self.slots)]
+            for key, (due, payload) in list(bucket.items()):
+                if due <= now:
+                    del bucket[key]
+                    del self.where[key]
+                    self.in_wheel -= 1
+                    fired.append((key, payload))
+
+            if self.cursor >= target:
+                return fired
+            self.cursor += 1
+
+
+class RespawnTicker:
+    def __init__(self, wheel=None):
+        self.resolution = getattr(settings, "WORLD_TICKER_RESOLUTION", 1.0)
+        self.batch_size = getattr(settings, "WORLD_TICKER_BATCH", 500)
+        self.wheel = wheel or TimingWheel(resolution=self.resolution)
+        self.loaded = False
+
+    def load(self):
+        """Programa todos los spawns muertos; solo al arrancar."""
+        now = time.time()
+        dead = EnemySpawn.objects.filter(is_alive=False).values_list(
+            "id", "zone", "x", "y", "next_respawn_at"
+        )
+        for pk, zone, x, y, at in dead.iterator():
+            self.wheel.schedule(pk, at.timestamp() if at else now, (zone, x, y))
+        self.loaded = True
+
+    def receive_deaths(self):
+        """Pasa a la rueda las muertes avisadas por notify_death."""
+        if ticker_mode() == "process":
+            for t in claim(self.batch_size, queue=RESPAWN_QUEUE):
+                run_task(t)
+        while True:
+            try:
+                key, due, payload = _deaths.get_nowait()
+            except queue.Empty:
+                return
+            # re-programar una key ya conocida solo la mueve
+            self.wheel.schedule(key, due, payload)
+
+    def tick(self, now=None):
+        """Revive lo vencido en lotes; retorna cuántos spawns revivieron."""
+        from .views import publish_spawn
+
+        now = now or time.time()
+        fired = [pk for pk, _ in self.wheel.advance(now)]
+        cutoff = datetime.fromtimestamp(now, tz=dt_timezone.utc)
+
+        revived = 0
+        for i in range(0, len(fired), self.batch_size):
+            due = EnemySpawn.objects.filter(
+                Q(next_respawn_at__lte=cutoff) | Q(next_respawn_at__isnull=True),
+                pk__in=fired[i:i + self.batch_size],
+                is_alive=False,
+            )
+            # los que se volvieron a matar tienen otro next_respawn_at: su
+            # muerte nueva llega por notify_death
+            spawns = list(due.only("id", "zone", "x", "y"))
+            if not spawns:
+                continue
+            EnemySpawn.objects.filter(pk__in=[sp.pk for sp in spawns], is_alive=False).update(
+                is_alive=True, next_respawn_at=None
+            )
+            for sp in spawns:
+                publish_spawn(sp, alive=True)
+            revived += len(spawns)
+        return revived
+
+    def step(self):
+        if not self.loaded:
+            self.load()
+        self.receive_deaths()
+        return self.tick()
+
+    def run_forever(self):
+        while True:
+            self.step()
+            time.sleep(self.resolution)
+
+    async def run(self):
+        global _local_ticker
+        _local_ticker = True
+        step = sync_to_async(self.step, thread_sensitive=False)
+        while True:
+            await step()
+            await asyncio.sleep(self.resolution)
+
+
+async def lifespan(scope, receive, send):
+    """Lifespan ASGI: con WORLD_RESPAWN_TICKER = "asgi" corre el ticker."""
+    task = None
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if ticker_mode() == "asgi":
+                task = asyncio.ensure_future(RespawnTicker().run())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if task:
+                task.cancel()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
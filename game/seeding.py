@@ -0,0 +1,24 @@
+# game/seeding.py
+"""
+Semillas estables entre procesos.
+
+hash() de un str cambia en cada intérprete (PYTHONHASHSEED), así que una
+misma clave daba packs distintos en cada worker. Aquí la semilla sale de
+blake2b (64 bits) sobre las partes de la clave: misma clave => mismo
+random.Random en cualquier proceso o nodo.
+"""
+import hashlib
+import random
+
+_SEP = b"\x1f"  # separador: ("a1", "2") y ("a", "12") no chocan
+
+
+def stable_seed(*parts) -> int:
+    """Entero de 64 bits estable para `parts` (str, int, ...)."""
+    data = _SEP.join(str(p).encode() for p in parts)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def seeded_rng(*parts) -> random.Random:
+    """random.Random sembrado con stable_seed(*parts)."""
+    return random.Random(stable_seed(*parts))
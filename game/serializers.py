@@ -56,12 +56,27 @@ class CharacterCreateSerializer(serializers.ModelSerializer):
 # EQUIPMENT ITEM (INVENTARIO)
 # ==========================
 
+class ItemStatField(serializers.ReadOnlyField):
+    """
+    Stat final de un ítem: la anotación bonus_<stat> de with_stats() si la
+    query la trae; si no (ítem recién creado o guardado), total_stats().
+    """
+
+    def __init__(self, stat, **kwargs):
+        self.stat = stat
+        super().__init__(source="*", **kwargs)
+
+    def to_representation(self, obj):
+        value = getattr(obj, f"bonus_{self.stat}", None)
+        return value if value is not None else obj.total_stats()[self.stat]
+
+
 class EquipmentItemSerializer(serializers.ModelSerializer):
     # 👉 stats finales (con rareza aplicada)
-    bonus_hp = serializers.SerializerMethodField()
-    bonus_atk = serializers.SerializerMethodField()
-    bonus_def = serializers.SerializerMethodField()
-    bonus_speed = serializers.SerializerMethodField()
+    bonus_hp = ItemStatField("hp")
+    bonus_atk = ItemStatField("atk")
+    bonus_def = ItemStatField("def")
+    bonus_speed = ItemStatField("speed")
 
     class Meta:
         model = EquipmentItem
@@ -79,18 +94,6 @@ class EquipmentItemSerializer(serializers.ModelSerializer):
             "image",
         ]
 
-    def get_bonus_hp(self, obj):
-        return obj.total_stats()["hp"]
-
-    def get_bonus_atk(self, obj):
-        return obj.total_stats()["atk"]
-
-    def get_bonus_def(self, obj):
-        return obj.total_stats()["def"]
-
-    def get_bonus_speed(self, obj):
-        return obj.total_stats()["speed"]
-
 
 # ==========================
 # INVENTORY (LISTA)
@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .active_character import forget_cached_character
+from .encounters import encounter_pool
+from .images import forget_enemy_atlas, make_variants
+from .models import Character, EnemyType, EquipmentItem, gear_changes
+
+
+@receiver(post_save, sender=Character)
+@receiver(post_save, sender=EnemyType)
+def build_image_variants(sender, instance, update_fields=None, **kwargs):
+    # Character se guarda seguido (xp, vidas...): solo cuando puede haber imagen nueva
+    if update_fields is not None and "image" not in update_fields:
+        return
+    if sender is Character and "image" in instance._unchanged_files():
+        return
+    if instance.image:
+        try:
+            make_variants(instance.image)
+        except OSError:
+            # imagen ilegible: se sigue sirviendo el original
+            pass
+
+
+@receiver(post_save, sender=Character)
+def forget_active_character(sender, instance, **kwargs):
+    forget_cached_character(instance.pk)
+
+
+@receiver(post_save, sender=EnemyType)
+@receiver(post_delete, sender=EnemyType)
+def enemy_types_changed(sender, **kwargs):
+    # packs ya tirados y atlas armados con los tipos viejos
+    encounter_pool.reset()
+    forget_enemy_atlas()
+
+
+@receiver(post_delete, sender=EquipmentItem)
+def remove_gear_bonus(sender, instance, **kwargs):
+    # también corre con QuerySet.delete(), dentro de su transacción
+    for owner_id, delta in gear_changes([instance._gear_contribution()], []):
+        Character.add_gear(owner_id, delta)
@@ -0,0 +1,272 @@
+# game/tasks.py
+"""
+Cola de tareas en la propia BD (modelo Task), sin broker externo.
+
+- enqueue(name, payload, delay=0): un INSERT; la request sigue de largo.
+- Worker (manage.py run_worker): reclama tareas vencidas por lotes y las
+  ejecuta en WORLD_TASK_CONCURRENCY hilos.
+
+Con WORLD_TASK_WORKER = True el deploy corre run_worker (ver Dockerfile) y
+todo pasa por la cola. Sin worker, las tareas de la cola "default":
+- sin delay corren en el mismo proceso al confirmarse la transacción (sin
+  reintentos);
+- con delay se guardan igual como fila, y las requests que encolan algo
+  corren las que ya vencieron (a lo más cada WORLD_TASK_INLINE_SECONDS, en
+  lotes de WORLD_TASK_INLINE_BATCH) y purgan las terminadas.
+Así un delay se respeta y nada queda encolado para siempre.
+
+Reclamar: en PostgreSQL con SELECT ... FOR UPDATE SKIP LOCKED, así varios
+workers no se pisan ni se esperan. En SQLite (sin SKIP LOCKED) cada tarea se
+toma con un UPDATE condicional sobre el estado que se leyó: si otro worker
+ganó, el UPDATE afecta 0 filas y se salta.
+
+Una tarea que falla se reintenta con backoff exponencial hasta
+max_attempts; una que quedó "running" más de WORLD_TASK_LOCK_SECONDS
+(worker muerto) vuelve a reclamarse.
+
+Los handlers se registran con @task("nombre") y reciben el payload como
+kwargs. Deben ser idempotentes: una tarea puede correr más de una vez.
+Cada handler pertenece a una cola (por defecto "default", la de run_worker);
+un proceso que atiende otra cola (p. ej. "respawns", el ticker) reclama solo
+esas tareas.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import EnemyInstance, Task, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+DEFAULT_QUEUE = "default"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def task(name, max_attempts=3, queue=DEFAULT_QUEUE):
+    """Registra un handler: @task("seed_zone_spawns")."""
+    def register(fn):
+        fn.task_name = name
+        fn.max_attempts = max_attempts
+        fn.queue = queue
+        HANDLERS[name] = fn
+        return fn
+    return register
+
+
+def worker_enabled():
+    return _setting("WORLD_TASK_WORKER", False)
+
+
+def _run_inline(handler, payload):
+    try:
+        handler(**payload)
+    except Exception:
+        logger.exception("tarea %s falló (sin worker, no se reintenta)", handler.task_name)
+
+
+def enqueue(name, payload=None, delay=0):
+    """
+    Encola `name` para dentro de `delay` segundos (un INSERT). Sin worker
+    (WORLD_TASK_WORKER) una tarea sin delay corre aquí mismo al confirmar la
+    transacción y retorna None; una con delay se guarda y la corre una
+    request posterior (_drain_inline).
+    """
+    handler = HANDLERS[name]
+    inline = handler.queue == DEFAULT_QUEUE and not worker_enabled()
+    if inline:
+        transaction.on_commit(_drain_inline)
+        if delay <= 0:
+            transaction.on_commit(lambda: _run_inline(handler, payload or {}))
+            return None
+    return Task.objects.create(
+        name=name,
+        payload=payload or {},
+        max_attempts=handler.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+_drain_lock = threading.Lock()
+_last_drain = None
+
+
+def _drain_inline():
+    """
+    Sin worker: corre en este proceso las tareas "default" vencidas y purga
+    las terminadas. A lo más una vez cada WORLD_TASK_INLINE_SECONDS por
+    proceso; claim() evita que dos procesos corran la misma.
+    """
+    global _last_drain
+    with _drain_lock:
+        now = time.monotonic()
+        if _last_drain is not None and now - _last_drain < _setting("WORLD_TASK_INLINE_SECONDS", 60):
+            return 0
+        _last_drain = now
+    claimed = claim(_setting("WORLD_TASK_INLINE_BATCH", 100))
+    for t in claimed:
+        run_task(t)
+    purge_finished()
+    return len(claimed)
+
+
+def _claimable(now, queue):
+    stale = now - timedelta(seconds=_setting("WORLD_TASK_LOCK_SECONDS", 300))
+    tasks = Task.objects.filter(
+        Q(status=TaskStatus.PENDING, run_at__lte=now)
+        | Q(status=TaskStatus.RUNNING, locked_at__lt=stale)
+    )
+    others = [name for name, handler in HANDLERS.items() if handler.queue != queue]
+    if queue == DEFAULT_QUEUE:
+        # las tareas sin handler también caen aquí (y fallan con LookupError)
+        return tasks.exclude(name__in=others)
+    return tasks.filter(name__in=[name for name, handler in HANDLERS.items() if handler.queue == queue])
+
+
+def claim(limit, queue=DEFAULT_QUEUE):
+    """Marca como running hasta `limit` tareas vencidas de `queue` y las retorna."""
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            tasks = list(
+                _claimable(now, queue).select_for_update(skip_locked=True).order_by("run_at")[:limit]
+            )
+            Task.objects.filter(pk__in=[t.pk for t in tasks]).update(
+                status=TaskStatus.RUNNING, locked_at=now
+            )
+    else:
+        tasks = []
+        for t in _claimable(now, queue).order_by("run_at")[:limit]:
+            won = Task.objects.filter(pk=t.pk, status=t.status, locked_at=t.locked_at).update(
+                status=TaskStatus.RUNNING, locked_at=now
+            )
+            if won:
+                tasks.append(t)
+
+    for t in tasks:
+        t.status, t.locked_at = TaskStatus.RUNNING, now
+    return tasks
+
+
+def retry_delay(attempts):
+    base = _setting("WORLD_TASK_RETRY_SECONDS", 10)
+    return base * 2 ** (attempts - 1)
+
+
+def run_task(t):
+    """Ejecuta una tarea reclamada; retorna "done", "retry" o "failed"."""
+    handler = HANDLERS.get(t.name)
+    try:
+        if handler is None:
+            raise LookupError(f"tarea desconocida: {t.name}")
+        handler(**t.payload)
+    except Exception:
+        attempts = t.attempts + 1
+        outcome = "failed" if attempts >= t.max_attempts else "retry"
+        Task.objects.filter(pk=t.pk).update(
+            status=TaskStatus.FAILED if outcome == "failed" else TaskStatus.PENDING,
+            attempts=attempts,
+            run_at=timezone.now() + timedelta(seconds=retry_delay(attempts)),
+            locked_at=None,
+            last_error=traceback.format_exc()[-4000:],
+            finished_at=timezone.now() if outcome == "failed" else None,
+        )
+        logger.warning("tarea %s #%s falló (intento %s): %s", t.name, t.pk, attempts, outcome)
+        return outcome
+
+    Task.objects.filter(pk=t.pk).update(
+        status=TaskStatus.DONE, attempts=t.attempts + 1, locked_at=None, finished_at=timezone.now()
+    )
+    return "done"
+
+
+def queue_stats():
+    """Tareas por estado y antigüedad (s) de la pendiente más vieja."""
+    counts = dict(Task.objects.values_list("status").annotate(n=Count("id")))
+    oldest = Task.objects.filter(status=TaskStatus.PENDING).aggregate(at=Min("run_at"))["at"]
+    return {
+        **{s: counts.get(s, 0) for s in TaskStatus.values},
+        "oldest_pending_seconds": max(0.0, (timezone.now() - oldest).total_seconds()) if oldest else 0.0,
+    }
+
+
+def purge_finished(older_than_seconds=None):
+    """Borra las tareas terminadas hace más de WORLD_TASK_KEEP_SECONDS."""
+    keep = older_than_seconds if older_than_seconds is not None else _setting("WORLD_TASK_KEEP_SECONDS", 86400)
+    cutoff = timezone.now() - timedelta(seconds=keep)
+    deleted, _ = Task.objects.filter(status=TaskStatus.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class Worker:
+    def __init__(self, concurrency=None, poll_seconds=None):
+        self.concurrency = concurrency or _setting("WORLD_TASK_CONCURRENCY", 4)
+        self.poll_seconds = poll_seconds or _setting("WORLD_TASK_POLL_SECONDS", 1.0)
+        self.metrics = {"done": 0, "retry": 0, "failed": 0, "seconds": 0.0}
+        self.by_name = {}
+
+    def _run_one(self, t):
+        started = time.monotonic()
+        try:
+            return t, run_task(t), time.monotonic() - started
+        finally:
+            close_old_connections()
+
+    def _record(self, t, outcome, seconds):
+        self.metrics[outcome] += 1
+        self.metrics["seconds"] += seconds
+        per = self.by_name.setdefault(t.name, {"done": 0, "retry": 0, "failed": 0, "seconds": 0.0})
+        per[outcome] += 1
+        per["seconds"] += seconds
+
+    def step(self, pool=None):
+        """Reclama un lote y lo ejecuta; retorna cuántas tareas corrieron."""
+        tasks = claim(self.concurrency)
+        if pool is None or len(tasks) <= 1:
+            results = [self._run_one(t) for t in tasks]
+        else:
+            results = list(pool.map(self._run_one, tasks))
+        for t, outcome, seconds in results:
+            self._record(t, outcome, seconds)
+        return len(tasks)
+
+    def run_forever(self, report=None, report_every=60):
+        """Loop del worker; cada `report_every` s llama report(self) y purga."""
+        last_report = time.monotonic()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="task-worker") as pool:
+            while True:
+                if not self.step(pool):
+                    time.sleep(self.poll_seconds)
+                if time.monotonic() - last_report >= report_every:
+                    purge_finished()
+                    if report:
+                        report(self)
+                    last_report = time.monotonic()
+
+
+# ==========================
+# Tareas del juego
+# ==========================
+
+@task("seed_zone_spawns")
+def seed_zone_spawns(zone):
+    from .views import ensure_enemy_spawns_for_zone
+
+    ensure_enemy_spawns_for_zone(zone)
+
+
+@task("discard_enemy_instances")
+def discard_enemy_instances(ids):
+    # instancias de un pack ya peleado (las de una batalla no se reusan)
+    EnemyInstance.objects.filter(id__in=ids).delete()
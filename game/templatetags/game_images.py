@@ -0,0 +1,11 @@
+from django import template
+
+from ..images import variant_url
+
+register = template.Library()
+
+
+@register.filter
+def variant(image, size="portrait"):
+    """{{ character.image|variant:"sprite" }} -> URL de la variante WebP."""
+    return variant_url(image, size) or ""
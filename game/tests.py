@@ -1,3 +1,1184 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+import io
+import json
+import os
+from pathlib import Path
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from . import backgrounds, images, views, ws
+from . import positions as positions_module
+from .active_character import SESSION_KEY
+from .encounters import ENEMY_RARITY_ROLL, EncounterPool, roll_pack, roll_rarity
+from .maps import MAPS
+from .models import (
+    RARITY_STAT_MULTIPLIER, Character, EnemyInstance, EnemySpawn, EnemyType, EquipmentItem, PlayerState, Task,
+    TaskStatus, gear_drift,
+)
+from .occupancy import LocalHashClient, SharedOccupancyBackend, ZoneOccupancy, occupancy
+from .positions import positions
+from .respawns import RespawnTicker, TimingWheel
+from .seeding import seeded_rng, stable_seed
+from . import tasks
+from .utils import calculate_enemy_stats, character_to_battler
+from .ws import world_socket
+
+
+def find_tile(zone, wanted, skip_border=True):
+    grid = MAPS[zone]["map"]
+    for y, row in enumerate(grid):
+        for x, tile in enumerate(row):
+            if skip_border and (x in (0, len(row) - 1) or y in (0, len(grid) - 1)):
+                continue
+            if tile == wanted:
+                return x, y
+    raise AssertionError(f"no hay {wanted} en {zone}")
+
+
+class WorldMoveTestCase(TestCase):
+    zone = "1-0"
+
+    def setUp(self):
+        # el hilo de flush usaría otra conexión: aquí se escribe a mano.
+        # Write-behind forzado: el LocMemCache de los tests es de un proceso
+        self.enterContext(self.settings(WORLD_POSITION_FLUSH_BACKGROUND=False, WORLD_POSITION_WRITE_BEHIND=True))
+        views._SEEDED_ZONES.clear()
+        views._QUEUED_SEEDS.clear()
+        positions.flush()
+        cache.clear()
+        occupancy.forget()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(username="tester", password="x")
+        self.character = Character.objects.create(owner=self.user, name="Tester", char_class="tank")
+        self.enemy_type = EnemyType.objects.create(name="Goblin")
+
+        gx, gy = find_tile(self.zone, "ground")
+        self.state = PlayerState.objects.create(character=self.character, zone=self.zone, x=gx, y=gy)
+
+    def move(self, x=None, y=None, **data):
+        if x is not None:
+            data.update(x=x, y=y)
+        request = self.factory.post("/api/game/world/move/", data, format="json")
+        force_authenticate(request, user=self.user)
+        return views.world_move(request)
+
+    def neighbor_ground(self):
+        grid = MAPS[self.zone]["map"]
+        return next(
+            (self.state.x + dx, self.state.y + dy)
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+            if grid[self.state.y + dy][self.state.x + dx] == "ground"
+        )
+
+    def warm(self):
+        # primera visita: seeding de la zona y sus vecinas fuera del presupuesto
+        for zone in (self.zone, *MAPS[self.zone]["exits"].values()):
+            views.warm_zone(zone)
+
+    def test_plain_step_query_budget(self):
+        self.warm()
+        nx, ny = self.neighbor_ground()
+
+        with self.assertNumQueries(1):
+            response = self.move(nx, ny)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["position"], {"x": nx, "y": ny})
+        self.assertFalse(response.data["start_battle"])
+
+    def test_positions_are_written_behind(self):
+        nx, ny = self.neighbor_ground()
+        self.move(nx, ny)
+
+        # la BD todavía tiene la posición vieja, el store la nueva
+        self.state.refresh_from_db()
+        self.assertNotEqual((self.state.x, self.state.y), (nx, ny))
+        self.assertEqual((positions.load(self.state).x, self.state.y), (nx, ny))
+
+        positions.flush()
+        self.state.refresh_from_db()
+        self.assertEqual((self.state.x, self.state.y), (nx, ny))
+
+    def test_process_local_cache_writes_through(self):
+        self.enterContext(self.settings(WORLD_POSITION_WRITE_BEHIND=None))
+        self.assertFalse(positions_module.write_behind())  # LocMemCache
+        nx, ny = self.neighbor_ground()
+        self.move(nx, ny)
+
+        # otro worker no ve este cache: la BD ya tiene el paso
+        self.state.refresh_from_db()
+        self.assertEqual((self.state.x, self.state.y), (nx, ny))
+        self.assertEqual(positions.flush(), 0)
+        cache.set(positions_module.cache_key(self.character.pk), (self.zone, 0, 0))
+        self.assertEqual((positions.load(self.state).x, self.state.y), (nx, ny))
+
+    def test_idle_positions_are_flushed_on_interval(self):
+        nx, ny = self.neighbor_ground()
+        self.move(nx, ny)
+
+        # el jugador se queda quieto: nadie más llama a record()
+        self.assertEqual(positions.flush_if_due(), 0)
+        with self.settings(WORLD_POSITION_FLUSH_SECONDS=0):
+            self.assertEqual(positions.flush_if_due(), 1)
+        self.state.refresh_from_db()
+        self.assertEqual((self.state.x, self.state.y), (nx, ny))
+
+    def test_record_starts_the_flush_thread(self):
+        with self.settings(WORLD_POSITION_FLUSH_BACKGROUND=True, WORLD_POSITION_FLUSH_SECONDS=3600), \
+                mock.patch.object(positions, "_flusher", None), mock.patch("game.positions.threading.Thread") as thread:
+            positions.record(self.state)
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        positions.flush()
+
+    def test_flush_skips_players_that_changed_zone(self):
+        nx, ny = self.neighbor_ground()
+        self.move(nx, ny)
+
+        # teleport escrito por fuera mientras el paso seguía pendiente
+        PlayerState.objects.filter(pk=self.state.pk).update(zone="0-0", x=9, y=9)
+        positions.flush()
+
+        self.state.refresh_from_db()
+        self.assertEqual((self.state.zone, self.state.x, self.state.y), ("0-0", 9, 9))
+
+    def test_enemy_tile_starts_battle_once(self):
+        ex, ey = find_tile(self.zone, "enemy")
+
+        response = self.move(ex, ey)
+        self.assertTrue(response.data["start_battle"])
+        self.assertEqual(
+            EnemyInstance.objects.filter(id__in=response.data["enemy_ids"]).count(),
+            len(response.data["enemy_ids"]),
+        )
+        self.assertFalse(EnemySpawn.objects.get(zone=self.zone, x=ex, y=ey).is_alive)
+
+        # el spawn ya está muerto: pisarlo de nuevo no dispara batalla
+        response = self.move(ex, ey)
+        self.assertFalse(response.data["start_battle"])
+
+    def test_blocked_tile_is_rejected(self):
+        wx, wy = find_tile(self.zone, "wall", skip_border=False)
+        response = self.move(wx, wy)
+        self.assertEqual(response.status_code, 400)
+        self.state.refresh_from_db()
+        self.assertNotEqual((self.state.x, self.state.y), (wx, wy))
+
+    def test_step_batch_stops_at_first_enemy(self):
+        ex, ey = find_tile(self.zone, "enemy")
+        grid = MAPS[self.zone]["map"]
+        # se arranca dos casillas a la izquierda del enemigo, sobre el anillo Z
+        self.state.x, self.state.y = ex - 2, ey
+        self.state.save()
+        self.assertEqual(grid[ey][ex - 1], "enemy_zone")
+
+        response = self.move(steps=["d", "d", "d", "d"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["steps_applied"], 1)
+        self.assertEqual(response.data["position"], {"x": ex - 1, "y": ey})
+        self.assertTrue(response.data["start_battle"])
+
+    def test_step_batch_rejects_blocked_first_step(self):
+        response = self.move(steps=["x"])
+        self.assertEqual(response.status_code, 400)
+
+    def test_target_walks_server_side_path(self):
+        views.ensure_enemy_spawns_for_zone(self.zone)
+        # esquina lejana sin triggers en el camino directo por el borde sur
+        response = self.move(target={"x": 1, "y": 16})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["position"], {"x": 1, "y": 16})
+
+    def test_players_delta_since_version(self):
+        self.warm()
+        version = self.move(self.state.x, self.state.y).data["players_version"]
+
+        other_user = User.objects.create_user(username="other", password="x")
+        other = Character.objects.create(owner=other_user, name="Other", char_class="dps")
+        other_state = PlayerState.objects.create(character=other, zone=self.zone, x=1, y=1)
+        occupancy.enter(other, other_state)
+
+        nx, ny = self.neighbor_ground()
+        # con cursor no hay query de otros jugadores
+        with self.assertNumQueries(1):
+            response = self.move(nx, ny, players_since=version)
+        self.assertNotIn("other_players", response.data)
+        self.assertEqual([p["id"] for p in response.data["players_delta"]["updated"]], [other.id])
+        self.assertEqual(response.data["players_delta"]["visible"], [other.id])
+
+        occupancy.leave(other.id, self.zone)
+        response = self.move(nx, ny, players_since=response.data["players_version"])
+        self.assertEqual(
+            response.data["players_delta"],
+            {"updated": [], "left": [other.id], "visible": []},
+        )
+
+        # cursor imposible -> snapshot completo
+        response = self.move(nx, ny, players_since=10**6)
+        self.assertIn("other_players", response.data)
+
+    def test_area_of_interest_is_capped_and_sorted(self):
+        for i, (x, y) in enumerate([(16, 16), (3, 3), (2, 2), (9, 9)], start=100):
+            occupancy.backend.put(self.zone, {"id": i, "x": x, "y": y}, time.time())
+
+        with self.settings(WORLD_VIEW_RADIUS=8, WORLD_VIEW_MAX_PLAYERS=2):
+            self.state.x, self.state.y = 1, 1
+            _, visible = occupancy.visible_to(self.state)
+        self.assertEqual([p["id"] for p in visible], [102, 101])
+
+    def test_idle_players_are_evicted(self):
+        other_user = User.objects.create_user(username="idle", password="x")
+        other = Character.objects.create(owner=other_user, name="Idle", char_class="dps")
+        other_state = PlayerState.objects.create(character=other, zone=self.zone, x=2, y=2)
+        occupancy.enter(other, other_state)
+        _, visible = occupancy.visible_to(self.state)
+        self.assertEqual([p["id"] for p in visible], [other.id])
+
+        self.assertEqual(occupancy.evict_idle(self.zone, now=time.time() + 3600), [other.id])
+        _, visible = occupancy.visible_to(self.state)
+        self.assertEqual(visible, [])
+
+    def enemies(self, etag=None, wait=None):
+        url = "/api/game/world/enemies/" + (f"?wait={wait}" if wait is not None else "")
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        request = self.factory.get(url, **headers)
+        force_authenticate(request, user=self.user)
+        return views.world_enemies(request)
+
+    def test_enemies_not_modified_without_spawn_queries(self):
+        first = self.enemies()
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+
+        # solo el personaje con su estado: EnemySpawn no se toca
+        with self.assertNumQueries(1):
+            again = self.enemies(etag)
+        self.assertEqual(again.status_code, 304)
+
+        spawn = EnemySpawn.objects.filter(zone=self.zone).first()
+        views.kill_spawn(spawn, views.timezone.now())
+        changed = self.enemies(etag, wait=1)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertNotIn({"x": spawn.x, "y": spawn.y}, changed.data["alive_enemies"])
+
+    def test_enemies_long_poll_is_off_by_default(self):
+        etag = self.enemies()["ETag"]
+
+        # sin WORLD_ENEMIES_MAX_WAIT el servidor no retiene la respuesta
+        with mock.patch.object(views.time, "sleep") as sleep:
+            self.assertEqual(self.enemies(etag, wait=20).status_code, 304)
+        sleep.assert_not_called()
+
+        with self.settings(WORLD_ENEMIES_MAX_WAIT=1), mock.patch.object(views.time, "sleep") as sleep:
+            self.assertEqual(self.enemies(etag, wait=20).status_code, 304)
+        sleep.assert_called()
+
+    def test_neighbors_and_edge_warming(self):
+        exits = MAPS[self.zone]["exits"]
+        request = self.factory.get("/api/game/world/neighbors/")
+        force_authenticate(request, user=self.user)
+        data = views.world_neighbors(request).data
+
+        self.assertEqual({n["direction"]: n["zone"] for n in data["neighbors"]}, exits)
+        east = next(n for n in data["neighbors"] if n["direction"] == "east")
+        self.assertEqual(east["map_url"], views.map_asset_url(exits["east"]))
+        self.assertEqual(
+            len(east["alive_enemies"]),
+            EnemySpawn.objects.filter(zone=exits["east"], is_alive=True).count(),
+        )
+
+        # acercarse al borde este siembra la zona del otro lado
+        views._SEEDED_ZONES.clear()
+        self.assertEqual(views.approaching_exits(self.zone, 15, 8), {"east": exits["east"]})
+        for zone in views.approaching_exits(self.zone, 15, 8).values():
+            views.warm_zone(zone)
+        self.assertIn(exits["east"], views._SEEDED_ZONES)
+
+    def socket_scope(self, origin="http://testserver"):
+        self.client.force_login(self.user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.session.session_key}"
+        headers = [(b"cookie", cookie.encode()), (b"host", b"testserver")]
+        if origin:
+            headers.append((b"origin", origin.encode()))
+        return {"type": "websocket", "path": "/ws/world/", "headers": headers}
+
+    def handshake(self, scope):
+        """Primer evento que manda el socket al conectar (y lo cierra)."""
+        @async_to_sync
+        async def talk():
+            inbox, outbox = asyncio.Queue(), asyncio.Queue()
+            await inbox.put({"type": "websocket.connect"})
+            task = asyncio.ensure_future(world_socket(scope, inbox.get, outbox.put))
+            events = [await asyncio.wait_for(outbox.get(), 5)]
+            if events[0]["type"] == "websocket.accept":
+                events.append(await asyncio.wait_for(outbox.get(), 5))
+            await inbox.put({"type": "websocket.disconnect"})
+            await task
+            return events
+        return talk()
+
+    def test_socket_pushes_snapshot_and_kills(self):
+        scope = self.socket_scope()
+
+        @async_to_sync
+        async def talk():
+            inbox, outbox = asyncio.Queue(), asyncio.Queue()
+            await inbox.put({"type": "websocket.connect"})
+            task = asyncio.ensure_future(world_socket(scope, inbox.get, outbox.put))
+
+            async def next_json():
+                while True:
+                    event = await asyncio.wait_for(outbox.get(), 5)
+                    if event["type"] == "websocket.send":
+                        return json.loads(event["text"])
+
+            snapshot = await next_json()
+            spawn = await sync_to_async(EnemySpawn.objects.filter(zone=self.zone).first)()
+            await sync_to_async(views.kill_spawn)(spawn, views.timezone.now())
+            pushed = await next_json()
+
+            await inbox.put({"type": "websocket.disconnect"})
+            await task
+            return snapshot, spawn, pushed
+
+        snapshot, spawn, pushed = talk()
+        self.assertEqual(snapshot["type"], "snapshot")
+        self.assertIn({"x": spawn.x, "y": spawn.y}, snapshot["alive_enemies"])
+        self.assertEqual(pushed["type"], "spawn")
+        self.assertEqual((pushed["x"], pushed["y"], pushed["alive"]), (spawn.x, spawn.y, False))
+
+    def test_socket_rejects_foreign_origins(self):
+        for origin in ("https://evil.example", None):
+            events = self.handshake(self.socket_scope(origin))
+            self.assertEqual(events, [{"type": "websocket.close", "code": 4403}])
+
+        with self.settings(CSRF_TRUSTED_ORIGINS=["https://*.rpgloco.cl"]):
+            events = self.handshake(self.socket_scope("https://play.rpgloco.cl"))
+        self.assertEqual(events[0]["type"], "websocket.accept")
+
+    def test_socket_session_dies_with_password_change(self):
+        scope = self.socket_scope()
+        self.user.set_password("nueva")
+        self.user.save()
+        events = self.handshake(scope)
+        self.assertEqual(events[-1], {"type": "websocket.close", "code": 4401})
+
+    def test_socket_connect_keeps_player_in_zone(self):
+        occupancy.evict_idle(self.zone, now=time.time() + 3600)
+        self.assertIsNone(occupancy.backend.get(self.zone, self.character.id))
+
+        events = self.handshake(self.socket_scope())
+        self.assertEqual(json.loads(events[-1]["text"])["type"], "snapshot")
+        self.assertIsNotNone(occupancy.backend.get(self.zone, self.character.id))
+
+    def test_respawn_check_is_scheduled_once_per_spawn(self):
+        @async_to_sync
+        async def schedule():
+            for _ in range(3):
+                ws.schedule_respawn_check(self.zone, 1, 1, 60)
+            checks = dict(ws._respawn_checks)
+            for task in checks.values():
+                task.cancel()
+            await asyncio.gather(*checks.values(), return_exceptions=True)
+            return checks
+
+        self.assertEqual(list(schedule()), [(self.zone, 1, 1)])
+        self.assertEqual(ws._respawn_checks, {})
+
+
+def eager_regen(lives, tick, now, max_lives=3, minutes=10):
+    """La regeneración de antes (la que escribía en cada request), como referencia."""
+    if tick > now:
+        tick = now
+    if lives >= max_lives:
+        return max_lives, now, 0
+    interval = timedelta(minutes=minutes)
+    ticks = int((now - tick).total_seconds() // interval.total_seconds())
+    if ticks <= 0:
+        return lives, tick, max(0, int((tick + interval - now).total_seconds()))
+    gained = min(ticks, max_lives - lives)
+    lives += gained
+    tick = tick + interval * gained
+    if lives >= max_lives:
+        return max_lives, now, 0
+    return lives, tick, max(0, int((tick + interval - now).total_seconds()))
+
+
+class EncounterPoolTestCase(TestCase):
+    def setUp(self):
+        self.types = [EnemyType.objects.create(name=n) for n in ("Goblin", "Lobo", "Orco")]
+
+    def test_roll_pack_matches_inline_roll(self):
+        # misma secuencia que el generador de antes con la misma semilla
+        rng, ref = random.Random(7), random.Random(7)
+        for level in (1, 10, 20):
+            pack = roll_pack(self.types, level, rng)
+            expected = []
+            for _ in range(ref.randint(1, 4)):
+                et = ref.choice(self.types)
+                rarity = roll_rarity(ref)
+                stats = calculate_enemy_stats(et, level=level, rarity=rarity)
+                expected.append((et.id, rarity, stats["hp"], stats["atk"], stats["def"], stats["speed"]))
+            self.assertEqual(
+                [(p["enemy_type_id"], p["rarity"], p["hp"], p["atk"], p["defense"], p["speed"]) for p in pack],
+                expected,
+            )
+
+    def test_seeded_packs_keep_the_distribution(self):
+        pool = EncounterPool()
+        pool.create_pack(10, seeded_rng("1-0", "warmup"))
+
+        sizes, rarities = {}, {}
+        # tipos y stats en memoria: tirar no consulta la BD
+        with self.assertNumQueries(0):
+            packs = [pool._roll(10, seeded_rng("1-0", f"{i}:0:0")) for i in range(4000)]
+        for pack in packs:
+            sizes[len(pack)] = sizes.get(len(pack), 0) + 1
+            for spec in pack:
+                rarities[spec["rarity"]] = rarities.get(spec["rarity"], 0) + 1
+
+        self.assertEqual(sorted(sizes), [1, 2, 3, 4])
+        for n in sizes.values():
+            self.assertAlmostEqual(n / len(packs), 0.25, delta=0.03)
+        total = sum(rarities.values())
+        for key, p in ENEMY_RARITY_ROLL:
+            self.assertAlmostEqual(rarities.get(key, 0) / total, p, delta=0.02, msg=key)
+
+    def test_create_pack_is_one_insert(self):
+        pool = EncounterPool()
+        pool.enemy_types()
+
+        with self.assertNumQueries(1):
+            enemies = pool.create_pack(20, seeded_rng("3-0", "1:1:1"))
+        expected = roll_pack(self.types, 20, seeded_rng("3-0", "1:1:1"))
+        self.assertEqual([(e.enemy_type_id, e.rarity) for e in enemies],
+                         [(p["enemy_type_id"], p["rarity"]) for p in expected])
+        for enemy in EnemyInstance.objects.filter(id__in=[e.id for e in enemies]):
+            stats = calculate_enemy_stats(enemy.enemy_type, level=20, rarity=enemy.rarity)
+            self.assertEqual((enemy.level, enemy.hp, enemy.atk, enemy.defense, enemy.speed),
+                             (20, stats["hp"], stats["atk"], stats["def"], stats["speed"]))
+
+    def test_enemy_type_change_discards_stats(self):
+        pool = EncounterPool()
+        pool.create_pack(1, seeded_rng("k"))
+        pool.reset()
+        self.assertEqual(pool._stats, {})
+        with self.assertNumQueries(2):
+            pool.create_pack(1, seeded_rng("k"))  # recarga los tipos + INSERT
+
+    def test_enemy_types_are_reloaded_after_ttl(self):
+        pool = EncounterPool()
+        pool.create_pack(1, seeded_rng("k"))
+        self.assertTrue(pool._stats)
+
+        # cambio hecho "en otro proceso": UPDATE sin signals
+        EnemyType.objects.filter(pk=self.types[0].pk).update(base_hp=999)
+        with self.settings(WORLD_ENCOUNTER_TYPES_SECONDS=0):
+            types = pool.enemy_types()
+        self.assertEqual(types[0].base_hp, 999)
+        self.assertEqual(pool._stats, {})
+
+    def test_seeded_packs_are_stable_across_processes(self):
+        # otro intérprete con otro PYTHONHASHSEED calcula la misma semilla
+        code = "from game.seeding import stable_seed; print(stable_seed('1-0:4:5', 12))"
+        seeds = {
+            subprocess.run(
+                [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR, env={**os.environ, "PYTHONHASHSEED": hashseed},
+            ).stdout.strip()
+            for hashseed in ("1", "2")
+        }
+        self.assertEqual(seeds, {str(stable_seed("1-0:4:5", 12))})
+        self.assertNotEqual(stable_seed("a1", "2"), stable_seed("a", "12"))
+
+        first = views.generate_enemy_pack_instances("2-0", "4:5:1")
+        # tipos y stats ya cargados en el pool: solo el INSERT
+        with self.assertNumQueries(1):
+            second = views.generate_enemy_pack_instances("2-0", "4:5:1")
+        self.assertEqual(
+            [(e.enemy_type_id, e.rarity, e.hp) for e in first],
+            [(e.enemy_type_id, e.rarity, e.hp) for e in second],
+        )
+        level = views.get_zone_level_from_zonekey("2-0")
+        expected = roll_pack(list(EnemyType.objects.all()), level, seeded_rng("2-0", "4:5:1"))
+        self.assertEqual([(e.enemy_type_id, e.rarity, e.hp) for e in first],
+                         [(p["enemy_type_id"], p["rarity"], p["hp"]) for p in expected])
+        self.assertEqual(
+            roll_pack(self.types, 10, seeded_rng("k")), roll_pack(self.types, 10, seeded_rng("k"))
+        )
+
+
+class TaskQueueTestCase(TestCase):
+    def setUp(self):
+        self.enterContext(self.settings(WORLD_TASK_WORKER=True))
+        views._SEEDED_ZONES.clear()
+        EnemyType.objects.create(name="Goblin")
+        self.calls = []
+
+        @tasks.task("test_flaky", max_attempts=2)
+        def flaky(fail):
+            self.calls.append(fail)
+            if fail:
+                raise RuntimeError("boom")
+
+        self.addCleanup(tasks.HANDLERS.pop, "test_flaky")
+
+    def test_enqueue_is_one_insert_and_worker_runs_it(self):
+        with self.assertNumQueries(1):
+            queued = tasks.enqueue("seed_zone_spawns", {"zone": "1-0"})
+        self.assertFalse(EnemySpawn.objects.filter(zone="1-0").exists())
+
+        worker = tasks.Worker(concurrency=2)
+        self.assertEqual(worker.step(), 1)
+        self.assertEqual(worker.step(), 0)
+
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (TaskStatus.DONE, 1))
+        self.assertTrue(EnemySpawn.objects.filter(zone="1-0").exists())
+        self.assertEqual(worker.by_name["seed_zone_spawns"]["done"], 1)
+
+    def test_claim_is_exclusive_and_recovers_stale_locks(self):
+        queued = tasks.enqueue("test_flaky", {"fail": False})
+        self.assertEqual([t.pk for t in tasks.claim(10)], [queued.pk])
+        self.assertEqual(tasks.claim(10), [])
+
+        # worker muerto a mitad de camino: pasado el lock se vuelve a reclamar
+        Task.objects.filter(pk=queued.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([t.pk for t in tasks.claim(10)], [queued.pk])
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        queued = tasks.enqueue("test_flaky", {"fail": True})
+        worker = tasks.Worker()
+
+        with self.assertLogs("game.tasks", "WARNING"):
+            worker.step()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (TaskStatus.PENDING, 1))
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn("boom", queued.last_error)
+        self.assertEqual(worker.step(), 0)  # aún no vence el backoff
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        with self.assertLogs("game.tasks", "WARNING"):
+            worker.step()
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (TaskStatus.FAILED, 2))
+        self.assertEqual(worker.metrics["retry"], 1)
+        self.assertEqual(worker.metrics["failed"], 1)
+        self.assertEqual(tasks.queue_stats()["failed"], 1)
+
+    def test_edge_warming_enqueues_seeding_once(self):
+        views._QUEUED_SEEDS.clear()
+        for _ in range(3):
+            views.warm_zone("2-0", defer=True)
+        self.assertEqual(Task.objects.filter(name="seed_zone_spawns", payload={"zone": "2-0"}).count(), 1)
+        self.assertFalse(EnemySpawn.objects.filter(zone="2-0").exists())
+
+    def test_without_worker_delayed_tasks_do_not_run_at_commit(self):
+        self.enterContext(self.settings(WORLD_TASK_WORKER=False))
+        self.enterContext(mock.patch.object(tasks, "_last_drain", None))
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = tasks.enqueue("test_flaky", {"fail": False}, delay=60)
+            self.assertIsNone(tasks.enqueue("test_flaky", {"fail": False}))
+        self.assertEqual(self.calls, [False])  # solo la que no tenía delay
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, TaskStatus.PENDING)
+
+        # sin worker, el warming no encola ni siembra: se siembra al entrar
+        views._QUEUED_SEEDS.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            views.warm_zone("2-0", defer=True)
+        self.assertFalse(Task.objects.filter(name="seed_zone_spawns").exists())
+        self.assertFalse(EnemySpawn.objects.filter(zone="2-0").exists())
+
+
+class StartBattleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=self.media.name))
+
+        self.user = User.objects.create_user(username="fighter", password="x")
+        self.character = Character.objects.create(owner=self.user, name="F", char_class="tank")
+        Character.objects.filter(pk=self.character.pk).update(base_hp=10**6, base_atk=10**5, base_speed=50)
+        for slot in ("helmet", "ring"):
+            EquipmentItem.objects.create(owner=self.character, name=slot, slot=slot, base_atk=5, is_equipped=True)
+
+        types = [EnemyType.objects.create(name=n) for n in ("Goblin", "Lobo", "Orco")]
+        self.enemies = [
+            EnemyInstance.objects.create(enemy_type=et, level=10, rarity="normal", hp=1, atk=1, defense=0, speed=1)
+            for et in types
+        ]
+        images.enemy_atlas()  # el atlas se arma una vez, no por batalla
+        self.enterContext(self.settings(WORLD_TASK_WORKER=True))
+
+    def fight(self):
+        request = APIRequestFactory().post(
+            "/api/game/battle/start/",
+            {"character_id": self.character.pk, "enemy_ids": [e.pk for e in self.enemies]},
+            format="json",
+        )
+        force_authenticate(request, user=self.user)
+        return views.StartBattleView.as_view()(request)
+
+    def test_win_query_budget(self):
+        # personaje (con bonos de equipo) y enemigos+tipos; después SAVEPOINT,
+        # UPDATE de recompensas, INSERT de la limpieza y RELEASE
+        with self.assertNumQueries(6):
+            response = self.fight()
+        self.assertEqual(response.data["fight_result"], "win")
+        self.assertEqual([e["name"] for e in response.data["enemies"]], ["Goblin", "Lobo", "Orco"])
+
+        stored = Character.objects.get(pk=self.character.pk)
+        rewards = response.data["rewards"]
+        self.assertEqual(stored.orbs_bronze, rewards["orbs_bronze"])
+        self.assertEqual(response.data["player"]["level"], stored.level)
+        self.assertEqual(response.data["player"]["xp"], stored.xp)
+        self.assertTrue(Task.objects.filter(name="discard_enemy_instances").exists())
+
+    def test_without_worker_cleanup_waits_for_its_delay(self):
+        self.enterContext(self.settings(WORLD_TASK_WORKER=False))
+        self.enterContext(mock.patch.object(tasks, "_last_drain", None))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.fight().data["fight_result"], "win")
+        # el commit no borra nada: la tarea queda guardada con su delay
+        queued = Task.objects.get(name="discard_enemy_instances")
+        self.assertEqual(queued.status, TaskStatus.PENDING)
+        self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=500))
+        self.assertEqual(EnemyInstance.objects.filter(pk__in=[e.pk for e in self.enemies]).count(), 3)
+
+        # vencida, la corre la próxima request que encole algo
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        tasks._last_drain = None
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue("seed_zone_spawns", {"zone": "1-0"})
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, TaskStatus.DONE)
+        self.assertFalse(EnemyInstance.objects.filter(pk__in=[e.pk for e in self.enemies]).exists())
+
+    def test_rewards_do_not_overwrite_concurrent_writes(self):
+        stale = Character.objects.get(pk=self.character.pk)
+        # otra request sube XP y vende orbes mientras tanto
+        Character.objects.filter(pk=stale.pk).update(xp=90, orbs_bronze=7, coins=555)
+
+        levels_up = stale.grant_rewards(xp=20, orbs_bronze=2)
+        stored = Character.objects.get(pk=stale.pk)
+        self.assertEqual(levels_up, 1)
+        self.assertEqual((stored.level, stored.xp, stored.orbs_bronze, stored.coins), (2, 10, 9, 555))
+
+
+class GearTotalsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="gear", password="x")
+        self.character = Character.objects.create(owner=self.user, name="G", char_class="dps")
+
+    def item(self, slot, rarity="basic", **stats):
+        return EquipmentItem.objects.create(owner=self.character, name=slot, slot=slot, rarity=rarity, **stats)
+
+    def gear(self):
+        return Character.objects.get(pk=self.character.pk).gear_stats()
+
+    def equip(self, item, equip=True):
+        request = APIRequestFactory().post(
+            "/api/game/equipment/equip/", {"character_id": self.character.pk, "item_id": item.pk, "equip": equip}, format="json"
+        )
+        force_authenticate(request, user=self.user)
+        return views.EquipItemView.as_view()(request)
+
+    def test_equip_swap_upgrade_and_delete_keep_totals(self):
+        helmet = self.item("helmet", base_hp=10, base_def=4)
+        epic = self.item("helmet", rarity="epic", base_hp=10, base_def=4)
+        ring = self.item("ring", base_atk=3, base_speed=1)
+        self.assertEqual(self.gear(), {"hp": 0, "atk": 0, "def": 0, "speed": 0})
+
+        self.equip(helmet)
+        self.equip(ring)
+        self.equip(ring)  # ya equipado: no suma dos veces
+        self.assertEqual(self.gear(), {"hp": 10, "atk": 3, "def": 4, "speed": 1})
+
+        self.equip(epic)  # mismo slot: saca el otro casco
+        self.assertEqual(self.gear(), {"hp": 50, "atk": 3, "def": 20, "speed": 1})
+
+        epic.refresh_from_db()
+        epic.rarity = "legendary"  # mejora de un ítem equipado
+        epic.save()
+        self.assertEqual(self.gear(), {"hp": 80, "atk": 3, "def": 32, "speed": 1})
+
+        self.equip(ring, equip=False)
+        EquipmentItem.objects.filter(pk=epic.pk).delete()
+        self.assertEqual(self.gear(), {"hp": 0, "atk": 0, "def": 0, "speed": 0})
+        self.assertEqual(gear_drift(), {})
+
+    def test_stale_character_save_keeps_gear(self):
+        stale = Character.objects.get(pk=self.character.pk)
+        self.item("chest", base_hp=10, is_equipped=True)
+        stale.gain_xp(5)
+        self.assertEqual(self.gear()["hp"], 10)
+        self.assertEqual(gear_drift(), {})
+
+        # un save() completo con la instancia vieja sí los pisa: check_gear lo arregla
+        stale.save()
+        self.assertEqual(gear_drift(), {self.character.pk: ({"hp": 0, "atk": 0, "def": 0, "speed": 0},
+                                                            {"hp": 10, "atk": 0, "def": 0, "speed": 0})})
+
+    def test_battler_reads_totals_without_item_queries(self):
+        self.item("main_hand", base_atk=6, is_equipped=True)
+        character = Character.objects.get(pk=self.character.pk)
+        with self.assertNumQueries(0):
+            battler = character_to_battler(character)
+        self.assertEqual(battler.atk, character.base_atk + 6)
+
+    def test_db_item_stats_match_total_stats(self):
+        bases = [(0, 0, 0, 0), (3, 7, 1, 1), (10, 6, 4, 2), (17, 13, 9, 5)]
+        for rarity in RARITY_STAT_MULTIPLIER:
+            for hp, atk, df, spd in bases:
+                self.item("ring", rarity=rarity, base_hp=hp, base_atk=atk, base_def=df, base_speed=spd)
+
+        request = APIRequestFactory().get(
+            "/api/game/inventory/api/", {"character_id": self.character.pk, "limit": 200}
+        )
+        force_authenticate(request, user=self.user)
+        with self.assertNumQueries(2):  # personaje + ítems con stats anotados
+            data = views.InventoryView.as_view()(request).data["results"]
+
+        items = {i.pk: i for i in EquipmentItem.objects.all()}
+        self.assertEqual(len(data), len(items))
+        for row in data:
+            stats = items[row["id"]].total_stats()
+            self.assertEqual(
+                (row["bonus_hp"], row["bonus_atk"], row["bonus_def"], row["bonus_speed"]),
+                (stats["hp"], stats["atk"], stats["def"], stats["speed"]),
+                row["rarity"],
+            )
+
+    def test_one_equipped_item_per_slot(self):
+        self.item("amulet", is_equipped=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.item("amulet", is_equipped=True)
+
+    def test_equip_returns_new_loadout(self):
+        old = self.item("pet", base_hp=8, is_equipped=True)
+        ring = self.item("ring", base_atk=3, is_equipped=True)
+        new = self.item("pet", rarity="rare", base_hp=8)
+
+        data = self.equip(new).data
+        self.assertEqual(sorted(i["id"] for i in data["equipped_items"]), sorted([ring.pk, new.pk]))
+        self.assertEqual(
+            {i["id"]: i["bonus_hp"] for i in data["equipped_items"]}, {ring.pk: 0, new.pk: 24}
+        )
+        self.assertFalse(EquipmentItem.objects.get(pk=old.pk).is_equipped)
+        self.assertEqual(self.gear(), {"hp": 24, "atk": 3, "def": 0, "speed": 0})
+        self.assertEqual(gear_drift(), {})
+
+    @skipUnless(connection.vendor == "postgresql", "el equipar en un statement (CTEs) es solo de PostgreSQL")
+    def test_postgres_equip_statement(self):
+        old = self.item("pet", base_hp=8, base_def=2)
+        ring = self.item("ring", base_atk=3, is_equipped=True)
+        new = self.item("pet", rarity="rare", base_hp=8)
+
+        with CaptureQueriesContext(connection) as queries:
+            loadout = old.set_equipped()
+        self.assertTrue(any("WITH target AS" in q["sql"] for q in queries.captured_queries))
+        self.assertEqual([(i.pk, i.is_equipped) for i in loadout], [(old.pk, True), (ring.pk, True)])
+        self.assertEqual(self.gear(), {"hp": 8, "atk": 3, "def": 2, "speed": 0})
+
+        # mismo slot: sale el anterior y se restan sus bonos
+        loadout = new.set_equipped()
+        self.assertEqual([(i.pk, i.is_equipped) for i in loadout], [(new.pk, True), (ring.pk, True)])
+        self.assertFalse(EquipmentItem.objects.get(pk=old.pk).is_equipped)
+        self.assertEqual(self.gear(), {"hp": 24, "atk": 3, "def": 0, "speed": 0})
+
+        # ya equipado: no suma dos veces
+        self.assertEqual([i.pk for i in new.set_equipped()], [new.pk, ring.pk])
+        self.assertEqual(self.gear(), {"hp": 24, "atk": 3, "def": 0, "speed": 0})
+        self.assertEqual(gear_drift(), {})
+
+        with self.assertRaisesMessage(IntegrityError, "game_item_one_equipped_per_slot"), transaction.atomic():
+            EquipmentItem.objects.filter(pk=old.pk).update(is_equipped=True)
+
+    def test_check_command_reports_and_fixes_drift(self):
+        self.item("boots", base_def=4, is_equipped=True)
+        Character.objects.filter(pk=self.character.pk).update(gear_def=99)
+
+        with self.assertRaises(CommandError):
+            call_command("check_gear", stdout=io.StringIO())
+        out = io.StringIO()
+        call_command("check_gear", "--fix", stdout=out)
+        self.assertIn("1 personajes corregidos", out.getvalue())
+        self.assertEqual(self.gear()["def"], 4)
+        self.assertEqual(gear_drift(), {})
+
+
+class InventoryPageTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="inv", password="x")
+        self.character = Character.objects.create(owner=self.user, name="I", char_class="healer")
+        rng = random.Random(11)
+        slots = ["helmet", "ring", "boots"]
+        rarities = list(RARITY_STAT_MULTIPLIER)
+        for i in range(40):
+            EquipmentItem.objects.create(
+                owner=self.character, name=f"i{i}", slot=rng.choice(slots), rarity=rng.choice(rarities),
+                level=rng.randint(1, 4), base_hp=rng.randint(0, 9), base_atk=rng.randint(0, 9),
+            )
+        # un equipado por slot (índice único)
+        for slot in slots:
+            EquipmentItem.objects.filter(owner=self.character, slot=slot).first().set_equipped()
+        # mismos created_at en grupos: el id tiene que desempatar
+        for i, item in enumerate(EquipmentItem.objects.order_by("id")):
+            EquipmentItem.objects.filter(pk=item.pk).update(created_at=timezone.now() - timedelta(minutes=i // 3))
+
+    def get(self, **params):
+        request = APIRequestFactory().get("/api/game/inventory/api/", {"character_id": self.character.pk, **params})
+        force_authenticate(request, user=self.user)
+        return views.InventoryView.as_view()(request)
+
+    def walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            extra = {"cursor": cursor} if cursor else {}
+            with self.assertNumQueries(2):
+                data = self.get(limit=7, **params, **extra).data
+            ids += [row["id"] for row in data["results"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                return ids
+
+    def test_every_sort_pages_through_all_items_in_order(self):
+        items = list(EquipmentItem.objects.all())
+        rank = {r: i for i, r in enumerate(RARITY_STAT_MULTIPLIER)}
+        keys = {
+            "new": lambda it: (it.created_at, it.id),
+            "rarity": lambda it: (rank[it.rarity], it.level, it.id),
+            "level": lambda it: (it.level, it.id),
+            "power": lambda it: (sum(it.total_stats().values()), it.id),
+        }
+        for sort, key in keys.items():
+            expected = [it.id for it in sorted(items, key=key, reverse=True)]
+            self.assertEqual(self.walk(sort=sort), expected, sort)
+
+    def test_filters(self):
+        ids = self.walk(slot="ring", equipped="false")
+        self.assertEqual(
+            set(ids), set(EquipmentItem.objects.filter(slot="ring", is_equipped=False).values_list("id", flat=True))
+        )
+        rare = self.get(rarity="rare", limit=200).data["results"]
+        self.assertTrue(all(row["rarity"] == "rare" for row in rare))
+
+    def test_without_cursor_or_limit_keeps_the_bare_list(self):
+        with self.assertNumQueries(2):
+            data = self.get().data
+        self.assertIsInstance(data, list)
+        items = EquipmentItem.objects.all()
+        self.assertEqual([row["id"] for row in data],
+                         [it.id for it in sorted(items, key=lambda it: (it.created_at, it.id), reverse=True)])
+        self.assertEqual([row["id"] for row in self.get(sort="new").data], [row["id"] for row in data])
+        self.assertEqual(len(self.get(slot="ring").data), items.filter(slot="ring").count())
+
+    def test_bad_params(self):
+        self.assertEqual(self.get(cursor="nope").status_code, 400)
+        # cursores bien formados con valores de otro tipo: 400, no 500
+        for sort, keys in views.INVENTORY_SORTS.items():
+            n = len(keys)
+            for values in ([{}] + [1] * n, [{"a": 1}] + [1] * n, [1] * n + [[1]], [None] * (n + 1), ["x"] * (n + 1)):
+                cursor = views.encode_cursor(values)
+                self.assertEqual(self.get(sort=sort, cursor=cursor).status_code, 400, (sort, values))
+        self.assertEqual(self.get(sort="price").status_code, 400)
+        self.assertEqual(self.get(limit="x").status_code, 400)
+
+
+class LivesTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="lives", password="x")
+        self.t0 = timezone.now()
+        self.character = Character.objects.create(
+            owner=user, name="L", char_class="dps", lives=0, lives_last_tick=self.t0
+        )
+
+    def test_lazy_regen_matches_eager_without_writes(self):
+        lives, tick = 0, self.t0
+        for minutes in (0, 4, 10, 17, 25, 31, 45, 90):
+            now = self.t0 + timedelta(minutes=minutes)
+            lives, tick, seconds = eager_regen(lives, tick, now)
+
+            fresh = Character.objects.get(pk=self.character.pk)
+            with self.assertNumQueries(0):
+                info = fresh.regen_lives(now)
+            self.assertEqual((info["lives"], info["seconds_to_next"]), (lives, seconds), minutes)
+            self.assertEqual(fresh.lives_last_tick, tick)
+
+    def test_consume_life_is_conditional(self):
+        now = self.t0 + timedelta(minutes=25)  # 2 vidas regeneradas
+        stale = Character.objects.get(pk=self.character.pk)
+
+        self.assertTrue(self.character.consume_life(now))
+        self.assertEqual(self.character.lives, 1)
+        # una instancia vieja no pisa el descuento anterior
+        self.assertTrue(stale.consume_life(now))
+        self.assertEqual(stale.lives, 0)
+        self.assertFalse(stale.consume_life(now))
+
+        stored = Character.objects.get(pk=self.character.pk)
+        self.assertEqual(stored.lives, 0)
+        self.assertEqual(stored.lives_last_tick, self.t0 + timedelta(minutes=20))
+
+    def test_consume_life_locks_the_row_under_contention(self):
+        now = self.t0 + timedelta(minutes=25)  # 2 vidas regeneradas
+        lives_at = Character._lives_at
+        reads = []
+
+        def racing(character, lives, tick, at):
+            # otra request escribe entre cada lectura sin bloqueo y su UPDATE
+            reads.append(lives)
+            if len(reads) <= 3:
+                Character.objects.filter(pk=character.pk).update(lives_last_tick=tick - timedelta(seconds=1))
+            return lives_at(character, lives, tick, at)
+
+        with mock.patch.object(Character, "_lives_at", autospec=True, side_effect=racing):
+            self.assertTrue(self.character.consume_life(now))
+        self.assertEqual(len(reads), 4)  # 3 intentos perdidos + el bloqueado
+        self.assertEqual(Character.objects.get(pk=self.character.pk).lives, 1)
+
+    def test_lose_life_reports_when_there_was_none_left(self):
+        # lives=0 y el tick recién puesto: no hay regeneración todavía
+        request = APIRequestFactory().post("/api/game/characters/lose-life/", {"character_id": self.character.pk}, format="json")
+        force_authenticate(request, user=self.character.owner)
+        response = views.LoseLifeView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["lives"], response.data["life_consumed"]), (0, False))
+        self.assertTrue(response.data["sent_to_safe_zone"])
+
+
+class TimingWheelTestCase(SimpleTestCase):
+    def test_fires_in_order_across_wheel_and_overflow(self):
+        wheel = TimingWheel(resolution=1.0, slots=8, start=100)
+        wheel.schedule("far", 150.5)      # fuera de la rueda: espera en el heap
+        wheel.schedule("soon", 102.2)
+        wheel.schedule("late", 103.0)
+        wheel.schedule("moved", 101.0)
+        wheel.schedule("moved", 120.0)    # re-programar solo la mueve
+
+        self.assertEqual(wheel.advance(102.0), [])
+        self.assertEqual([k for k, _ in wheel.advance(103.0)], ["soon", "late"])
+        self.assertEqual([k for k, _ in wheel.advance(149.9)], ["moved"])
+        self.assertEqual([k for k, _ in wheel.advance(1000)], ["far"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_rescheduling_does_not_grow_the_heap(self):
+        wheel = TimingWheel(resolution=1.0, slots=8, start=100)
+        for i in range(100):
+            wheel.schedule("far", 500.0 + i)
+        self.assertEqual(len(wheel), 1)
+        self.assertLessEqual(len(wheel.overflow), 8)
+        self.assertEqual([k for k, _ in wheel.advance(1000)], ["far"])
+
+
+class RespawnTickerTestCase(TestCase):
+    def test_due_spawns_revive_in_a_batch_and_bump_version(self):
+        cache.clear()
+        enemy_type = EnemyType.objects.create(name="Goblin")
+        now = timezone.now()
+        due = [
+            EnemySpawn.objects.create(zone="2-0", x=i, y=1, enemy_type=enemy_type,
+                                      is_alive=False, next_respawn_at=now - timedelta(seconds=1))
+            for i in range(3)
+        ]
+        later = EnemySpawn.objects.create(zone="2-0", x=9, y=1, enemy_type=enemy_type,
+                                          is_alive=False, next_respawn_at=now + timedelta(minutes=5))
+        version = views.spawn_version("2-0")
+
+        ticker = RespawnTicker()
+        ticker.load()
+        with self.assertNumQueries(2):
+            self.assertEqual(ticker.tick(time.time()), 3)
+
+        self.assertEqual(EnemySpawn.objects.filter(pk__in=[sp.pk for sp in due], is_alive=True).count(), 3)
+        self.assertFalse(EnemySpawn.objects.get(pk=later.pk).is_alive)
+        self.assertGreater(views.spawn_version("2-0"), version)
+
+        # con ticker las requests no reviven nada
+        with self.settings(WORLD_RESPAWN_TICKER="process"), self.assertNumQueries(0):
+            views.refresh_respawns("2-0")
+
+    def test_new_deaths_reach_the_ticker_through_the_queue(self):
+        cache.clear()
+        enemy_type = EnemyType.objects.create(name="Goblin")
+        spawn = EnemySpawn.objects.create(zone="2-0", x=1, y=1, enemy_type=enemy_type, respawn_seconds=30)
+
+        with self.settings(WORLD_RESPAWN_TICKER="process"):
+            ticker = RespawnTicker()
+            ticker.step()
+            self.assertEqual(len(ticker.wheel), 0)
+
+            now = timezone.now()
+            views.kill_spawn(spawn, now)
+            # el worker general no toma las tareas del ticker
+            self.assertEqual(tasks.claim(10), [])
+
+            # sin volver a recorrer EnemySpawn: la muerte llega como tarea
+            ticker.receive_deaths()
+            self.assertEqual(len(ticker.wheel), 1)
+            self.assertEqual(ticker.tick(now.timestamp() + 31), 1)
+        self.assertTrue(EnemySpawn.objects.get(pk=spawn.pk).is_alive)
+
+
+class ActiveCharacterTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="multi", password="x")
+        self.first = Character.objects.create(owner=self.user, name="Uno", char_class="tank")
+        self.second = Character.objects.create(owner=self.user, name="Dos", char_class="dps")
+        self.client.force_login(self.user)
+
+    def active_id(self):
+        request = self.client.get("/").wsgi_request
+        return request.character.id
+
+    def test_default_is_lowest_id_and_selection_sticks(self):
+        self.assertEqual(self.active_id(), self.first.id)
+        self.assertEqual(self.client.session[SESSION_KEY], self.first.id)
+
+        response = self.client.post("/api/game/characters/select/", {"character_id": self.second.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.active_id(), self.second.id)
+
+    def test_views_share_the_request_character(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/game/shop/")
+            # el middleware y la vista comparten el memo del request
+            self.assertEqual(response.wsgi_request.character, response.context["character"])
+        self.assertEqual(response.status_code, 200)
+        character_selects = [q for q in ctx.captured_queries
+                             if q["sql"].startswith("SELECT") and 'FROM "game_character"' in q["sql"]]
+        self.assertEqual(len(character_selects), 1)
+
+    def test_cache_is_dropped_by_direct_updates(self):
+        with self.settings(WORLD_ACTIVE_CHARACTER_CACHE_SECONDS=60):
+            self.assertEqual(self.active_id(), self.first.id)
+            self.first.grant_rewards(orbs_gold=3)
+            self.assertEqual(self.client.get("/").wsgi_request.character.orbs_gold, 3)
+
+    def test_cannot_select_someone_elses_character(self):
+        other = User.objects.create_user(username="otro", password="x")
+        theirs = Character.objects.create(owner=other, name="Ajeno", char_class="dps")
+
+        response = self.client.post("/api/game/characters/select/", {"character_id": theirs.id})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.active_id(), self.first.id)
+
+
+class MapAssetTestCase(TestCase):
+    def test_map_asset_is_immutable_and_hash_checked(self):
+        url = views.map_asset_url("1-0")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(json.loads(response.content), MAPS["1-0"]["map"])
+
+        stale = self.client.get(url.replace(MAPS["1-0"]["asset_hash"], "0" * 16))
+        self.assertRedirects(stale, url, fetch_redirect_response=False)
+
+    def test_background_rendered_once_to_disk(self):
+        with tempfile.TemporaryDirectory() as root, self.settings(WORLD_BACKGROUND_ROOT=Path(root)):
+            response = self.client.get(views.background_url("1-0"))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("immutable", response["Cache-Control"])
+            image = Image.open(io.BytesIO(b"".join(response.streaming_content)))
+            self.assertEqual(image.size, (18 * backgrounds.TILE_SIZE, 18 * backgrounds.TILE_SIZE))
+            response.close()
+
+            path = backgrounds.background_path("1-0")
+            mtime = path.stat().st_mtime_ns
+            self.assertEqual(backgrounds.ensure_background("1-0"), path)
+            self.assertEqual(path.stat().st_mtime_ns, mtime)
+
+
+class ImageVariantsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=self.media.name))
+
+    def png(self, size, color):
+        buf = io.BytesIO()
+        Image.new("RGBA", size, color).save(buf, "PNG")
+        return SimpleUploadedFile("sprite.png", buf.getvalue(), content_type="image/png")
+
+    def test_upload_builds_hashed_variants(self):
+        enemy = EnemyType.objects.create(name="Lobo", image=self.png((300, 150), "red"))
+
+        url = images.variant_url(enemy.image, "sprite", "webp")
+        self.assertIn(images.content_hash(enemy.image), url)
+        with default_storage.open(images.variant_name(enemy.image, "sprite", "webp")) as f:
+            self.assertEqual(Image.open(f).size, (64, 64))
+
+    def test_enemy_atlas_maps_every_enemy(self):
+        a = EnemyType.objects.create(name="A", image=self.png((40, 40), "red"))
+        b = EnemyType.objects.create(name="B", image=self.png((40, 40), "blue"))
+        EnemyType.objects.create(name="Sin imagen")
+
+        atlas = images.enemy_atlas(cell=32)
+        self.assertEqual(set(atlas["frames"]), {str(a.id), str(b.id)})
+        with default_storage.open(f"atlases/enemies-{atlas['hash']}.png") as f:
+            sheet = Image.open(f).convert("RGBA")
+            frame = atlas["frames"][str(b.id)]
+            self.assertEqual(sheet.getpixel((frame["x"] + 16, frame["y"] + 16)), (0, 0, 255, 255))
+
+        # mismo contenido => mismo atlas
+        cache.clear()
+        self.assertEqual(images.enemy_atlas(cell=32)["hash"], atlas["hash"])
+
+    def test_plain_character_save_keeps_variants(self):
+        user = User.objects.create_user(username="pintor", password="x")
+        character = Character.objects.create(owner=user, name="Pintor", char_class="dps", image=self.png((40, 40), "red"))
+
+        # vidas, monedas, xp...: la imagen no cambió, no se rehacen variantes
+        with mock.patch("game.signals.make_variants") as make:
+            character.coins += 10
+            character.save()
+            Character.objects.get(pk=character.pk).save()
+        make.assert_not_called()
+
+        with mock.patch("game.signals.make_variants") as make:
+            character.image = self.png((40, 40), "blue")
+            character.save()
+        make.assert_called_once()
+
+
+class SharedOccupancyTestCase(TestCase):
+    def test_workers_share_the_same_zone(self):
+        client = LocalHashClient()
+        worker_a = ZoneOccupancy(SharedOccupancyBackend(client))
+        worker_b = ZoneOccupancy(SharedOccupancyBackend(client))
+
+        user = User.objects.create_user(username="a", password="x")
+        character = Character.objects.create(owner=user, name="A", char_class="tank")
+        state = PlayerState(character=character, zone="2-2", x=4, y=4)
+        worker_a.enter(character, state)
+
+        viewer = PlayerState(character_id=-1, zone="2-2", x=5, y=5)
+        _, visible = worker_b.visible_to(viewer)
+        self.assertEqual([p["id"] for p in visible], [character.id])
+
+        worker_b.leave(character.id, "2-2")
+        self.assertEqual(worker_a.backend.members("2-2"), {})
@@ -5,6 +5,7 @@ urlpatterns = [
     # Personajes
     path("characters/create/", CreateCharacterView.as_view(), name="create_character"),
     path("characters/mine/", MyCharactersView.as_view(), name="my_characters"),
+    path("characters/select/", SelectCharacterView.as_view(), name="select_character"),
     path("characters/create-form/", create_character_form, name="create_character_form"),
     path("characters/lose-life/", LoseLifeView.as_view(), name="lose_life"),
 
@@ -12,6 +13,10 @@ urlpatterns = [
     path("world/", world_page, name="world_page"),
     path("world/move/", world_move, name="world_move"),
     path("world/enemies/", world_enemies, name="world_enemies"),
+    path("world/path/", world_path, name="world_path"),
+    path("world/neighbors/", world_neighbors, name="world_neighbors"),
+    path("world/maps/<str:zone>/<str:digest>.json", world_map_asset, name="world_map_asset"),
+    path("world/backgrounds/<str:zone>/<str:digest>.png", world_background, name="world_background"),
 
     # Batalla
     path("battle/start/", StartBattleView.as_view(), name="start_battle"),
@@ -27,8 +27,8 @@ RARITY_CHANCES = [
 ]
 
 
-def choose_rarity():
-    r = random.random()
+def choose_rarity(rng=random):
+    r = rng.random()
     cumulative = 0
     for rarity, chance in RARITY_CHANCES:
         cumulative += chance
@@ -54,20 +54,21 @@ def calculate_enemy_stats(enemy_type: EnemyType, level: int, rarity: str):
     }
 
 
-def generate_enemy_pack(zone_level: int = 1):
+def generate_enemy_pack(zone_level: int = 1, rng=random):
     """
     Genera entre 1 y 4 EnemyInstance en BD y los devuelve en una lista.
+    `rng`: un random.Random sembrado (game.seeding) para repetir el pack.
     """
     enemy_types = list(EnemyType.objects.all())
     if not enemy_types:
         raise ValueError("No hay EnemyTypes registrados en la BD.")
 
-    pack_size = random.randint(1, 4)
+    pack_size = rng.randint(1, 4)
     enemies = []
 
     for _ in range(pack_size):
-        etype = random.choice(enemy_types)
-        rarity = choose_rarity()
+        etype = rng.choice(enemy_types)
+        rarity = choose_rarity(rng)
         stats = calculate_enemy_stats(etype, zone_level, rarity)
 
         enemy = EnemyInstance(
@@ -91,29 +92,16 @@ def generate_enemy_pack(zone_level: int = 1):
 
 def character_to_battler(character: Character) -> Battler:
     """
-    Crea un Battler del personaje sumando los stats de los ítems equipados.
+    Crea un Battler del personaje con los bonos de equipo ya sumados en
+    Character.gear_* (sin consultar los ítems).
     """
-    eq_items = character.equipment_items.filter(is_equipped=True)
-
-    total_hp = character.base_hp
-    total_atk = character.base_atk
-    total_def = character.base_def
-    total_speed = character.base_speed
-
-    for item in eq_items:
-        stats = item.total_stats()  # usa RARITY_STAT_MULTIPLIER internamente
-        total_hp += stats["hp"]
-        total_atk += stats["atk"]
-        total_def += stats["def"]
-        total_speed += stats["speed"]
-
     return Battler(
         name=character.name,
         role=character.char_class,
-        hp=total_hp,
-        atk=total_atk,
-        defense=total_def,
-        speed=total_speed,
+        hp=character.base_hp + character.gear_hp,
+        atk=character.base_atk + character.gear_atk,
+        defense=character.base_def + character.gear_def,
+        speed=character.base_speed + character.gear_speed,
         mana=character.max_mana,
         is_player=True,
     )
@@ -208,8 +196,8 @@ ITEM_GACHA_PROBS = [
 ]
 
 
-def choose_item_rarity():
-    r = random.random()
+def choose_item_rarity(rng=random):
+    r = rng.random()
     cumulative = 0.0
     for rarity, prob in ITEM_GACHA_PROBS:
         cumulative += prob
@@ -218,13 +206,13 @@ def choose_item_rarity():
     return ItemRarity.BASIC
 
 
-def random_slot():
+def random_slot(rng=random):
     """
     Devuelve un slot aleatorio de EquipmentSlot
     (podrías sesgarlo si quieres).
     """
     slots = [choice[0] for choice in EquipmentItem._meta.get_field("slot").choices]
-    return random.choice(slots)
+    return rng.choice(slots)
 
 
 def base_stats_for_slot(slot):
@@ -250,10 +238,11 @@ GACHA_COST_PER_PULL = 20  # coste en monedas por intento
 
 
 @transaction.atomic
-def perform_gacha_pulls(character: Character, pulls: int):
+def perform_gacha_pulls(character: Character, pulls: int, rng=random):
     """
     Realiza 'pulls' tiradas de gacha para 'character'.
     Verifica monedas, descuenta el coste y crea EquipmentItem.
+    `rng`: con seeded_rng(...) las mismas tiradas se repiten en cualquier proceso.
     Retorna (items_creados, total_cost).
     """
     if pulls <= 0:
@@ -264,13 +253,13 @@ def perform_gacha_pulls(character: Character, pulls: int):
         raise ValueError("No tienes suficientes monedas para hacer el gacha.")
 
     character.coins -= total_cost
-    character.save()
+    character.save(update_fields=["coins"])
 
     created_items = []
 
     for _ in range(pulls):
-        rarity = choose_item_rarity()
-        slot = random_slot()
+        rarity = choose_item_rarity(rng)
+        slot = random_slot(rng)
         base_stats = base_stats_for_slot(slot)
 
         item = EquipmentItem.objects.create(
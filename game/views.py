@@ -1,11 +1,18 @@
+import base64
 from datetime import timedelta
 import json
 import random
+import time
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Min, Q, Value, When
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.urls import reverse
 
 from rest_framework.views import APIView
@@ -18,6 +25,7 @@ from .models import (
     Character,
     EnemyInstance,
     EquipmentItem,
+    ItemRarity,
     PlayerState,
     EnemySpawn,
     EnemyType,
@@ -30,12 +38,21 @@ from .utils import (
     calculate_battle_rewards,
     COIN_VALUES,
     perform_gacha_pulls,
-    calculate_enemy_stats,
 )
 from .battle_engine import simulate_battle
 
 # ✅ mapas
-from .maps import MAPS
+from .maps import MAPS, enemy_spawn_candidates, is_walkable
+from .active_character import forget_cached_character, get_active_character, select_character
+from .positions import positions
+from . import backgrounds, images, tasks
+from .pubsub import broker, zone_topic
+from .respawns import notify_death, ticker_mode
+from .occupancy import occupancy
+from .zone_feed import zone_feed
+from .encounters import encounter_pool
+from .seeding import seeded_rng
+from . import pathfinding
 
 
 # ==========================
@@ -53,10 +70,6 @@ def get_map_size(map_data):
 def is_inside_map(x, y, rows, cols):
     return 0 <= x < cols and 0 <= y < rows
 
-def is_walkable(tile):
-    # Igual que tu frontend: wall y tree bloquean
-    return tile not in ("wall", "tree","house")
-
 def get_zone_transition(zone: str, x: int, y: int, rows: int, cols: int):
     """
     Si el jugador pisa un BORDE, se cambia de zona según exits del mapa.
@@ -97,8 +110,25 @@ def get_zone_transition(zone: str, x: int, y: int, rows: int, cols: int):
 # Helpers: vidas + personaje
 # ==========================
 
-def get_my_character(user):
-    return Character.objects.filter(owner=user).first()
+def get_my_character(request):
+    """
+    Personaje activo de la sesión (game/active_character.py), cargado una
+    vez por request y con PlayerState en el mismo JOIN. Es la misma
+    instancia que request.character (ActiveCharacterMiddleware): ambos usan
+    el memo del request, y sin middleware (APIRequestFactory) sigue andando.
+    """
+    return get_active_character(request)
+
+def get_or_create_state(character, defaults):
+    """
+    PlayerState ya cargado por select_related("state") o, si el personaje
+    nunca entró al mundo, se crea.
+    """
+    try:
+        return character.state
+    except PlayerState.DoesNotExist:
+        state, _ = PlayerState.objects.get_or_create(character=character, defaults=defaults)
+        return state
 
 def ensure_lives_and_get_timer(character):
     # regen + timer
@@ -109,22 +139,6 @@ def ensure_lives_and_get_timer(character):
 # Enemigos random por zona (1..4)
 # ==========================
 
-ENEMY_RARITY_ROLL = [
-    ("normal", 0.80),
-    ("strong", 0.15),
-    ("boss", 0.04),
-    ("legend", 0.01),
-]
-
-def roll_rarity(rng: random.Random) -> str:
-    r = rng.random()
-    acc = 0.0
-    for key, p in ENEMY_RARITY_ROLL:
-        acc += p
-        if r <= acc:
-            return key
-    return "normal"
-
 import re
 
 _ZONE_RE = re.compile(r"^\s*(-?\d+)\s*-\s*(-?\d+)\s*$")
@@ -154,100 +168,255 @@ def get_zone_level_from_zonekey(zone_key: str) -> int:
 def generate_enemy_pack_instances(zone_key: str, seed_key: str, count_min=1, count_max=4):
     """
     Crea 1..4 EnemyInstance en BD, con enemy types aleatorios y level según zona.
+    Misma (zona, seed_key) => mismo pack en cualquier proceso.
     """
-    enemy_types = list(EnemyType.objects.all())
-    if not enemy_types:
-        return []
-
     zone_lvl = get_zone_level_from_zonekey(zone_key)
     if zone_lvl <= 0:
         return []
 
-    rng = random.Random(hash(seed_key) & 0xffffffff)
-    pack_size = rng.randint(count_min, count_max)
-
-    enemies = []
-    for _ in range(pack_size):
-        et = rng.choice(enemy_types)
-        rarity = roll_rarity(rng)
-        stats = calculate_enemy_stats(et, level=zone_lvl, rarity=rarity)
-
-        enemies.append(
-            EnemyInstance.objects.create(
-                enemy_type=et,
-                level=zone_lvl,
-                rarity=rarity,
-                hp=stats["hp"],
-                atk=stats["atk"],
-                defense=stats["def"],
-                speed=stats["speed"],
-            )
-        )
-    return enemies
+    # tipos y stats salen del pool ya cargados: aquí solo queda el INSERT
+    rng = seeded_rng(zone_key, seed_key)
+    return encounter_pool.create_pack(zone_lvl, rng, count_min, count_max)
 
 
 # ==========================
 # Enemigos persistentes por zona (EnemySpawn)
 # ==========================
 
+# zonas cuyo seeding ya se verificó en este proceso (los spawns nunca se borran)
+_SEEDED_ZONES = set()
+
 def ensure_enemy_spawns_for_zone(zone: str):
     """
     Crea EnemySpawn en la BD para cada casilla 'enemy' del mapa de esa zona,
-    si aún no existe.
+    si aún no existe. Una vez verificada, la zona no vuelve a consultarse.
     """
+    if zone in _SEEDED_ZONES:
+        return
+
+    zone_map = get_current_map(zone)["map"]
+    wanted = [
+        (x, y)
+        for y, row in enumerate(zone_map)
+        for x, tile in enumerate(row)
+        if tile == "enemy"
+    ]
+    if not wanted:
+        _SEEDED_ZONES.add(zone)
+        return
+
     enemy_type = EnemyType.objects.first()
     if not enemy_type:
         return
 
-    zone_map = get_current_map(zone)["map"]
-    rows, cols = get_map_size(zone_map)
-
-    for y, row in enumerate(zone_map):
-        for x, tile in enumerate(row):
-            if tile == "enemy":
-                if not EnemySpawn.objects.filter(zone=zone, x=x, y=y).exists():
-                    EnemySpawn.objects.create(
-                        zone=zone,
-                        x=x,
-                        y=y,
-                        enemy_type=enemy_type,
-                        respawn_seconds=300,
-                        is_alive=True,
-                        next_respawn_at=None,
-                    )
+    existing = set(EnemySpawn.objects.filter(zone=zone).values_list("x", "y"))
+    missing = [c for c in wanted if c not in existing]
+    if missing:
+        EnemySpawn.objects.bulk_create([
+            EnemySpawn(
+                zone=zone,
+                x=x,
+                y=y,
+                enemy_type=enemy_type,
+                respawn_seconds=300,
+                is_alive=True,
+                next_respawn_at=None,
+            )
+            for x, y in missing
+        ])
+        bump_spawn_version(zone)
+    _SEEDED_ZONES.add(zone)
+
+# ==========================
+# Versión de spawns por zona (ETag de world_enemies)
+# ==========================
+def _spawn_version_key(zone: str) -> str:
+    return f"world:spawns:{zone}:v"
+
+def _spawn_due_key(zone: str) -> str:
+    return f"world:spawns:{zone}:due"
+
+def spawn_version(zone: str) -> int:
+    """
+    Generación de los spawns de la zona; cambia con cada muerte, respawn o
+    seeding. Arranca en la hora actual para que, si el cache se reinicia,
+    las versiones que guardan los clientes no vuelvan a coincidir.
+    """
+    key = _spawn_version_key(zone)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time()), None)
+        version = cache.get(key)
+    return version
+
+def bump_spawn_version(zone: str) -> int:
+    spawn_version(zone)
+    try:
+        return cache.incr(_spawn_version_key(zone))
+    except ValueError:
+        version = int(time.time())
+        cache.set(_spawn_version_key(zone), version, None)
+        return version
+
+def next_respawn_due(zone: str) -> float:
+    """
+    Timestamp del próximo respawn pendiente de la zona (inf si no hay).
+    Se cachea: solo se consulta EnemySpawn cuando una muerte o un respawn lo
+    invalidan, o cada WORLD_SPAWN_DUE_SECONDS como cota.
+    """
+    key = _spawn_due_key(zone)
+    due = cache.get(key)
+    if due is None:
+        at = EnemySpawn.objects.filter(zone=zone, is_alive=False).aggregate(
+            at=Min("next_respawn_at")
+        )["at"]
+        due = at.timestamp() if at else float("inf")
+        cache.set(key, due, getattr(settings, "WORLD_SPAWN_DUE_SECONDS", 60))
+    return due
+
+def publish_spawn(spawn, alive: bool, respawn_in=None):
+    """Avisa a los sockets de la zona que un spawn murió o revivió."""
+    bump_spawn_version(spawn.zone)
+    if not alive:
+        cache.delete(_spawn_due_key(spawn.zone))
+    broker().publish(zone_topic(spawn.zone), {
+        "type": "spawn",
+        "x": spawn.x,
+        "y": spawn.y,
+        "alive": alive,
+        "respawn_in": respawn_in,
+    })
+
+def respawn_due(zone: str) -> bool:
+    """¿Le toca a esta request revivir spawns de la zona? Nunca con ticker."""
+    return not ticker_mode() and time.time() >= next_respawn_due(zone)
 
 def refresh_respawns(zone: str):
-    now = timezone.now()
-    spawns = EnemySpawn.objects.filter(zone=zone)
-    for sp in spawns:
-        if not sp.is_alive and sp.next_respawn_at and sp.next_respawn_at <= now:
-            sp.is_alive = True
-            sp.next_respawn_at = None
-            sp.save(update_fields=["is_alive", "next_respawn_at"])
+    # con ticker (game/respawns.py) las requests no hacen trabajo de respawn
+    if ticker_mode():
+        return
+    # SELECT de los vencidos + un solo UPDATE condicional (no spawn por spawn)
+    due = list(EnemySpawn.objects.filter(
+        zone=zone,
+        is_alive=False,
+        next_respawn_at__lte=timezone.now(),
+    ))
+    if not due:
+        return
+    EnemySpawn.objects.filter(pk__in=[sp.pk for sp in due], is_alive=False).update(
+        is_alive=True, next_respawn_at=None
+    )
+    cache.delete(_spawn_due_key(zone))
+    for sp in due:
+        publish_spawn(sp, alive=True)
+
+def spawn_alive_q(now):
+    """Vivo, o muerto pero con el respawn ya vencido (aún sin refrescar)."""
+    return Q(is_alive=True) | Q(next_respawn_at__lte=now)
 
-def get_trigger_enemy_spawn(x, y, zone: str):
+def alive_spawns_at(zone: str, coords, now):
+    """
+    Spawns vivos en un conjunto de casillas 'enemy', en una sola query.
+    Un respawn vencido cuenta como vivo sin tener que refrescar la zona entera.
+    """
+    coords = set(coords)
+    if not coords:
+        return {}
+
+    ensure_enemy_spawns_for_zone(zone)
+
+    q = Q()
+    for cx, cy in coords:
+        q |= Q(x=cx, y=cy)
+
+    return {
+        (sp.x, sp.y): sp
+        for sp in EnemySpawn.objects.filter(q, spawn_alive_q(now), zone=zone)
+    }
+
+def pick_trigger_spawn(zone: str, x: int, y: int, alive: dict):
+    """Primer candidato vivo (según el índice espacial) para la casilla."""
+    for c in enemy_spawn_candidates(zone, x, y):
+        if c in alive:
+            return alive[c]
+    return None
+
+def get_trigger_enemy_spawn(x, y, zone: str, now=None):
     """
     Retorna EnemySpawn asociado a:
     - tile == enemy: spawn exacto
     - tile == enemy_zone: cualquier spawn vivo cerca (radio 1)
+    Los candidatos salen del índice espacial de la zona (maps.enemy_index),
+    así que basta una sola query acotada a esas casillas.
     """
-    ensure_enemy_spawns_for_zone(zone)
-    refresh_respawns(zone)
+    candidates = enemy_spawn_candidates(zone, x, y)
+    if not candidates:
+        return None
 
-    zone_map = get_current_map(zone)["map"]
-    tile = zone_map[y][x]
-    spawns = EnemySpawn.objects.filter(zone=zone)
+    alive = alive_spawns_at(zone, candidates, now or timezone.now())
+    return pick_trigger_spawn(zone, x, y, alive)
 
-    target = None
-    if tile == "enemy":
-        target = spawns.filter(x=x, y=y, is_alive=True).first()
-    elif tile == "enemy_zone":
-        for sp in spawns.filter(is_alive=True):
-            if abs(sp.x - x) <= 1 and abs(sp.y - y) <= 1:
-                target = sp
-                break
+def kill_spawn(spawn, now):
+    """
+    Marca el spawn como muerto con un UPDATE condicional.
+    Retorna False si otro jugador lo mató primero.
+    """
+    next_at = now + timedelta(seconds=spawn.respawn_seconds)
+    killed = (
+        EnemySpawn.objects
+        .filter(spawn_alive_q(now), pk=spawn.pk)
+        .update(is_alive=False, next_respawn_at=next_at)
+    )
+    if killed:
+        spawn.is_alive = False
+        spawn.next_respawn_at = next_at
+        publish_spawn(spawn, alive=False, respawn_in=spawn.respawn_seconds)
+        notify_death(spawn)
+    return bool(killed)
 
-    return target
+
+# ==========================
+# Otros jugadores en la zona
+# ==========================
+
+def parse_players_since(data):
+    """Cursor de versión que manda el cliente (None = quiere snapshot)."""
+    if data.get("players_full"):
+        return None
+    try:
+        return int(data.get("players_since"))
+    except (TypeError, ValueError):
+        return None
+
+def other_players_payload(state, since=None):
+    """
+    Otros jugadores para una respuesta, limitados al área de interés
+    (radio de visión, tope y por distancia) y sacados de la ocupación en
+    memoria, sin query. Con `since` solo van los cambios desde esa versión
+    más la lista de ids visibles; si el log no alcanza, snapshot completo.
+    """
+    version, visible = occupancy.visible_to(state)
+
+    if since is not None:
+        _, updated, left = zone_feed.changes_since(state.zone, since)
+        if updated is not None:
+            visible_ids = [p["id"] for p in visible]
+            in_view = set(visible_ids)
+            left |= {pid for pid in updated if pid not in in_view}
+            left.discard(state.character_id)
+            return {
+                "players_version": version,
+                "players_delta": {
+                    "updated": [p for pid, p in updated.items() if pid in in_view],
+                    "left": sorted(left),
+                    "visible": visible_ids,
+                },
+            }
+
+    return {
+        "players_version": version,
+        "other_players": visible,
+    }
 
 
 # ==========================
@@ -261,6 +430,7 @@ class CreateCharacterView(APIView):
         serializer = CharacterCreateSerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
             character = serializer.save()
+            select_character(request, character)
             return Response(CharacterSerializer(character).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -273,6 +443,21 @@ class MyCharactersView(APIView):
         return Response(CharacterSerializer(chars, many=True).data)
 
 
+class SelectCharacterView(APIView):
+    """Cambia el personaje activo de la sesión."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        char_id = request.data.get("character_id")
+        try:
+            character = Character.objects.select_related("state").get(id=char_id, owner=request.user)
+        except (Character.DoesNotExist, ValueError, TypeError):
+            return Response({"error": "Personaje no válido"}, status=status.HTTP_404_NOT_FOUND)
+
+        select_character(request, character)
+        return Response(CharacterSerializer(character).data)
+
+
 @login_required
 def create_character_form(request):
     errors = {}
@@ -285,7 +470,7 @@ def create_character_form(request):
         serializer = CharacterCreateSerializer(data=data, context={"request": request})
 
         if serializer.is_valid():
-            serializer.save()
+            select_character(request, serializer.save())
             return redirect("start_menu")
         else:
             errors = serializer.errors
@@ -306,12 +491,12 @@ class StartBattleView(APIView):
         if not char_id or not enemy_ids:
             return Response({"error": "Debes enviar character_id y enemy_ids"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            character = Character.objects.get(id=char_id, owner=request.user)
-        except Character.DoesNotExist:
+        # 1) personaje (bonos de equipo incluidos en gear_*), 2) enemigos con su tipo
+        character = Character.objects.filter(id=char_id, owner=request.user).first()
+        if character is None:
             return Response({"error": "Personaje no válido"}, status=status.HTTP_404_NOT_FOUND)
 
-        enemies = list(EnemyInstance.objects.filter(id__in=enemy_ids))
+        enemies = list(EnemyInstance.objects.filter(id__in=enemy_ids).select_related("enemy_type"))
         if not enemies:
             return Response({"error": "No se encontraron enemigos válidos"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -324,21 +509,22 @@ class StartBattleView(APIView):
         rewards = {"xp": 0, "orbs_bronze": 0, "orbs_silver": 0, "orbs_gold": 0}
         levels_up = 0
 
-        if result["result"] == "win":
-            rewards = calculate_battle_rewards(enemies)
-            levels_up = character.gain_xp(rewards["xp"])
-            character.orbs_bronze += rewards["orbs_bronze"]
-            character.orbs_silver += rewards["orbs_silver"]
-            character.orbs_gold += rewards["orbs_gold"]
-            character.save()
-
-        def get_image_url(image_field):
-            if not image_field:
-                return None
-            try:
-                return image_field.url
-            except ValueError:
-                return None
+        # las escrituras van juntas: recompensa (un UPDATE con F()) + limpieza encolada
+        with transaction.atomic():
+            if result["result"] == "win":
+                rewards = calculate_battle_rewards(enemies)
+                levels_up = character.grant_rewards(**rewards)
+
+            # el pack ya se peleó: se borra más tarde, fuera de la request
+            tasks.enqueue(
+                "discard_enemy_instances",
+                {"ids": [e.id for e in enemies]},
+                delay=getattr(settings, "WORLD_ENEMY_INSTANCE_TTL", 600),
+            )
+
+        # variantes WebP de tamaño fijo + un atlas con todos los enemigos
+        get_image_url = images.variant_url
+        atlas = images.enemy_atlas()
 
         player_data = {
             "id": character.id,
@@ -366,6 +552,7 @@ class StartBattleView(APIView):
                 "defense": e.defense,
                 "speed": e.speed,
                 "image": get_image_url(e.enemy_type.image),
+                "atlas_frame": str(e.enemy_type_id) if str(e.enemy_type_id) in atlas["frames"] else None,
                 "rarity": e.rarity,
                 "level": e.level,
             })
@@ -375,6 +562,7 @@ class StartBattleView(APIView):
             "log": result["log"],
             "player": player_data,
             "enemies": enemies_data,
+            "enemy_atlas": atlas,
             "rewards": rewards,
             "levels_up": levels_up,
         })
@@ -455,7 +643,7 @@ class ShopView(APIView):
         character.orbs_silver -= sell_silver
         character.orbs_gold -= sell_gold
         character.coins += coins_gained
-        character.save()
+        character.save(update_fields=["orbs_bronze", "orbs_silver", "orbs_gold", "coins"])
 
         return Response({
             "character_id": character.id,
@@ -472,21 +660,128 @@ class ShopView(APIView):
 # Inventario
 # ==========================
 
+INVENTORY_PAGE_SIZE = getattr(settings, "INVENTORY_PAGE_SIZE", 50)
+INVENTORY_MAX_PAGE_SIZE = 200
+
+# orden -> claves (todas descendentes; el id desempata y cierra el cursor)
+INVENTORY_SORTS = {
+    "new": ("created_at",),
+    "rarity": ("rarity_rank", "level"),
+    "level": ("level",),
+    "power": ("power",),
+}
+
+RARITY_RANK = {rarity: rank for rank, rarity in enumerate(ItemRarity.values, start=1)}
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys):
+    """Valores (claves..., id) de la última fila vista; ValueError si no sirve."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("cursor inválido") from e
+    if not isinstance(values, list) or len(values) != len(keys) + 1:
+        raise ValueError("cursor inválido")
+    # created_at va como ISO; el resto de las claves y el id son enteros
+    dated = keys[0] == "created_at"
+    if dated:
+        values[0] = parse_datetime(values[0]) if isinstance(values[0], str) else None
+        if values[0] is None:
+            raise ValueError("cursor inválido")
+    if not all(type(v) is int for v in values[1 if dated else 0:]):
+        raise ValueError("cursor inválido")
+    return values
+
+
+def keyset_page(qs, keys, cursor, limit):
+    """
+    Una página de `qs` ordenada por `keys` desc + id desc, empezando después
+    de `cursor`. El WHERE sobre las claves usa el índice en vez de OFFSET.
+    Retorna (filas, cursor siguiente o None).
+    """
+    fields = (*keys, "id")
+    if cursor:
+        values = decode_cursor(cursor, keys)
+        after = Q()
+        for i, field in enumerate(fields):
+            step = Q(**{f"{field}__lt": values[i]})
+            for prev, value in zip(fields[:i], values[:i]):
+                step &= Q(**{prev: value})
+            after |= step
+        qs = qs.filter(after)
+
+    rows = list(qs.order_by(*(f"-{f}" for f in fields))[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], f) for f in fields])
+
+
 class InventoryView(APIView):
+    """
+    Inventario, paginado por cursor (keyset) si se pide.
+    GET ?character_id=&slot=&rarity=&equipped=true|false&sort=new|rarity|level|power
+    -> [...] (todo, como antes)
+    ... &limit=&cursor= -> {"results": [...], "next_cursor": str | null}
+    El orden por defecto (new: -created_at, -id) es el que cubre el índice.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        char_id = request.query_params.get("character_id")
+        params = request.query_params
+        char_id = params.get("character_id")
         if not char_id:
             return Response({"error": "Debes enviar character_id"}, status=400)
 
+        sort = params.get("sort", "new")
+        if sort not in INVENTORY_SORTS:
+            return Response({"error": f"sort debe ser uno de {', '.join(INVENTORY_SORTS)}"}, status=400)
+        try:
+            limit = max(1, min(int(params.get("limit", INVENTORY_PAGE_SIZE)), INVENTORY_MAX_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "limit debe ser un entero"}, status=400)
+
         try:
             character = Character.objects.get(id=char_id, owner=request.user)
         except Character.DoesNotExist:
             return Response({"error": "Personaje no válido"}, status=404)
 
-        items = character.equipment_items.all().order_by("-created_at")
-        return Response(EquipmentItemSerializer(items, many=True).data)
+        items = EquipmentItem.objects.filter(owner=character).with_stats()
+        if params.get("slot"):
+            items = items.filter(slot=params["slot"])
+        if params.get("rarity"):
+            items = items.filter(rarity=params["rarity"])
+        if params.get("equipped") in ("true", "false"):
+            items = items.filter(is_equipped=params["equipped"] == "true")
+
+        if sort == "rarity":
+            items = items.annotate(rarity_rank=Case(
+                *[When(rarity=r, then=Value(rank)) for r, rank in RARITY_RANK.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+        elif sort == "power":
+            items = items.annotate(power=F("bonus_hp") + F("bonus_atk") + F("bonus_def") + F("bonus_speed"))
+
+        if "cursor" not in params and "limit" not in params:
+            # clientes viejos: la lista completa, sin envoltorio
+            items = items.order_by(*(f"-{f}" for f in (*INVENTORY_SORTS[sort], "id")))
+            return Response(EquipmentItemSerializer(items, many=True).data)
+
+        try:
+            page, next_cursor = keyset_page(items, INVENTORY_SORTS[sort], params.get("cursor"), limit)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response({
+            "results": EquipmentItemSerializer(page, many=True).data,
+            "next_cursor": next_cursor,
+        })
 
 
 # ==========================
@@ -555,15 +850,10 @@ class EquipItemView(APIView):
 
         equip_bool = bool(equip_flag)
 
-        if equip_bool:
-            EquipmentItem.objects.filter(owner=character, slot=item.slot, is_equipped=True).update(is_equipped=False)
-            item.is_equipped = True
-            item.save()
-        else:
-            item.is_equipped = False
-            item.save()
+        # ítems y bonos del personaje (gear_*) juntos; retorna el loadout nuevo
+        equipped_items = item.set_equipped(equip_bool)
+        forget_cached_character(character.id)
 
-        equipped_items = character.equipment_items.filter(is_equipped=True)
         return Response({
             "character_id": character.id,
             "equipped_items": EquipmentItemSerializer(equipped_items, many=True).data,
@@ -588,12 +878,9 @@ class LoseLifeView(APIView):
         except Character.DoesNotExist:
             return Response({"error": "Personaje no válido"}, status=404)
 
-        # regen antes de descontar (para que sea justo)
-        character.regen_lives()
-
-        if character.lives > 0:
-            character.lives -= 1
-            character.save(update_fields=["lives"])
+        # regen + descuento en un UPDATE condicional (sin carreras entre requests).
+        # False solo si ya no quedaban vidas: igual se manda a la zona segura
+        life_consumed = character.consume_life()
 
         sent_to_safe = False
 
@@ -603,16 +890,19 @@ class LoseLifeView(APIView):
                 character=character,
                 defaults={"x": 9, "y": 9, "zone": "0-0"},
             )
+            old_zone = positions.load(state).zone
             state.zone = "0-0"
             state.x = 9
             state.y = 9
-            state.save(update_fields=["zone", "x", "y"])
+            positions.persist(state)
+            occupancy.transfer(character, old_zone, state)
             sent_to_safe = True
 
         info = character.regen_lives()
         return Response({
             "character_id": character.id,
             "lives": character.lives,
+            "life_consumed": life_consumed,
             "sent_to_safe_zone": sent_to_safe,
             "seconds_to_next_life": info["seconds_to_next"],
         })
@@ -629,7 +919,7 @@ def battle_simulator(request):
 
 @login_required
 def shop_page(request):
-    character = get_my_character(request.user)
+    character = get_my_character(request)
     if not character:
         return render(request, "no_character.html")
     return render(request, "shop_menu.html", {"character": character})
@@ -637,7 +927,7 @@ def shop_page(request):
 
 @login_required
 def shop_sell_page(request):
-    character = get_my_character(request.user)
+    character = get_my_character(request)
     if not character:
         return render(request, "no_character.html")
     return render(request, "shop.html", {"character": character})
@@ -645,7 +935,7 @@ def shop_sell_page(request):
 
 @login_required
 def gacha_page(request):
-    character = get_my_character(request.user)
+    character = get_my_character(request)
     if not character:
         return render(request, "no_character.html")
     return render(request, "gacha.html", {"character": character})
@@ -653,7 +943,7 @@ def gacha_page(request):
 
 @login_required
 def inventory_page(request):
-    character = get_my_character(request.user)
+    character = get_my_character(request)
     if not character:
         return render(request, "no_character.html")
     return render(request, "inventory.html", {"character": character})
@@ -665,7 +955,7 @@ def inventory_page(request):
 
 @login_required
 def world_page(request):
-    character = get_my_character(request.user)
+    character = get_my_character(request)
     if not character:
         return render(request, "no_character.html")
 
@@ -674,57 +964,250 @@ def world_page(request):
     if character.lives <= 0:
         return redirect("start_menu")
 
-    state, _ = PlayerState.objects.get_or_create(
-        character=character,
-        defaults={"x": 3, "y": 15, "zone": "center"},
-    )
-
-    current = get_current_map(state.zone)
-    world_map = current["map"]
+    state = positions.load(get_or_create_state(character, defaults={"x": 3, "y": 15, "zone": "center"}))
 
     ensure_enemy_spawns_for_zone(state.zone)
 
-    others_qs = (
-        PlayerState.objects
-        .filter(zone=state.zone)
-        .exclude(pk=state.pk)
-        .select_related("character")
-    )
-    other_players = []
-    for ps in others_qs:
-        c = ps.character
-        if not c:
-            continue
-        img_url = c.image.url if c.image else settings.STATIC_URL + "img/player_placeholder.png"
-        other_players.append({
-            "id": c.id,
-            "name": c.name,
-            "class": c.get_char_class_display(),
-            "x": ps.x,
-            "y": ps.y,
-            "imgUrl": img_url,
-        })
+    occupancy.enter(character, state)
+    players = other_players_payload(state)
 
     return render(request, "world.html", {
         "character": character,
         "player_state": state,
         "current_zone": state.zone,
-        "world_map_json": json.dumps(world_map),
-        "other_players_json": json.dumps(other_players),
+        "world_map_url": map_asset_url(state.zone),
+        "world_background_url": background_url(state.zone),
+        "tile_atlas": images.tile_atlas(),
+        "other_players_json": json.dumps(players["other_players"]),
+        "players_version": players["players_version"],
+        "enemies_wait": enemies_max_wait(),
+        "enemies_poll_seconds": getattr(settings, "WORLD_ENEMIES_CLIENT_POLL_SECONDS", 5),
         "tiles_base_url": settings.STATIC_URL + "tiles/",
         "media_tiles_base_url": settings.MEDIA_URL + "tiles/",
         "static_tiles_base_url": settings.STATIC_URL + "tiles/",
     })
 
 
+# ==========================
+# Mundo - mapas como assets inmutables
+# ==========================
+
+MAP_ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def map_asset_url(zone: str) -> str:
+    current = get_current_map(zone)
+    return reverse("world_map_asset", args=[current["name"], current["asset_hash"]])
+
+def world_map_asset(request, zone, digest):
+    """
+    Grid de una zona en /world/maps/<zona>/<hash>.json. El contenido de una
+    URL nunca cambia, así que navegador y proxies lo guardan para siempre.
+    Un hash viejo (mapa cambiado en un deploy) redirige al actual.
+    """
+    current = MAPS.get(zone)
+    if not current:
+        raise Http404("Zona inexistente")
+    if digest != current["asset_hash"]:
+        return redirect(map_asset_url(zone))
+
+    response = HttpResponse(current["asset"], content_type="application/json")
+    response["Cache-Control"] = MAP_ASSET_CACHE_CONTROL
+    response["ETag"] = f'"{current["asset_hash"]}"'
+    return response
+
+def background_url(zone: str) -> str:
+    current = get_current_map(zone)
+    return reverse("world_background", args=[current["name"], backgrounds.background_digest(zone)])
+
+def world_background(request, zone, digest):
+    """
+    Fondo pre-renderizado de la zona (casillas estáticas) en
+    /world/backgrounds/<zona>/<hash>.png; se genera la primera vez que se
+    pide y queda en disco. Misma política de caché que los mapas.
+    """
+    if zone not in MAPS:
+        raise Http404("Zona inexistente")
+    if digest != backgrounds.background_digest(zone):
+        return redirect(background_url(zone))
+
+    response = FileResponse(open(backgrounds.ensure_background(zone), "rb"), content_type="image/png")
+    response["Cache-Control"] = MAP_ASSET_CACHE_CONTROL
+    return response
+
+
+# ==========================
+# Mundo - zonas vecinas (prefetch)
+# ==========================
+
+WORLD_PREFETCH_EDGE_TILES = getattr(settings, "WORLD_PREFETCH_EDGE_TILES", 2)
+
+def approaching_exits(zone: str, x: int, y: int) -> dict:
+    """{dirección: zona} de los bordes a WORLD_PREFETCH_EDGE_TILES o menos."""
+    current = get_current_map(zone)
+    rows, cols = get_map_size(current["map"])
+    near = WORLD_PREFETCH_EDGE_TILES
+    close = {
+        "north": y <= near,
+        "south": y >= rows - 1 - near,
+        "west": x <= near,
+        "east": x >= cols - 1 - near,
+    }
+    return {d: z for d, z in current["exits"].items() if close[d]}
+
+# zonas cuyo seeding ya se encoló desde este proceso
+_QUEUED_SEEDS = set()
+
+def warm_zone(zone: str, defer: bool = False):
+    """
+    Deja listas las cachés de una zona antes de que alguien entre: spawns
+    sembrados, grilla de pathfinding y próximo respawn. Todo es idempotente
+    y barato después de la primera vez.
+    Con defer=True el seeding (lo único que escribe) se encola para el
+    worker; sin worker no se hace nada: se siembra al entrar como siempre.
+    """
+    if not defer:
+        ensure_enemy_spawns_for_zone(zone)
+    elif tasks.worker_enabled() and zone not in _SEEDED_ZONES and zone not in _QUEUED_SEEDS:
+        tasks.enqueue("seed_zone_spawns", {"zone": zone})
+        _QUEUED_SEEDS.add(zone)
+    pathfinding.walk_grid(zone)
+    if not ticker_mode():
+        next_respawn_due(zone)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def world_neighbors(request):
+    """
+    Las zonas vecinas (exits) de la zona actual, para que el cliente las
+    baje en segundo plano: URL del grid, enemigos vivos y cuántos jugadores
+    hay. Cruzar un portal pasa a ser un cambio local.
+    """
+    character = get_my_character(request)
+    if not character:
+        return Response({"error": "No tienes personaje"}, status=400)
+
+    try:
+        state = positions.load(character.state)
+    except PlayerState.DoesNotExist:
+        return Response({"error": "No existe PlayerState"}, status=400)
+
+    exits = get_current_map(state.zone)["exits"]
+    for zone in set(exits.values()):
+        warm_zone(zone)
+        if respawn_due(zone):
+            refresh_respawns(zone)
+
+    alive = {zone: [] for zone in exits.values()}
+    for zone, x, y in EnemySpawn.objects.filter(
+        zone__in=list(alive), is_alive=True
+    ).values_list("zone", "x", "y"):
+        alive[zone].append({"x": x, "y": y})
+
+    return Response({
+        "zone": state.zone,
+        "neighbors": [
+            {
+                "direction": direction,
+                "zone": zone,
+                "level": get_current_map(zone)["level"],
+                "map_url": map_asset_url(zone),
+                "background_url": background_url(zone),
+                "alive_enemies": alive[zone],
+                "spawns_version": spawn_version(zone),
+                "players": occupancy.count(zone),
+            }
+            for direction, zone in exits.items()
+        ],
+    })
+
+
 # ==========================
 # Mundo compartido (MOVE)
 # ==========================
 
+WORLD_MOVE_MAX_STEPS = getattr(settings, "WORLD_MOVE_MAX_STEPS", 16)
+
+def character_hud(character):
+    return {
+        "id": character.id,
+        "level": character.level,
+        "lives": character.lives,
+        "coins": character.coins,
+        "xp": character.xp,
+        "xp_to_next": character.xp_to_next_level(),
+    }
+
+# pasos aceptados en un movimiento por lotes (WASD o nombres)
+STEP_DELTAS = {
+    "w": (0, -1), "up": (0, -1),
+    "s": (0, 1), "down": (0, 1),
+    "a": (-1, 0), "left": (-1, 0),
+    "d": (1, 0), "right": (1, 0),
+}
+
+def plan_steps(world_map, x, y, steps):
+    """
+    Valida un camino completo desde (x, y) en una pasada.
+    Retorna (casillas recorridas, error); si un paso es inválido el camino
+    se corta justo antes.
+    """
+    rows, cols = get_map_size(world_map)
+    path = []
+    for step in steps:
+        delta = STEP_DELTAS.get(str(step).lower())
+        if not delta:
+            return path, "Paso inválido"
+        x, y = x + delta[0], y + delta[1]
+        if not is_inside_map(x, y, rows, cols):
+            return path, "Fuera del mapa"
+        if not is_walkable(world_map[y][x]):
+            return path, "Tile bloqueado"
+        path.append((x, y))
+    return path, None
+
+def first_trigger_on_path(zone: str, world_map, path, now):
+    """
+    Recorre el camino y se detiene en el primer trigger: borde de zona,
+    tienda o enemigo vivo. Todos los spawns del camino salen de una query.
+    Retorna (índice de la casilla donde se detiene, spawn | None).
+    """
+    rows, cols = get_map_size(world_map)
+
+    coords = set()
+    for x, y in path:
+        coords.update(enemy_spawn_candidates(zone, x, y))
+    alive = alive_spawns_at(zone, coords, now)
+
+    for i, (x, y) in enumerate(path):
+        if get_zone_transition(zone, x, y, rows, cols)[0]:
+            return i, None
+        if world_map[y][x] == "shop":
+            return i, None
+        spawn = pick_trigger_spawn(zone, x, y, alive)
+        if spawn:
+            return i, spawn
+    return len(path) - 1, None
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def world_move(request):
-    character = get_my_character(request.user)
+    """
+    Acepta un paso absoluto {x, y}, un lote {steps: ["w", "d", ...]} o un
+    destino {target: {x, y}} (click-to-move, camino A* del servidor).
+    El camino se valida completo desde la posición autoritativa y se detiene
+    en el primer trigger (borde, tienda o enemigo): una sola respuesta.
+
+    Pipeline de un paso (caso común = 1 query):
+      1. personaje + PlayerState en un JOIN
+      (las vidas se regeneran en memoria, sin escribir)
+    Los otros jugadores salen de la ocupación en memoria (occupancy) y, con
+    players_since, del log de la zona: ninguno de los dos consulta la BD.
+    La posición se valida contra la autoritativa (positions) y se escribe
+    write-behind; cambio de zona e inicio de batalla la persisten al tiro.
+    Los triggers (enemigos) y la creación de PlayerState son el camino largo.
+    """
+    character = get_my_character(request)
     if not character:
         return Response({"error": "No tienes personaje"}, status=400)
 
@@ -737,58 +1220,85 @@ def world_move(request):
             "redirect_url": reverse("start_menu"),
         }, status=403)
 
-    state, _ = PlayerState.objects.get_or_create(
-        character=character,
-        defaults={"x": 3, "y": 15, "zone": "center"},
-    )
-
-    x = request.data.get("x")
-    y = request.data.get("y")
-
-    try:
-        x = int(x)
-        y = int(y)
-    except (TypeError, ValueError):
-        return Response({"error": "Coordenadas inválidas"}, status=400)
+    state = positions.load(get_or_create_state(character, defaults={"x": 3, "y": 15, "zone": "center"}))
 
     current = get_current_map(state.zone)
     world_map = current["map"]
     rows, cols = get_map_size(world_map)
 
-    if not is_inside_map(x, y, rows, cols):
-        return Response({"error": "Fuera del mapa"}, status=400)
+    steps = request.data.get("steps")
+    target = request.data.get("target")
+    step_error = None
 
-    tile = world_map[y][x]
-    if not is_walkable(tile):
-        return Response({"error": "Tile bloqueado"}, status=400)
+    if target is not None:
+        try:
+            goal = (int(target["x"]), int(target["y"]))
+        except (TypeError, ValueError, KeyError):
+            return Response({"error": "target inválido"}, status=400)
+
+        path = pathfinding.find_path(state.zone, (state.x, state.y), goal)
+        if not path:
+            return Response({"error": "No hay camino hasta ese destino"}, status=400)
+    elif steps is not None:
+        if not isinstance(steps, list) or not steps:
+            return Response({"error": "steps debe ser una lista"}, status=400)
+        if len(steps) > WORLD_MOVE_MAX_STEPS:
+            return Response({"error": f"Máximo {WORLD_MOVE_MAX_STEPS} pasos por envío"}, status=400)
+
+        path, step_error = plan_steps(world_map, state.x, state.y, steps)
+        if not path:
+            return Response({"error": step_error}, status=400)
+    else:
+        x = request.data.get("x")
+        y = request.data.get("y")
+
+        try:
+            x = int(x)
+            y = int(y)
+        except (TypeError, ValueError):
+            return Response({"error": "Coordenadas inválidas"}, status=400)
+
+        if not is_inside_map(x, y, rows, cols):
+            return Response({"error": "Fuera del mapa"}, status=400)
 
-    state.x = x
-    state.y = y
-    state.save(update_fields=["x", "y"])
+        if not is_walkable(world_map[y][x]):
+            return Response({"error": "Tile bloqueado"}, status=400)
 
-    # transición por borde
+        path = [(x, y)]
+
+    now = timezone.now()
+    stop, spawn = first_trigger_on_path(state.zone, world_map, path, now)
+    path = path[:stop + 1]
+
+    x, y = path[-1]
+    tile = world_map[y][x]
+
+    # transición por borde: se persiste al tiro con la zona nueva
     new_zone, new_x, new_y = get_zone_transition(state.zone, x, y, rows, cols)
     if new_zone:
-        state.zone = new_zone
-        state.x = new_x
-        state.y = new_y
-        state.save(update_fields=["zone", "x", "y"])
+        old_zone = state.zone
+        state.zone, state.x, state.y = new_zone, new_x, new_y
+        positions.persist(state)
+        occupancy.transfer(character, old_zone, state)
 
         return Response({
             "map_changed": True,
             "new_zone": state.zone,
+            "map_url": map_asset_url(state.zone),
+            "background_url": background_url(state.zone),
             "position": {"x": state.x, "y": state.y},
-            "character": {
-                "id": character.id,
-                "level": character.level,
-                "lives": character.lives,
-                "coins": character.coins,
-                "xp": character.xp,
-                "xp_to_next": character.xp_to_next_level(),
-            },
+            "steps_applied": len(path),
+            "character": character_hud(character),
         })
 
-    ensure_enemy_spawns_for_zone(state.zone)
+    if (state.x, state.y) != (x, y):
+        state.x, state.y = x, y
+        positions.record(state)
+        occupancy.move(character, state)
+
+        # cerca de un borde: la zona del otro lado queda lista antes de cruzar
+        for zone in approaching_exits(state.zone, x, y).values():
+            warm_zone(zone, defer=True)
 
     start_battle = False
     enter_shop = False
@@ -797,64 +1307,78 @@ def world_move(request):
     if tile == "shop":
         enter_shop = True
 
-    spawn = None
-    if tile in ("enemy", "enemy_zone"):
-        spawn = get_trigger_enemy_spawn(x, y, zone=state.zone)
-
-    if spawn:
-        now = timezone.now()
-        spawn.is_alive = False
-        spawn.next_respawn_at = now + timedelta(seconds=spawn.respawn_seconds)
-        spawn.save(update_fields=["is_alive", "next_respawn_at"])
-
+    if spawn and kill_spawn(spawn, now):
+        # pack sembrado con la casilla y la hora del encuentro (reproducible)
         enemies = generate_enemy_pack_instances(
             zone_key=state.zone,
-            seed_key=f"{state.zone}:{x}:{y}:{now.timestamp()}",
-            count_min=1,
-            count_max=4,
+            seed_key=f"{x}:{y}:{now.timestamp()}",
         )
 
         if enemies:
             enemy_ids = [e.id for e in enemies]
             start_battle = True
-
-    others_qs = (
-        PlayerState.objects
-        .filter(zone=state.zone)
-        .exclude(pk=state.pk)
-        .select_related("character")
-    )
-
-    other_players = []
-    for ps in others_qs:
-        c = ps.character
-        if not c:
-            continue
-        img_url = c.image.url if c.image else settings.STATIC_URL + "img/player_placeholder.png"
-        other_players.append({
-            "id": c.id,
-            "name": c.name,
-            "class": c.get_char_class_display(),
-            "x": ps.x,
-            "y": ps.y,
-            "imgUrl": img_url,
-        })
+            positions.persist(state)
 
     return Response({
         "position": {"x": state.x, "y": state.y},
-        "character": {
-            "id": character.id,
-            "level": character.level,
-            "lives": character.lives,
-            "coins": character.coins,
-            "xp": character.xp,
-            "xp_to_next": character.xp_to_next_level(),
-        },
+        "steps_applied": len(path),
+        "step_error": step_error,
+        "character": character_hud(character),
         "start_battle": start_battle,
         "enter_shop": enter_shop,
         "character_id": character.id,
         "enemy_ids": enemy_ids,
-        "other_players": other_players,
+        **other_players_payload(state, parse_players_since(request.data)),
+    })
+
+
+# ==========================
+# Mundo - pathfinding
+# ==========================
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def world_path(request):
+    """
+    Camino desde la posición actual hasta:
+    - ?x=&y=    una casilla de la zona actual
+    - ?tile=    la casilla más cercana de ese tipo (p. ej. shop)
+    - ?zone=    otra zona: ruta de zonas + camino hasta el portal del primer salto
+    Las letras de "steps" se pueden mandar tal cual a world_move.
+    """
+    character = get_my_character(request)
+    if not character:
+        return Response({"error": "No tienes personaje"}, status=400)
+
+    try:
+        state = positions.load(character.state)
+    except PlayerState.DoesNotExist:
+        return Response({"error": "No existe PlayerState"}, status=400)
+
+    start = (state.x, state.y)
+    params = request.query_params
+    zones = [state.zone]
+
+    if params.get("zone"):
+        zones, path = pathfinding.path_to_zone(state.zone, start, params["zone"])
+    elif params.get("tile"):
+        path = pathfinding.nearest_tile(state.zone, start, params["tile"])
+    else:
+        try:
+            goal = (int(params.get("x")), int(params.get("y")))
+        except (TypeError, ValueError):
+            return Response({"error": "Debes enviar x/y, tile o zone"}, status=400)
+        path = pathfinding.find_path(state.zone, start, goal)
+
+    if path is None:
+        return Response({"error": "No hay camino"}, status=404)
+
+    return Response({
+        "zone": state.zone,
+        "from": {"x": state.x, "y": state.y},
+        "zones": zones,
+        "path": [{"x": x, "y": y} for x, y in path],
+        "steps": pathfinding.path_to_steps(start, path),
     })
 
 
@@ -862,21 +1386,64 @@ def world_move(request):
 # Mundo - enemigos vivos (por zona)
 # ==========================
 
+WORLD_ENEMIES_POLL_SECONDS = getattr(settings, "WORLD_ENEMIES_POLL_SECONDS", 0.5)
+
+def enemies_max_wait() -> float:
+    # 0 (por defecto) = sin long-poll: con gunicorn sync cada espera retiene
+    # un worker, y la versión en LocMemCache no ve cambios de otro proceso.
+    # Solo subirlo con servidor ASGI y cache compartido.
+    return float(getattr(settings, "WORLD_ENEMIES_MAX_WAIT", 0))
+
+def spawns_etag(zone: str) -> str:
+    return f'"{zone}:{spawn_version(zone)}"'
+
+def parse_wait(value) -> float:
+    """Segundos que el cliente acepta esperar un cambio (long-poll)."""
+    try:
+        return max(0.0, min(float(value), enemies_max_wait()))
+    except (TypeError, ValueError):
+        return 0.0
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def world_enemies(request):
-    character = get_my_character(request.user)
+    """
+    Enemigos vivos de la zona, con ETag "<zona>:<versión de spawns>".
+    Si el cliente manda If-None-Match con la versión actual se responde 304
+    mirando solo el cache (sin tocar EnemySpawn); el cliente hace polling
+    corto con If-None-Match. Con ?wait=N la respuesta se retiene hasta N
+    segundos esperando un cambio, pero solo si WORLD_ENEMIES_MAX_WAIT > 0.
+    """
+    character = get_my_character(request)
     if not character:
         return Response({"error": "No tienes personaje"}, status=400)
 
-    state = PlayerState.objects.filter(character=character).first()
-    if not state:
+    try:
+        state = positions.load(character.state)
+    except PlayerState.DoesNotExist:
         return Response({"error": "No existe PlayerState"}, status=400)
+    occupancy.touch(character, state)
 
-    ensure_enemy_spawns_for_zone(state.zone)
-    refresh_respawns(state.zone)
-
-    spawns = EnemySpawn.objects.filter(zone=state.zone, is_alive=True)
-    alive_list = [{"x": s.x, "y": s.y} for s in spawns]
+    zone = state.zone
+    ensure_enemy_spawns_for_zone(zone)
 
-    return Response({"alive_enemies": alive_list})
+    seen = {tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")}
+    deadline = time.monotonic() + parse_wait(request.query_params.get("wait"))
+    while True:
+        # los respawns vencen por tiempo: solo se aplican cuando toca
+        if respawn_due(zone):
+            refresh_respawns(zone)
+
+        etag = spawns_etag(zone)
+        if etag not in seen:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        time.sleep(min(WORLD_ENEMIES_POLL_SECONDS, remaining))
+
+    alive_list = [
+        {"x": x, "y": y}
+        for x, y in EnemySpawn.objects.filter(zone=zone, is_alive=True).values_list("x", "y")
+    ]
+    return Response({"alive_enemies": alive_list}, headers={"ETag": etag})
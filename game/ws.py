@@ -0,0 +1,258 @@
+# game/ws.py
+"""
+Canal WebSocket del mundo (/ws/world/), ASGI puro sin dependencias extra.
+
+Al conectar manda un snapshot de los enemigos vivos de la zona del jugador
+y después empuja, desde el broker de game.pubsub:
+- muertes y respawns de EnemySpawn de la zona,
+- movimientos/entradas/salidas de jugadores dentro del radio de visión.
+El cliente puede mandar {"type": "resync"} tras cambiar de zona y un
+{"type": "ping"} periódico; cualquier mensaje renueva al jugador en la
+ocupación de la zona. Una pestaña abierta sin actividad no le cuesta nada
+al servidor.
+
+El handshake solo se acepta desde el mismo host (validado contra
+ALLOWED_HOSTS) o un origen de CSRF_TRUSTED_ORIGINS: la cookie de sesión
+viaja sola, así que otro sitio no debe poder abrir el socket.
+"""
+import asyncio
+import copy
+from http.cookies import SimpleCookie
+import json
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.http.request import split_domain_port, validate_host
+from django.utils.http import is_same_domain
+from django.utils.module_loading import import_string
+
+from .pubsub import broker, zone_topic
+from .respawns import ticker_mode
+
+WORLD_SOCKET_PATH = "/ws/world/"
+
+
+def _header(scope, wanted):
+    for name, value in scope.get("headers", []):
+        if name == wanted:
+            return value.decode("latin-1")
+    return None
+
+
+def _session_key(scope):
+    header = _header(scope, b"cookie")
+    if header is None:
+        return None
+    morsel = SimpleCookie(header).get(settings.SESSION_COOKIE_NAME)
+    return morsel.value if morsel else None
+
+
+def origin_allowed(scope):
+    """¿El Origin del handshake es este mismo sitio o uno de confianza?"""
+    origin, host = _header(scope, b"origin"), _header(scope, b"host")
+    if not origin or not host:
+        return False
+    netloc = urlsplit(origin).netloc
+    domain, _ = split_domain_port(host)
+    if netloc == host and domain and validate_host(domain, settings.ALLOWED_HOSTS):
+        return True
+    for trusted in getattr(settings, "CSRF_TRUSTED_ORIGINS", []):
+        # mismas reglas que CsrfViewMiddleware: "https://*.x.com" cubre subdominios
+        if "*" in trusted:
+            scheme, pattern = urlsplit(trusted).scheme, urlsplit(trusted).netloc[1:]
+            if urlsplit(origin).scheme == scheme and is_same_domain(netloc, pattern):
+                return True
+        elif origin == trusted:
+            return True
+    return False
+
+
+@sync_to_async
+def _load_player(session_key):
+    """(character, state) del usuario de la sesión, o (None, None)."""
+    from .active_character import load_active_character
+    from .models import PlayerState
+    from .positions import positions
+
+    if not session_key:
+        return None, None
+    store = import_string(settings.SESSION_ENGINE).SessionStore(session_key)
+    # get_user valida el hash de la sesión (una sesión vieja muere al
+    # cambiar la contraseña) igual que AuthenticationMiddleware
+    user = get_user(SimpleNamespace(session=store))
+    if not user.is_authenticated:
+        return None, None
+
+    character = load_active_character(user.pk, store)
+    if not character:
+        return None, None
+    try:
+        state = positions.load(character.state)
+    except PlayerState.DoesNotExist:
+        return None, None
+    return character, state
+
+
+@sync_to_async
+def _touch(character, state):
+    """Renueva al jugador en la ocupación de la zona del socket."""
+    from .occupancy import occupancy
+    from .positions import positions
+
+    current = positions.load(copy.copy(state))
+    # ya pasó a otra zona: el resync del cliente lo re-suscribe, no se le
+    # hace volver a entrar a la vieja
+    if current.zone == state.zone:
+        state.x, state.y = current.x, current.y
+        occupancy.touch(character, state)
+
+
+@sync_to_async
+def _alive_enemies(zone):
+    from .models import EnemySpawn
+    from .views import ensure_enemy_spawns_for_zone, refresh_respawns
+
+    ensure_enemy_spawns_for_zone(zone)
+    refresh_respawns(zone)
+    return [{"x": x, "y": y} for x, y in EnemySpawn.objects.filter(zone=zone, is_alive=True).values_list("x", "y")]
+
+
+@sync_to_async
+def _refresh_respawns(zone):
+    from .views import refresh_respawns
+    refresh_respawns(zone)
+
+
+# (zona, x, y) -> revisión pendiente; una por spawn en el proceso, no una
+# por socket conectado
+_respawn_checks = {}
+
+
+def schedule_respawn_check(zone, x, y, delay):
+    """Sin ticker: revisa el respawn de la zona cuando vence, una sola vez."""
+    key = (zone, x, y)
+    if key in _respawn_checks:
+        return
+
+    async def check():
+        await asyncio.sleep(delay)
+        await _refresh_respawns(zone)
+
+    task = _respawn_checks[key] = asyncio.ensure_future(check())
+    task.add_done_callback(lambda _: _respawn_checks.pop(key, None))
+
+
+class WorldSocket:
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.sub = None
+        self.character = None
+        self.state = None
+        self.visible = set()
+
+    async def send_json(self, message):
+        await self.send({"type": "websocket.send", "text": json.dumps(message)})
+
+    async def subscribe(self):
+        """(Re)carga la zona del jugador, se suscribe y manda el snapshot."""
+        self.character, self.state = await _load_player(_session_key(self.scope))
+        if not self.character:
+            return False
+
+        if self.sub:
+            self.sub.close()
+        self.sub = broker().subscribe(zone_topic(self.state.zone))
+        self.visible.clear()
+
+        await self.send_json({
+            "type": "snapshot",
+            "zone": self.state.zone,
+            "alive_enemies": await _alive_enemies(self.state.zone),
+        })
+        return True
+
+    def in_view(self, player):
+        radius = getattr(settings, "WORLD_VIEW_RADIUS", 12)
+        return max(abs(player["x"] - self.state.x), abs(player["y"] - self.state.y)) <= radius
+
+    async def forward(self, message):
+        if message["type"] == "spawn":
+            # sin ticker, el socket mismo revisa el respawn cuando vence
+            if not message["alive"] and message.get("respawn_in") and not ticker_mode():
+                schedule_respawn_check(self.state.zone, message["x"], message["y"], message["respawn_in"])
+            await self.send_json(message)
+            return
+
+        # jugadores: la posición propia llega por el mismo topic
+        player_id = message["id"]
+        if player_id == self.character.id:
+            if message["player"]:
+                self.state.x, self.state.y = message["player"]["x"], message["player"]["y"]
+            return
+
+        if message["kind"] != "leave" and self.in_view(message["player"]):
+            self.visible.add(player_id)
+            await self.send_json(message)
+        elif player_id in self.visible:
+            self.visible.discard(player_id)
+            await self.send_json({"type": "player", "kind": "leave", "id": player_id})
+
+    async def run(self):
+        if (await self.receive())["type"] != "websocket.connect":
+            return
+        if not origin_allowed(self.scope):
+            # cerrar antes de aceptar: el navegador recibe un 403
+            await self.send({"type": "websocket.close", "code": 4403})
+            return
+        await self.send({"type": "websocket.accept"})
+
+        if not await self.subscribe():
+            await self.send({"type": "websocket.close", "code": 4401})
+            return
+        await _touch(self.character, self.state)
+
+        incoming = asyncio.ensure_future(self.receive())
+        outgoing = asyncio.ensure_future(self.sub.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait({incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+
+                if outgoing in done:
+                    await self.forward(outgoing.result())
+                    outgoing = asyncio.ensure_future(self.sub.get())
+
+                if incoming in done:
+                    event = incoming.result()
+                    if event["type"] == "websocket.disconnect":
+                        break
+                    if event["type"] == "websocket.receive":
+                        if self._is_resync(event):
+                            outgoing.cancel()
+                            if not await self.subscribe():
+                                await self.send({"type": "websocket.close", "code": 4401})
+                                break
+                            outgoing = asyncio.ensure_future(self.sub.get())
+                        # resync, ping...: el jugador sigue en la zona
+                        await _touch(self.character, self.state)
+                    incoming = asyncio.ensure_future(self.receive())
+        finally:
+            for task in (incoming, outgoing):
+                task.cancel()
+            if self.sub:
+                self.sub.close()
+
+    @staticmethod
+    def _is_resync(event):
+        try:
+            return json.loads(event.get("text") or "{}").get("type") == "resync"
+        except ValueError:
+            return False
+
+
+async def world_socket(scope, receive, send):
+    await WorldSocket(scope, receive, send).run()
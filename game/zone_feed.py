@@ -0,0 +1,104 @@
+# game/zone_feed.py
+"""
+Log de cambios de jugadores por zona, con cursor de versión.
+
+Cada zona tiene un contador (cache.incr, atómico en backends compartidos) y
+cada cambio queda en su propia llave "evento n". Un cliente que manda la
+última versión que vio recibe solo quién se movió, entró o salió desde ahí;
+si el hueco es muy grande o algún evento ya expiró, se le pide un snapshot
+completo.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .images import variant_url
+from .pubsub import broker, zone_topic
+
+PLAYER_PLACEHOLDER_IMG = "img/player_placeholder.png"
+
+ENTER = "enter"
+MOVE = "move"
+LEAVE = "leave"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def player_public_data(character, state):
+    """Lo que ven los demás de un jugador en el mundo."""
+    img_url = variant_url(character.image, "sprite") or settings.STATIC_URL + PLAYER_PLACEHOLDER_IMG
+    return {
+        "id": character.id,
+        "name": character.name,
+        "class": character.get_char_class_display(),
+        "x": state.x,
+        "y": state.y,
+        "imgUrl": img_url,
+    }
+
+
+class ZoneFeed:
+    def _version_key(self, zone):
+        return f"world:feed:{zone}:v"
+
+    def _event_key(self, zone, n):
+        return f"world:feed:{zone}:e:{n}"
+
+    def version(self, zone: str) -> int:
+        return cache.get(self._version_key(zone)) or 0
+
+    def publish(self, zone: str, kind: str, player_id: int, data=None) -> int:
+        key = self._version_key(zone)
+        cache.add(key, 0, None)
+        try:
+            n = cache.incr(key)
+        except ValueError:
+            # la llave expiró entre add e incr (cache reiniciado): se parte de nuevo
+            cache.set(key, 1, None)
+            n = 1
+        cache.set(
+            self._event_key(zone, n),
+            (kind, player_id, data),
+            _setting("WORLD_FEED_EVENT_SECONDS", 300),
+        )
+        # y en vivo para los sockets suscritos a la zona
+        broker().publish(zone_topic(zone), {
+            "type": "player",
+            "kind": kind,
+            "id": player_id,
+            "player": data,
+            "version": n,
+        })
+        return n
+
+    def changes_since(self, zone: str, since: int):
+        """
+        (versión actual, {id: datos} movidos/entrados, {ids} que salieron).
+        Si no se puede armar el delta retorna (versión, None, None) y el
+        cliente debe pedir snapshot completo.
+        """
+        current = self.version(zone)
+        if since > current or current - since > _setting("WORLD_FEED_MAX_DELTA", 200):
+            return current, None, None
+        if since == current:
+            return current, {}, set()
+
+        keys = [self._event_key(zone, n) for n in range(since + 1, current + 1)]
+        events = cache.get_many(keys)
+        if len(events) != len(keys):
+            return current, None, None
+
+        updated, left = {}, set()
+        for key in keys:
+            kind, player_id, data = events[key]
+            if kind == LEAVE:
+                updated.pop(player_id, None)
+                left.add(player_id)
+            else:
+                left.discard(player_id)
+                updated[player_id] = data
+        return current, updated, left
+
+
+zone_feed = ZoneFeed()
@@ -2,6 +2,8 @@
 ASGI config for rpgloco project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; the world WebSocket (/ws/world/) goes to game.ws and
+lifespan events to game.respawns.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rpgloco.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# después de get_asgi_application(): necesita las apps cargadas
+from game.respawns import lifespan  # noqa: E402
+from game.ws import WORLD_SOCKET_PATH, world_socket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        # arranque/parada del servidor: ticker de respawns si corresponde
+        return await lifespan(scope, receive, send)
+    if scope["type"] == "websocket":
+        if scope["path"] == WORLD_SOCKET_PATH:
+            return await world_socket(scope, receive, send)
+        # cualquier otro socket se rechaza
+        await receive()
+        return await send({"type": "websocket.close", "code": 4404})
+    return await django_application(scope, receive, send)
@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "game.active_character.ActiveCharacterMiddleware",
 ]
 
 ROOT_URLCONF = 'rpgloco.urls'
@@ -140,4 +141,75 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
\ No newline at end of file
+STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+# Cache (posiciones del mundo, etc.). Con varios workers conviene un backend
+# compartido (Redis/Memcached) para que todos vean la misma posición.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Posiciones write-behind (game/positions.py). Solo con CACHES compartido:
+# con LocMemCache cada paso se escribe directo a la BD.
+WORLD_POSITION_WRITE_BEHIND = None     # None: según CACHES; True/False lo fuerza
+WORLD_POSITION_FLUSH_SECONDS = 5       # intervalo del flush = pasos que se pierden si el worker muere
+WORLD_POSITION_FLUSH_BACKGROUND = True  # False: solo se escribe al moverse/apagar
+WORLD_POSITION_MAX_PENDING = 50  # con tantos personajes pendientes se escribe antes del intervalo
+WORLD_MOVE_MAX_STEPS = 16  # pasos por envío en world_move (lotes del cliente)
+
+# Log de jugadores por zona (game/zone_feed.py)
+WORLD_FEED_EVENT_SECONDS = 300  # cuánto vive cada evento en el cache
+WORLD_FEED_MAX_DELTA = 200      # más eventos que esto => snapshot completo
+
+# Área de interés de otros jugadores (game/occupancy.py)
+WORLD_VIEW_RADIUS = 12        # casillas (Chebyshev) alrededor del jugador
+WORLD_VIEW_MAX_PLAYERS = 50   # tope de jugadores por respuesta
+WORLD_OCCUPANCY_BUCKET = 6    # lado de cada bucket de la grilla
+WORLD_OCCUPANCY_BACKEND = "game.occupancy.LocalOccupancyBackend"  # o SharedOccupancyBackend
+WORLD_OCCUPANCY_REDIS_URL = os.environ.get("WORLD_OCCUPANCY_REDIS_URL")  # para SharedOccupancyBackend
+WORLD_OCCUPANCY_IDLE_SECONDS = 300  # sin moverse ni hacer polling => sale de la zona
+
+# Pub/sub del canal WebSocket del mundo (/ws/world/, requiere servidor ASGI).
+# El broker en proceso solo sirve con un worker; para varios, uno compartido.
+WORLD_BROKER = "game.pubsub.InProcessBroker"
+
+# Polling condicional de world_enemies (ETag por versión de spawns).
+# Long-poll solo con servidor ASGI y cache compartido: con gunicorn sync cada
+# espera ocupa un worker. 0 = el servidor nunca retiene la respuesta.
+WORLD_ENEMIES_MAX_WAIT = float(os.environ.get("WORLD_ENEMIES_MAX_WAIT", 0))
+WORLD_ENEMIES_POLL_SECONDS = 0.5   # con long-poll: cada cuánto se mira la versión
+WORLD_ENEMIES_CLIENT_POLL_SECONDS = 5  # sin long-poll: cada cuánto pregunta el cliente
+WORLD_SPAWN_DUE_SECONDS = 60       # cota del cache del próximo respawn
+
+# Zonas vecinas (world_neighbors)
+WORLD_PREFETCH_EDGE_TILES = 2      # a esta distancia de un borde se precalienta la zona vecina
+
+# Fondos pre-renderizados de zonas (game/backgrounds.py)
+WORLD_BACKGROUND_ROOT = BASE_DIR / "var" / "zone_backgrounds"
+
+# Personaje activo por sesión (game/active_character.py)
+# >0: cachea la instancia ese tiempo. Solo con CACHES compartido: con
+# LocMemCache y varios workers un proceso vería (y guardaría) copias viejas.
+WORLD_ACTIVE_CHARACTER_CACHE_SECONDS = 0
+
+# Respawns (game/respawns.py): None = los revisan las requests,
+# "process" = manage.py run_world_ticker (CACHES y WORLD_BROKER compartidos
+# para que los clientes vean los respawns), "asgi" = tarea en el servidor ASGI
+WORLD_RESPAWN_TICKER = os.environ.get("WORLD_RESPAWN_TICKER") or None
+WORLD_TICKER_RESOLUTION = 1.0     # segundos por casilla de la rueda / entre ticks
+
+# Encuentros: tipos y stats de enemigos en memoria (game/encounters.py)
+WORLD_ENCOUNTER_TYPES_SECONDS = 60  # cada cuánto se releen los EnemyType (cambios de otro proceso)
+
+# Cola de tareas en la BD (game/tasks.py, manage.py run_worker)
+WORLD_TASK_WORKER = os.environ.get("WORLD_TASK_WORKER") == "1"  # hay un run_worker corriendo
+WORLD_TASK_CONCURRENCY = 4       # hilos del worker (= tareas por lote)
+WORLD_TASK_POLL_SECONDS = 1.0    # espera cuando la cola está vacía
+WORLD_TASK_RETRY_SECONDS = 10    # backoff: 10s, 20s, 40s...
+WORLD_TASK_LOCK_SECONDS = 300    # una tarea "running" más que esto se re-reclama
+WORLD_TASK_KEEP_SECONDS = 86400  # las hechas se borran después de esto
+WORLD_TASK_INLINE_SECONDS = 60   # sin worker: cada cuánto una request corre las tareas diferidas vencidas
+WORLD_TASK_INLINE_BATCH = 100    # sin worker: cuántas corre cada vez
+WORLD_ENEMY_INSTANCE_TTL = 600   # las instancias de una batalla se borran después de esto